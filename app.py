@@ -1,8 +1,35 @@
 from fasthtml.common import *
-import random
+from fasthtml.svg import Use
 import os
+import json
+import time
+import uuid
+import functools
+import asyncio
+import anyio.to_thread
+from urllib.parse import quote
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import FileResponse
+from starlette.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from catalog import Catalog
+from database import Database, connect
+from page_cache import PageCache, CacheMiss, cached_only, may_block, is_htmx
+from audio_index import AudioIndex
+from assets import AssetTable
+from audio_bundle import AudioBundles, ALL
+from offline import PrecacheManifest
+from scheduler import Scheduler, GRADES
+from review_log import ReviewLog, ReviewEvent
+from search import SearchIndex
+from quiz import QuizEngine, KINDS
+from stats import Statistics
+from strokes import StrokeSheets, VIEW_BOX
+from classroom import ClassroomHub
+from history import (export_chunks, HistoryReader, HistoryFormatError, stage_batch, commit_staged,
+                     discard_staged, BATCH_SIZE, MEDIA_TYPE)
+from metrics import Registry, MetricsMiddleware, timed, log_event
+from compressor import Compressor, CompressionMiddleware
+import logging
 
 # Initialize FastHTML app with database and session middleware
 app, rt, characters, HiraganaCharacter = fast_app(
@@ -22,139 +49,992 @@ app, rt, characters, HiraganaCharacter = fast_app(
     pk='id'
 )
 
+# WAL-mode database with a read-only connection pool and a single writer
+db = Database('data/hiragana.db', readers=4, table=characters.name)
+
+# In-memory catalog of the character table, reloaded only when the data changes
+catalog = Catalog('data/hiragana.db', characters.name)
+
+# zstd/brotli/gzip negotiation, with bytes and CPU time per encoding
+compressor = Compressor()
+
+# Rendered HTML for the summary and flashcard pages, and their compressed
+# variants, per catalog version
+pages = PageCache(catalog, compressor)
+
+# Path, size and content hash of every pronunciation clip, built at startup
+audio = AudioIndex(catalog, 'static/audio')
+
+# Per-category and full-syllabary audio sprites with offset manifests
+bundles = AudioBundles(catalog, audio)
+
+# Prefix and typo-tolerant search over the catalog, updated incrementally
+search_index = SearchIndex(catalog)
+
+# Multiple-choice rounds with distractors from a phonetic confusion matrix
+quiz = QuizEngine(catalog, db)
+
+# Live classrooms: one rendered card fanned out to every student over SSE
+classrooms = ClassroomHub()
+
+# Spaced-repetition queues per learner, snapshotted to the database
+scheduler = Scheduler(db)
+
+# Accuracy, streaks, mastery and response times per learner, updated per event
+stats = Statistics(db, catalog)
+
+def snapshot_learners():
+    """Persist changed scheduler and statistics state now and then"""
+    scheduler.maybe_snapshot()
+    stats.maybe_snapshot()
+
+# Grade events are written in batches by a background writer, which also
+# snapshots learner state so request handlers never wait on the database
+reviews = ReviewLog(db, after_flush=snapshot_learners)
+
+# Handlers on the hot path serve from in-memory state (catalog, page cache,
+# audio and asset tables), so by default they run on the event loop instead
+# of hopping to the threadpool; HIRAGANA_ASYNC=0 sends them to the pool
+ASYNC_ROUTES = os.environ.get('HIRAGANA_ASYNC', '1') != '0'
+
+# Seconds between background checks for catalog and audio changes; the
+# in-memory routes never refresh or rebuild anything themselves
+REFRESH_INTERVAL = float(os.environ.get('HIRAGANA_REFRESH', '1'))
+
+# Worker threads for the remaining sync handlers (anyio's default is 40)
+THREADPOOL_SIZE = int(os.environ.get('HIRAGANA_THREADPOOL', '40'))
+
+# The running loop's threadpool limiter, captured at startup for the gauges
+threadpool = None
+
+def route(path):
+    """``rt(path)`` for a handler that serves in-memory state.
+
+    With ASYNC_ROUTES on it runs inline on the event loop, where it may only
+    serve pages that are already rendered and encoded; a cache miss reruns it
+    on the threadpool to do that work.
+    """
+    def register(handler):
+        if not ASYNC_ROUTES:
+            return rt(path)(handler)
+        @functools.wraps(handler)
+        async def inline(*args, **kwargs):
+            try:
+                with cached_only():
+                    return handler(*args, **kwargs)
+            except CacheMiss:
+                return await run_in_threadpool(handler, *args, **kwargs)
+        return rt(path)(inline)
+    return register
+
+def refresh_state():
+    """Pick up changes to the character table and rebuild what depends on it"""
+    with timed('db'):
+        catalog.refresh()
+    search_index.refresh()
+    if audio.refresh(rescan=True):
+        # Pages and the precache manifest embed clip fingerprints
+        pages.clear()
+        precache.invalidate()
+    strokes.refresh()
+
+async def refresher():
+    """Run refresh_state() on the threadpool every REFRESH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            await run_in_threadpool(refresh_state)
+        except Exception as e:
+            log_event(logging.ERROR, 'refresh_failed', error=str(e))
+
+refresh_task = None
+
+@app.on_event("startup")
+async def start_refresher():
+    """Keep the in-memory state current off the event loop"""
+    global refresh_task
+    refresh_task = asyncio.create_task(refresher())
+
+@app.on_event("shutdown")
+async def stop_refresher():
+    if refresh_task is not None:
+        refresh_task.cancel()
+
+@app.on_event("startup")
+async def size_threadpool():
+    """Apply THREADPOOL_SIZE to this event loop's default thread limiter"""
+    global threadpool
+    threadpool = anyio.to_thread.current_default_thread_limiter()
+    threadpool.total_tokens = THREADPOOL_SIZE
+
+@app.on_event("startup")
+def start_review_log():
+    """Start the review event writer"""
+    reviews.start()
+
+@app.on_event("shutdown")
+def save_schedules():
+    """Flush pending review events and persist scheduling state on shutdown"""
+    reviews.stop()
+    scheduler.snapshot()
+    stats.snapshot()
+
 # Add session middleware
 app.add_middleware(SessionMiddleware, secret_key="hiragana-flashcards-secret")
 
+# Compress dynamic text that isn't already encoded (search, quiz, metrics);
+# cached pages and static assets arrive with their own Content-Encoding
+app.add_middleware(CompressionMiddleware, compressor=compressor)
+
+# Per-route latency histograms and Server-Timing headers; added last so it
+# wraps every other middleware
+metrics = Registry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+def db_gauges():
+    """Pool waits and named query latency from the shared database, as gauges"""
+    report = db.report()
+    values = {(('stat', 'readers_idle'),): report.pop('readers_idle')}
+    for name, stats in report.items():
+        values[(('stat', name), ('field', 'count'))] = stats['count']
+        values[(('stat', name), ('field', 'mean_ms'))] = stats['mean_ms']
+        values[(('stat', name), ('field', 'max_ms'))] = stats['max_ms']
+    return values
+
+metrics.gauge('hiragana_db', "Database pool waits and named query latency", db_gauges)
+metrics.gauge('hiragana_review_log', "Write-behind review log queue and throughput",
+              lambda: {(('stat', 'pending'),): reviews.pending(),
+                       (('stat', 'flushed_batches'),): reviews.flushed_batches,
+                       (('stat', 'flushed_events'),): reviews.flushed_events,
+                       (('stat', 'retries'),): reviews.retries,
+                       (('stat', 'failed_events'),): reviews.failed_events})
+metrics.gauge('hiragana_learners', "Learners whose state is held in memory",
+              lambda: {(('state', 'scheduler'),): len(scheduler),
+                       (('state', 'stats'),): len(stats)})
+metrics.gauge('hiragana_catalog_version', "Current catalog version",
+              lambda: {(): catalog.version})
+
+def compression_gauges():
+    """Bytes in and out and encoder CPU time per content-coding"""
+    values = {}
+    for encoding, stats in compressor.report().items():
+        for field in ('count', 'bytes_in', 'bytes_out', 'ratio', 'seconds'):
+            values[(('encoding', encoding), ('field', field))] = stats[field]
+    return values
+
+def threadpool_gauges():
+    """Threads in use, the limit, and requests queued for a thread"""
+    if threadpool is None:
+        return {}
+    stats = threadpool.statistics()
+    return {(('stat', 'busy'),): stats.borrowed_tokens,
+            (('stat', 'size'),): stats.total_tokens,
+            (('stat', 'waiting'),): stats.tasks_waiting}
+
+metrics.gauge('hiragana_threadpool', "Threadpool use and queue depth for sync handlers", threadpool_gauges)
+metrics.gauge('hiragana_compression', "Response compression work by encoding", compression_gauges)
+metrics.gauge('hiragana_classroom', "Open classrooms, connected students and fan-out counters",
+              lambda: {(('stat', name),): value for name, value in classrooms.report().items()})
+
+# Content-hashed, precompressed static assets
+assets = AssetTable('static', '/static')
+
+def asset_tags(htmx=True):
+    """Stylesheet and script tags pointing at fingerprinted asset URLs.
+
+    Pages built with Html() skip fast_app's default headers, so they include
+    htmx themselves; app.hdrs doesn't need it twice.
+    """
+    return (
+        *((htmxsrc,) if htmx else ()),
+        Link(rel="stylesheet", href=assets.url('css/styles.css')),
+        Script(src=assets.url('js/audio.js'))
+    )
+
 # Add CSS
-app.hdrs = (
-    Link(rel="stylesheet", href="/static/css/styles.css"),
-    Script(src="/static/js/audio.js")
-)
+app.hdrs = asset_tags(htmx=False)
+
+# Stroke-order sprite sheets, registered in the asset table per catalog version
+strokes = StrokeSheets(catalog, assets)
+
+# Cards rendered inline on the summary page; the rest load as they scroll in
+FIRST_SCREEN = 60
+PAGE_SIZE = 60
+
+# Typeahead results per keystroke
+SEARCH_LIMIT = 12
 
+# Questions per quiz round, by default and at most
+QUIZ_SIZE = 10
+QUIZ_MAX = 50
 
+# Seconds between the start of one stroke's animation and the next
+STROKE_SECONDS = 0.6
+
+
+
+def character_glyph(char):
+    """The character drawn from the stroke sprite sheet, or as text without stroke data"""
+    symbol = strokes.get(char.id)
+    if symbol is None:
+        return Div(char.character, cls='char-large')
+    return Svg(Use(href=symbol.href), viewBox=VIEW_BOX, cls='char-large char-strokes',
+               role='img', aria_label=char.character)
+
+def stroke_order(char):
+    """Animated stroke-order diagram, one <use> per stroke; clicking replays it"""
+    symbol = strokes.get(char.id)
+    if symbol is None:
+        return ''
+    return Svg(Use(href=symbol.href, cls='stroke-guide'),
+               *[Use(href=symbol.stroke_href(n), cls='stroke',
+                     style=f'animation-delay:{(n - 1) * STROKE_SECONDS:.1f}s')
+                 for n in range(1, symbol.strokes + 1)],
+               viewBox=VIEW_BOX, cls='stroke-order', role='img',
+               aria_label=f"Stroke order of {char.character} ({symbol.strokes} strokes)",
+               onclick='this.replaceWith(this.cloneNode(true))')
 
 def character_card(char):
     """Small character card for summary view"""
     return Div(
-        Div(char.character, cls='char-large'),
+        character_glyph(char),
         Div(char.romaji, cls='romaji-small'),
         cls='char-card',
-        onclick=f"playAudio('/audio/{char.id}')",
+        onclick=f"playAudio('{audio.url(char.id)}')",
         hx_get=f'/flashcard/{char.id}',
         hx_target='#content-area',
         hx_swap='innerHTML'
     )
 
-@rt("/")
-def get():
+@route("/")
+def get(request):
     """Summary view with all characters organized by category"""
-    categories = ['vowels', 'ka-row', 'sa-row', 'ta-row', 'na-row', 
-                  'ha-row', 'ma-row', 'ya-row', 'ra-row', 'wa-row']
-    
-    # Get all characters and organize by category
-    try:
-        all_chars = list(characters())
-        print(f"Found {len(all_chars)} total characters")
-    except Exception as e:
-        print(f"Error getting characters: {e}")
-        all_chars = []
-    
-    content = []
-    for category in categories:
-        # Filter characters by category and sort by order_index
-        chars = [c for c in all_chars if c.category == category]
-        chars.sort(key=lambda x: x.order_index)
-        
-        if chars:  # Only show categories that have characters
-            print(f"Category {category}: {len(chars)} characters")
-            grid = Div(
-                H3(category.replace('-', ' ').title()),
-                Div(*[character_card(char) for char in chars], 
-                    cls='char-grid'),
-                cls='category-section'
-            )
-            content.append(grid)
-    
+    return pages.response(request, 'summary', summary_page, summary_fragment)
+
+def card_loader(category, offset):
+    """Placeholder that swaps itself for the next page of a category's cards"""
+    return Div(cls='card-loader',
+               hx_get=f'/summary/{quote(category, safe="")}?offset={offset}',
+               hx_trigger='revealed',
+               hx_swap='outerHTML')
+
+def category_cards(category, offset, limit):
+    """Cards ``offset`` to ``offset + limit`` of a category, plus a loader for the rest"""
+    chars = catalog.category(category)
+    cards = [character_card(char) for char in chars[offset:offset + limit]]
+    if offset + limit < len(chars):
+        cards.append(card_loader(category, offset + limit))
+    return cards
+
+def first_screen():
+    """Number of cards each category renders inline, in catalog order"""
+    budget = FIRST_SCREEN
+    shown = {}
+    for category in catalog.categories():
+        shown[category] = min(budget, len(catalog.category(category)))
+        budget -= shown[category]
+    return shown
+
+def summary_sections():
+    """Category headers with the first screen of cards; the rest load lazily"""
+    log_event(logging.DEBUG, 'summary_render', characters=len(catalog),
+              categories=len(catalog.categories()))
+
+    content = [Div(A('📚 Review due cards', href='/review', cls='back-button'),
+                   ' ',
+                   A('📝 Quiz', href='/quiz', cls='back-button'),
+                   ' ',
+                   A('📊 Progress', href='/stats', cls='back-button'),
+                   ' ',
+                   A('🧑‍🏫 Classroom', href='/classroom', cls='back-button'),
+                   cls='review-link'),
+               search_box()]
+    for category, shown in first_screen().items():
+        # Characters come pre-grouped and sorted by order_index
+        grid = Div(
+            H3(category.replace('-', ' ').title()),
+            Div(*category_cards(category, 0, shown), cls='char-grid'),
+            cls='category-section'
+        )
+        content.append(grid)
+    return content
+
+def search_box(query=''):
+    """Typeahead input; every keystroke replaces any request still in flight"""
+    return Div(
+        Input(type='search', name='q', value=query, placeholder='Search kana or romaji…',
+              autocomplete='off', cls='search-input',
+              hx_get='/search', hx_trigger='input changed, search',
+              hx_target='#search-results', hx_swap='innerHTML', hx_sync='this:replace'),
+        Div(*search_results(query), id='search-results', cls='char-grid'),
+        cls='search-box'
+    )
+
+def search_results(query):
+    """Cards for the best matches, or a note when nothing matches"""
+    if not query.strip():
+        return ()
+    with timed('search'):
+        matches = search_index.search(query, SEARCH_LIMIT, wait=may_block())
+    if matches is None:
+        # The index is being refreshed; search again on the threadpool
+        raise CacheMiss(query)
+    if not matches:
+        return (Div(f"No matches for “{query}”", cls='search-empty'),)
+    return tuple(character_card(char) for char in matches)
+
+def summary_page():
+    """Generate summary page content"""
     return Html(
         Head(
             Title("Hiragana Learning"),
-            Link(rel="stylesheet", href="/static/css/styles.css"),
-            Script(src="/static/js/audio.js")
+            *asset_tags()
         ),
         Body(
-            Main(*content, id='content-area', cls='summary-view'),
+            Main(*summary_sections(), id='content-area', cls='summary-view',
+                 data_audio_bundle='/audio/bundle/all.json'),
             cls='summary-page'
         )
     )
 
+def summary_fragment():
+    """Summary sections for swapping into #content-area"""
+    return (Title("Hiragana Learning"), *summary_sections())
+
+@route("/summary/{category}")
+def get(request, category: str, offset: int = 0):
+    """One page of a category's cards, swapped in as the summary scrolls"""
+    if not 0 <= offset < len(catalog.category(category)):
+        return Response("Cards not found", status_code=404)
+    render = lambda: category_cards(category, offset, PAGE_SIZE)
+    return pages.response(request, f'summary/{category}/{offset}', render, render)
+
+
+@route("/search")
+def get(request, q: str = ''):
+    """Typeahead results as a fragment, or a search page on direct navigation"""
+    with timed('render'):
+        if is_htmx(request):
+            return search_results(q)
+        return Html(
+            Head(Title("Hiragana Search"), *asset_tags()),
+            Body(Main(search_box(q), A('← Back to Overview', href='/', cls='back-button'),
+                      id='content-area', cls='summary-view'))
+        )
+
 
-@rt("/flashcard/{card_id}")
-def get(card_id: int):
+@route("/flashcard/{card_id}")
+def get(request, card_id: int):
     """Show specific flashcard"""
-    char = characters[card_id]
-    return flashcard_content(char, 0, 1)
+    char = catalog.get(card_id)
+    if char is None:
+        return Response("Flashcard not found", status_code=404)
+    return pages.response(request, f'flashcard/{card_id}',
+                          lambda: flashcard_content(char, 0, 1),
+                          lambda: flashcard_fragment(char))
+
+def card_face(char):
+    """Character, stroke order, romaji, pronunciation and a play button"""
+    return (
+        Div(char.character, cls='flashcard-character'),
+        stroke_order(char),
+        Div(char.romaji, cls='flashcard-romaji'), 
+        Div(char.pronunciation, cls='flashcard-pronunciation'),
+        Button('🔊 Play Sound', 
+               onclick=f"playAudio('{audio.url(char.id)}')",
+               cls='audio-button',
+               type='button'),
+    )
+
+def flashcard_card(char):
+    """Large flashcard with audio and navigation"""
+    return Div(
+        *card_face(char),
+        A('← Back to Overview', 
+           href='/',
+           cls='back-button'),
+        cls='flashcard-content'
+    )
 
 def flashcard_content(char, current_index, total_cards):
     """Generate flashcard content"""
     return Html(
         Head(
             Title(f"Hiragana: {char.character} - {char.romaji}"),
-            Link(rel="stylesheet", href="/static/css/styles.css"),
-            Script(src="/static/js/audio.js")
+            *asset_tags()
         ),
         Body(
             Main(
-                Div(
-                    Div(char.character, cls='flashcard-character'),
-                    Div(char.romaji, cls='flashcard-romaji'), 
-                    Div(char.pronunciation, cls='flashcard-pronunciation'),
-                    Button('🔊 Play Sound', 
-                           onclick=f"playAudio('/audio/{char.id}')",
-                           cls='audio-button',
-                           type='button'),
-                    A('← Back to Overview', 
-                       href='/',
-                       cls='back-button'),
-                    cls='flashcard-content'
-                ),
+                flashcard_card(char),
                 cls='flashcard-view'
             )
         )
     )
 
+def flashcard_fragment(char):
+    """Flashcard for swapping into #content-area; scripts and styles are already loaded"""
+    return (
+        Title(f"Hiragana: {char.character} - {char.romaji}"),
+        Div(flashcard_card(char), cls='flashcard-view')
+    )
+
 
-@rt("/audio/{char_id}")
-def get(char_id: int):
-    """Serve audio file for character pronunciation"""
-    char = characters[char_id]
-    audio_file = f"static/audio/{char.romaji}.mp3"
-    
-    if os.path.exists(audio_file):
-        return FileResponse(audio_file, media_type="audio/mpeg")
+def learner_queue(session):
+    """Review queue for the session's learner"""
+    learner_id = session.setdefault('learner_id', uuid.uuid4().hex)
+    return scheduler.queue(learner_id)
+
+def review_card(char):
+    """Review card with the answer hidden and grading buttons"""
+    return Div(
+        Div(char.character, cls='flashcard-character'),
+        Details(
+            Summary('Show answer'),
+            Div(char.romaji, cls='flashcard-romaji'),
+            Div(char.pronunciation, cls='flashcard-pronunciation'),
+        ),
+        Button('🔊 Play Sound',
+               onclick=f"playAudio('{audio.url(char.id)}')",
+               cls='audio-button',
+               type='button'),
+        Div(*[Button(label.title(),
+                     hx_post=f'/review/{char.id}',
+                     hx_vals=json.dumps({'grade': label}),
+                     hx_target='#content-area',
+                     hx_swap='innerHTML',
+                     cls=f'grade-button grade-{label}',
+                     type='button')
+              for label in GRADES],
+            cls='grade-buttons'),
+        A('← Back to Overview', href='/', cls='back-button'),
+        cls='flashcard-content'
+    )
+
+def review_fragment(queue):
+    """Next due card, a card not seen yet, or a note saying when the next review is"""
+    card_id = queue.next_card()
+    if card_id is None:
+        # Cards are enrolled one at a time, in catalog order, as they are first shown
+        card_id = queue.introduce(catalog.rows(), catalog.version)
+    char = catalog.get(card_id) if card_id is not None else None
+    if char is None:
+        next_due = queue.next_due()
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(next_due)) if next_due else 'never'
+        body = Div(
+            Div('🎉 All caught up!', cls='flashcard-romaji'),
+            Div(f"Next review: {when}", cls='flashcard-pronunciation'),
+            A('← Back to Overview', href='/', cls='back-button'),
+            cls='flashcard-content'
+        )
     else:
-        # For now, return a simple response - in production you'd implement TTS
-        return Response(f"Audio for {char.character} ({char.romaji}) not available", 
-                       media_type="text/plain")
+        body = review_card(char)
+    return (Title("Hiragana Review"), Div(body, cls='flashcard-view', id='review')), card_id
 
-# Static file serving
-@rt("/static/{path:path}")
-def get(path: str):
-    """Serve static files"""
-    file_path = f"static/{path}"
-    if os.path.exists(file_path):
-        # Determine media type based on extension
-        if path.endswith('.css'):
-            media_type = "text/css"
-        elif path.endswith('.js'):
-            media_type = "application/javascript"
-        elif path.endswith('.mp3'):
-            media_type = "audio/mpeg"
-        else:
-            media_type = "application/octet-stream"
-        
-        return FileResponse(file_path, media_type=media_type)
+@rt("/review")
+def get(request, session):
+    """Review the learner's most overdue card"""
+    with timed('db'):
+        catalog.refresh()
+    with timed('render'):
+        fragment, card_id = review_fragment(learner_queue(session))
+    session['shown'] = [card_id, time.time()]
+    if is_htmx(request):
+        return fragment
+    title, body = fragment
+    return Html(
+        Head(title, *asset_tags()),
+        Body(Main(body, id='content-area', cls='summary-view'))
+    )
+
+def apply_review(session, event):
+    """Fold a durable review into the schedule and statistics; returns the next card"""
+    queue = scheduler.grade(event.learner_id, event.card_id, event.grade, event.reviewed_at)
+    stats.observe(event)
+    with timed('render'):
+        fragment, next_id = review_fragment(queue)
+    session['shown'] = [next_id, time.time()]
+    return fragment
+
+@rt("/review/{card_id}")
+async def post(session, card_id: int, grade: str):
+    """Grade a card and show the next one once the review is saved"""
+    quality = GRADES.get(grade)
+    queue = await run_in_threadpool(learner_queue, session)
+    if quality is None or card_id not in queue:
+        return Response("Invalid review", status_code=400)
+    now = time.time()
+    # Time from showing the card to grading it, when we showed it
+    shown_id, shown_at = session.get('shown') or (None, None)
+    response_ms = int((now - shown_at) * 1000) if shown_id == card_id else None
+    event = ReviewEvent(session['learner_id'], card_id, quality, now, response_ms)
+    try:
+        # Resolves once the writer has committed the event's batch
+        await asyncio.wrap_future(reviews.submit(event))
+    except Exception as e:
+        log_event(logging.ERROR, 'review_not_saved', learner=event.learner_id, card=card_id, error=str(e))
+        return Response("Your answer couldn't be saved; please grade the card again",
+                        status_code=503, headers={'Retry-After': '5'})
+    return await run_in_threadpool(apply_review, session, event)
+
+def percent(value):
+    return '—' if value is None else f"{value:.0%}"
+
+def stats_fragment(learner):
+    """Dashboard built straight from the learner's running aggregates"""
+    if not learner.reviews:
+        body = Div(Div('No reviews yet', cls='flashcard-romaji'),
+                   A('📚 Start reviewing', href='/review', cls='back-button'),
+                   cls='flashcard-content')
+        return Title("Hiragana Progress"), Div(body, cls='flashcard-view')
+    p50, p90 = (learner.response.quantile(q) for q in (0.5, 0.9))
+    timing = f"{p50 / 1000:.1f}s median, {p90 / 1000:.1f}s p90" if p50 is not None else '—'
+    rows = []
+    for category in catalog.categories():
+        seen, correct = learner.categories.get(category, (0, 0))
+        rows.append(Tr(Td(category.replace('-', ' ').title()), Td(seen),
+                       Td(percent(correct / seen if seen else None))))
+    # Weakest first among cards seen at least twice
+    weakest = sorted((correct / seen, card_id) for card_id, (seen, correct, _) in learner.cards.items()
+                     if seen >= 2 and correct < seen)[:5]
+    weak = [catalog.get(card_id) for _, card_id in weakest]
+    body = Div(
+        Dl(Dt('Reviews'), Dd(learner.reviews),
+           Dt('Accuracy'), Dd(percent(learner.accuracy)),
+           Dt('Mastered'), Dd(f"{learner.mastered} / {len(catalog)} ({learner.learning} learning)"),
+           Dt('Answer streak'), Dd(f"{learner.streak} (best {learner.best_streak})"),
+           Dt('Day streak'), Dd(f"{learner.current_day_streak()} (best {learner.best_day_streak})"),
+           Dt('Response time'), Dd(timing),
+           cls='stats-summary'),
+        Table(Thead(Tr(Th('Category'), Th('Reviews'), Th('Accuracy'))), Tbody(*rows), cls='stats-table'),
+        Div('Needs practice: ', *[Span(char.character, title=char.romaji, cls='stats-weak')
+                                  for char in weak if char is not None],
+            cls='stats-weakest') if weak else '',
+        A('⬇️ Export history', href='/history/export', cls='back-button'),
+        ' ',
+        A('← Back to Overview', href='/', cls='back-button'),
+        cls='flashcard-content'
+    )
+    return Title("Hiragana Progress"), Div(body, cls='flashcard-view')
+
+@rt("/stats")
+def get(request, session):
+    """Progress dashboard for the session's learner"""
+    learner_id = session.setdefault('learner_id', uuid.uuid4().hex)
+    with timed('db'):
+        catalog.refresh()
+        learner = stats.learner(learner_id)
+    with timed('render'):
+        fragment = stats_fragment(learner)
+    if is_htmx(request):
+        return fragment
+    title, body = fragment
+    return Html(
+        Head(title, *asset_tags()),
+        Body(Main(body, id='content-area', cls='summary-view'))
+    )
+
+@rt("/history/export")
+def get(session):
+    """Stream the learner's review history as binary records"""
+    learner_id = session.setdefault('learner_id', uuid.uuid4().hex)
+    # Its own connection: the stream outlives the handler and must not hold a pooled reader
+    conn = connect(db.path, readonly=True, check_same_thread=False)
+    chars = list(catalog)
+
+    def chunks():
+        try:
+            yield from export_chunks(conn, chars, learner_id)
+        finally:
+            conn.close()
+
+    return StreamingResponse(chunks(), media_type=MEDIA_TYPE, headers={
+        'Content-Disposition': 'attachment; filename="hiragana-history.hist"',
+        'Cache-Control': 'no-store',
+    })
+
+def import_batch(import_id, batch):
+    """Stage parsed events until the upload has been read to the end"""
+    with db.writer('history_stage') as conn:
+        stage_batch(conn, import_id, batch)
+
+def finish_import(session, import_id):
+    """Add a fully parsed upload to the log in one transaction; returns how many were new"""
+    with db.writer('history_commit') as conn:
+        inserted = commit_staged(conn, import_id)
+    if inserted:
+        # Imported reviews can predate ones already applied, so replaying them
+        # on top would rewind SM-2 state and streaks
+        replay_history(session)
+    return inserted
+
+def abandon_import(import_id):
+    with db.writer() as conn:
+        discard_staged(conn, import_id)
+
+def replay_history(session):
+    """Rebuild the learner's schedule and statistics from the log in time order"""
+    learner_queue(session)
+    scheduler.rebuild(session['learner_id'])
+    stats.rebuild(session['learner_id'])
+
+async def import_history(request):
+    """Add an exported history to this learner, parsing it as it uploads"""
+    session = request.session
+    learner_id = session.setdefault('learner_id', uuid.uuid4().hex)
+    reader = HistoryReader(catalog)
+    import_id = uuid.uuid4().hex
+    batch, inserted = [], None
+    try:
+        async for chunk in request.stream():
+            # Whoever exported it, the history now belongs to this learner
+            batch.extend((learner_id, *event[1:]) for event in reader.feed(chunk))
+            if len(batch) >= BATCH_SIZE:
+                await run_in_threadpool(import_batch, import_id, batch)
+                batch = []
+        reader.close()
+        await run_in_threadpool(import_batch, import_id, batch)
+        inserted = await run_in_threadpool(finish_import, session, import_id)
+    except HistoryFormatError as e:
+        return Response(f"Invalid history: {e}", status_code=400)
+    finally:
+        if inserted is None:
+            # A bad or cut-off upload leaves review_events untouched
+            await run_in_threadpool(abandon_import, import_id)
+    log_event(logging.INFO, 'history_imported', learner=learner_id, records=reader.records,
+              inserted=inserted, skipped=reader.skipped)
+    return JSONResponse({'records': reader.records, 'imported': inserted,
+                         'duplicates': reader.records - inserted - reader.skipped,
+                         'unknown_characters': reader.skipped})
+
+# FastHTML reads the whole body to look for form fields before calling a
+# handler; a plain Starlette route gets the upload as it arrives
+app.router.add_route("/history/import", import_history, methods=["POST"])
+
+def classroom_card(char):
+    """The card students see; rendered once per catalog version for every room"""
+    return Div(*card_face(char), cls='flashcard-content')
+
+def show_card(room, char):
+    """Move a room to ``char`` and fan the fragment out to its students"""
+    body = pages.page(f'classroom/{char.id}', lambda: classroom_card(char), htmx=True).body
+    room.card_id = char.id
+    return classrooms.publish(room, 'card', body)
+
+def teaching(session, code):
+    """The room for ``code`` if this session started it, else None"""
+    room = classrooms.get(code)
+    if room is None or room.teacher != session.get('learner_id'):
+        return None
+    return room
+
+def classroom_controls(room):
+    """Status line with previous/next and end-of-class buttons for the teacher"""
+    chars = list(catalog)
+    ids = [char.id for char in chars]
+    index = ids.index(room.card_id) if room.card_id in ids else -1
+    current = catalog.get(room.card_id) if room.card_id is not None else None
+    step = lambda char, label: Button(label, hx_post=f'/classroom/{room.code}/show/{char.id}',
+                                      hx_target='#classroom-controls', hx_swap='outerHTML',
+                                      cls='audio-button', type='button')
+    return Div(
+        Div(f"Class {room.code} · {len(room.subscribers)} students · "
+            f"{'showing ' + current.character if current else 'no card yet'}",
+            cls='classroom-status'),
+        step(chars[index - 1], '← Previous') if index > 0 else '',
+        ' ',
+        step(chars[index + 1] if index + 1 < len(chars) else chars[0], 'Next →') if chars else '',
+        ' ',
+        Button('End class', hx_post=f'/classroom/{room.code}/end', hx_target='#content-area',
+               hx_swap='innerHTML', hx_confirm='End the class for every student?',
+               cls='back-button', type='button'),
+        id='classroom-controls', cls='classroom-controls'
+    )
+
+def classroom_page(title, body):
+    return Html(
+        Head(Title(title), *asset_tags()),
+        Body(Main(body, id='content-area', cls='summary-view'))
+    )
+
+@rt("/classroom")
+def get():
+    """Start a class, or join one with its code"""
+    return classroom_page("Hiragana Classroom", Div(
+        Form(Button('🧑‍🏫 Start a class', type='submit', cls='audio-button'),
+             method='post', action='/classroom'),
+        Form(Input(name='code', placeholder='Class code', autocomplete='off',
+                   maxlength=8, cls='search-input'),
+             Button('Join', type='submit', cls='audio-button'),
+             method='get', action='/classroom/join', cls='classroom-join'),
+        A('← Back to Overview', href='/', cls='back-button'),
+        cls='flashcard-content'))
+
+@rt("/classroom")
+async def post(session):
+    """Open a room taught by this session"""
+    learner_id = session.setdefault('learner_id', uuid.uuid4().hex)
+    room = classrooms.create(learner_id)
+    log_event(logging.INFO, 'classroom_opened', room=room.code)
+    return RedirectResponse(f'/classroom/{room.code}/teach', status_code=303)
+
+@rt("/classroom/join")
+def get(code: str = ''):
+    return RedirectResponse(f'/classroom/{quote(code.strip().upper(), safe="")}', status_code=303)
+
+@rt("/classroom/{code}")
+async def get(code: str):
+    """Student view: the current card, replaced whenever the teacher moves on"""
+    room = classrooms.get(code)
+    if room is None:
+        return Response("Class not found", status_code=404)
+    current = NotStr(room.current.data.decode('utf-8')) if room.current else \
+        Div('Waiting for the teacher…', cls='flashcard-pronunciation')
+    return classroom_page(f"Hiragana Class {room.code}", Div(
+        Div(current, id='classroom-card'),
+        A('← Leave class', href='/', cls='back-button'),
+        cls='flashcard-view',
+        # The page already shows the current card, so the stream starts after it
+        data_classroom_events=f'/classroom/{room.code}/events'
+                              + (f'?after={room.current.id}' if room.current else '')))
+
+@rt("/classroom/{code}/events")
+async def get(request, code: str, after: str = ''):
+    """Server-Sent Events stream of the room's cards"""
+    room = classrooms.get(code)
+    if room is None:
+        return Response("Class not found", status_code=404)
+    # A reconnecting browser sends Last-Event-ID; a fresh page says what it shows
+    last_id = request.headers.get('last-event-id') or after
+    subscriber = classrooms.subscribe(room, int(last_id) if last_id.isdigit() else None)
+    if subscriber is None:
+        return Response("Class is full", status_code=503, headers={'Retry-After': '30'})
+    return StreamingResponse(classrooms.stream(room, subscriber), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@rt("/classroom/{code}/teach")
+async def get(session, code: str):
+    """Teacher view: pick any card, or step through them in order"""
+    room = teaching(session, code)
+    if room is None:
+        return Response("Class not found", status_code=404)
+    tiles = [Div(Div(char.character, cls='char-large'), Div(char.romaji, cls='romaji-small'),
+                 hx_post=f'/classroom/{room.code}/show/{char.id}',
+                 hx_target='#classroom-controls', hx_swap='outerHTML', cls='char-card')
+             for char in catalog]
+    return classroom_page(f"Teaching {room.code}", Div(
+        Div("Students join at /classroom with code ", Strong(room.code), cls='flashcard-pronunciation'),
+        classroom_controls(room),
+        Div(*tiles, cls='char-grid'),
+        cls='flashcard-content'))
+
+@rt("/classroom/{code}/show/{card_id}")
+async def post(session, code: str, card_id: int):
+    """Show a card to every student in the room"""
+    room = teaching(session, code)
+    char = catalog.get(card_id)
+    if room is None or char is None:
+        return Response("Class or card not found", status_code=404)
+    with timed('render'):
+        show_card(room, char)
+    return classroom_controls(room)
+
+@rt("/classroom/{code}/end")
+async def post(session, code: str):
+    room = teaching(session, code)
+    if room is None:
+        return Response("Class not found", status_code=404)
+    classrooms.close(room)
+    log_event(logging.INFO, 'classroom_closed', room=room.code)
+    return Div(Div('Class ended', cls='flashcard-romaji'),
+               A('← Back to Overview', href='/', cls='back-button'),
+               cls='flashcard-content')
+
+def quiz_question(i, question):
+    """One question of a round as a radio group"""
+    char = catalog.get(question.card_id)
+    if question.kind == 'kana':
+        prompt, label = Div(char.character, cls='quiz-prompt'), lambda c: c.romaji
+    elif question.kind == 'romaji':
+        prompt, label = Div(char.romaji, cls='quiz-prompt'), lambda c: c.character
     else:
-        return Response("File not found", status_code=404)
+        prompt = Button('🔊', onclick=f"playAudio('{audio.url(char.id)}')",
+                        cls='audio-button quiz-prompt', type='button')
+        label = lambda c: c.character
+    return Fieldset(
+        Legend(f"{i + 1}."),
+        prompt,
+        Div(*[Label(Input(type='radio', name=f'answer{i}', value=option.id), label(option),
+                    cls='quiz-option')
+              for option in map(catalog.get, question.options)],
+            cls='quiz-options'),
+        cls='quiz-question'
+    )
+
+def quiz_round(session, n, kinds):
+    """A whole round in one form, graded in one request.
+
+    The questions and their options are kept in the session, so grading only
+    accepts answers to questions this learner was actually asked.
+    """
+    questions = quiz.round(n, kinds, has_audio=audio.get)
+    session['quiz'] = [[q.card_id, *q.options] for q in questions]
+    return (
+        Title("Hiragana Quiz"),
+        Form(*[quiz_question(i, q) for i, q in enumerate(questions)],
+             Input(type='hidden', name='n', value=n),
+             Input(type='hidden', name='kind', value=','.join(kinds)),
+             Button('Check answers', type='submit', cls='audio-button'),
+             A('← Back to Overview', href='/', cls='back-button'),
+             hx_post='/quiz', hx_target='#content-area', hx_swap='innerHTML',
+             cls='quiz-round flashcard-content')
+    )
+
+def quiz_kinds(kind):
+    """Question kinds from a comma-separated list, defaulting to all"""
+    kinds = tuple(k for k in kind.split(',') if k in KINDS)
+    return kinds or KINDS
+
+@rt("/quiz")
+def get(request, session, n: int = QUIZ_SIZE, kind: str = ''):
+    """A round of multiple-choice questions"""
+    with timed('db'):
+        catalog.refresh()
+    with timed('render'):
+        fragment = quiz_round(session, max(1, min(n, QUIZ_MAX)), quiz_kinds(kind))
+        if is_htmx(request):
+            return fragment
+        title, body = fragment
+        return Html(
+            Head(title, *asset_tags()),
+            Body(Main(body, id='content-area', cls='summary-view'))
+        )
+
+@rt("/quiz")
+def post(session, form: dict):
+    """Grade a whole round, learn from the mistakes and offer the next one"""
+    # Each round is graded once; answers must pick one of the question's options
+    asked = session.pop('quiz', None) or []
+    answers = []
+    for i, (card_id, *options) in enumerate(asked):
+        chosen = form.get(f'answer{i}', '')
+        if chosen.isdigit() and int(chosen) in options \
+                and catalog.get(card_id) and catalog.get(int(chosen)):
+            answers.append((card_id, int(chosen)))
+    with timed('db'):
+        quiz.record(answers)
+    wrong = [(catalog.get(card_id), catalog.get(chosen)) for card_id, chosen in answers if card_id != chosen]
+    next_round = f"/quiz?n={quote(form.get('n', ''))}&kind={quote(form.get('kind', ''))}"
+    return (
+        Title("Hiragana Quiz"),
+        Div(
+            Div(f"{len(answers) - len(wrong)} / {len(answers)} correct", cls='flashcard-romaji'),
+            Ul(*[Li(f"{char.character} is {char.romaji} — you chose {chosen.character} ({chosen.romaji})")
+                 for char, chosen in wrong],
+               cls='quiz-mistakes'),
+            Button('Next round', hx_get=next_round,
+                   hx_target='#content-area', hx_swap='innerHTML', cls='audio-button', type='button'),
+            A('← Back to Overview', href='/', cls='back-button'),
+            cls='flashcard-content'
+        )
+    )
+
+@route("/audio/{char_id}")
+def get(request, char_id: int):
+    """Serve audio file for character pronunciation"""
+    clip = audio.get(char_id)
+    if clip is None:
+        return Response("Audio not found", status_code=404)
+    with timed('file'):
+        return audio.response(request, clip)
+
+@rt("/audio/bundle/{name}.json")
+def get(request, name: str):
+    """Serve the offset/duration manifest for an audio bundle"""
+    with timed('db'):
+        catalog.refresh()
+    audio.refresh()
+    with timed('file'):
+        bundle = bundles.get(name)
+        if bundle is None:
+            return Response("Audio bundle not found", status_code=404)
+        return bundles.manifest_response(request, bundle)
+
+@rt("/audio/bundle/{name}")
+def get(request, name: str):
+    """Serve all clips for a category (or 'all') as one payload"""
+    with timed('db'):
+        catalog.refresh()
+    audio.refresh()
+    with timed('file'):
+        bundle = bundles.get(name)
+        if bundle is None:
+            return Response("Audio bundle not found", status_code=404)
+        return bundles.response(request, bundle)
+
+# Static file serving
+@route("/static/{path:path}")
+def get(request, path: str):
+    """Serve static files from the prebuilt asset table"""
+    with timed('file'):
+        return assets.response(request, path)
+
+def precache_entries():
+    """Every URL a learner needs offline, with its current revision"""
+    yield '/', pages.page('summary', summary_page).etag.strip('"'), False
+    for category, shown in first_screen().items():
+        for offset in range(shown, len(catalog.category(category)), PAGE_SIZE):
+            render = lambda category=category, offset=offset: category_cards(category, offset, PAGE_SIZE)
+            page = pages.page(f'summary/{category}/{offset}', render, htmx=True)
+            yield f'/summary/{quote(category, safe="")}?offset={offset}', page.etag.strip('"'), True
+    for char in catalog:
+        key = f'flashcard/{char.id}'
+        full = lambda char=char: flashcard_content(char, 0, 1)
+        fragment = lambda char=char: flashcard_fragment(char)
+        yield f'/flashcard/{char.id}', pages.page(key, full).etag.strip('"'), False
+        yield f'/flashcard/{char.id}', pages.page(key, fragment, htmx=True).etag.strip('"'), True
+        clip = audio.get(char.id)
+        if clip is not None:
+            yield audio.url(char.id), clip.fingerprint, False
+    bundle = bundles.get(ALL)
+    yield f'/audio/bundle/{ALL}.json', bundle.manifest_etag.strip('"'), False
+    yield bundle.manifest['url'], bundle.digest, False
+    for asset in assets:
+        # Clips are cached through /audio; the worker script must never be
+        if asset.path.startswith('audio/') or asset.path == 'js/sw.js':
+            continue
+        yield assets.url(asset.path), asset.digest, False
+
+# Versioned list of everything the service worker precaches
+precache = PrecacheManifest(catalog, precache_entries)
+precache.refresh()
+
+@rt("/db-stats")
+def get():
+    """Pool waits and named query latency"""
+    return JSONResponse(db.report())
+
+@rt("/metrics")
+async def get():
+    """Request counters, latency histograms and gauges in Prometheus text format.
+
+    Runs on the event loop: the classroom hub the gauges read isn't thread-safe.
+    """
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+@rt("/precache-manifest.json")
+def get(request):
+    """Serve the service worker's precache manifest"""
+    catalog.refresh()
+    audio.refresh()
+    return precache.response(request)
+
+@rt("/sw.js")
+def get(request):
+    """Serve the service worker from the root so it controls every page"""
+    return assets.response(request, 'js/sw.js')
+
+# fast_app registers a catch-all static file route before ours; keep it last
+app.router.routes.sort(key=lambda route: getattr(route, 'path', None) == '/{fname:path}.{ext:static}')
 
 if __name__ == "__main__":
     serve()
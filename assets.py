@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted static asset pipeline for the Hiragana flashcard application.
+Content-hashes every file under static/, precompresses text assets with gzip
+(and brotli when available), and serves them from an in-memory path table with
+immutable caching and Accept-Encoding negotiation.
+
+Run directly to write the hashed files and their compressed variants to
+build/static for deployment behind a CDN or reverse proxy.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+
+from starlette.responses import FileResponse, Response
+
+from page_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+MEDIA_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.html': 'text/html; charset=utf-8',
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+}
+
+# Only these types are worth compressing; audio and images already are
+COMPRESSIBLE = {'.css', '.js', '.json', '.svg', '.html', '.txt', '.map'}
+
+# Skip variants that don't save at least this fraction of the original size
+MIN_SAVING = 0.1
+
+
+class Asset:
+    """One file under static/ with its hashed URL and encoded variants"""
+    __slots__ = ('path', 'file_path', 'hashed_path', 'media_type', 'digest',
+                 'etag', 'stat', 'body', 'variants')
+
+    def __init__(self, path, file_path, body, stat):
+        self.path = path
+        self.file_path = file_path
+        self.stat = stat
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{self.digest}"'
+        root, ext = os.path.splitext(path)
+        self.hashed_path = f"{root}.{self.digest[:10]}{ext}"
+        self.media_type = (MEDIA_TYPES.get(ext)
+                           or mimetypes.guess_type(path)[0]
+                           or 'application/octet-stream')
+        self.variants = {}
+        if ext in COMPRESSIBLE:
+            # Text assets are small; keep them in memory with their variants
+            self.body = body
+            for encoding, data in compress(body).items():
+                if len(data) <= len(body) * (1 - MIN_SAVING):
+                    self.variants[encoding] = data
+        else:
+            self.body = None
+
+
+def compress(body):
+    """Precompressed variants of ``body`` keyed by content-coding"""
+    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def accepted_encodings(header):
+    """Content-codings the client accepts, from an Accept-Encoding header"""
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def negotiate(header, available, preference=('br', 'gzip')):
+    """Best available encoding for an Accept-Encoding header, or None"""
+    if not available:
+        return None
+    accepted = accepted_encodings(header)
+    for encoding in preference:
+        if encoding in available and (encoding in accepted or '*' in accepted):
+            return encoding
+    return None
+
+
+class AssetTable:
+    """In-memory table of every static asset, keyed by plain and hashed path"""
+
+    def __init__(self, static_dir='static', prefix='/static'):
+        self.static_dir = static_dir
+        self.prefix = prefix.rstrip('/')
+        self._assets = {}
+        self._hashed = {}
+        self.build()
+
+    def build(self):
+        """Hash and precompress every file under the static directory"""
+        assets, hashed = {}, {}
+        for root, dirs, files in os.walk(self.static_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                file_path = os.path.join(root, name)
+                path = os.path.relpath(file_path, self.static_dir).replace(os.sep, '/')
+                with open(file_path, 'rb') as f:
+                    body = f.read()
+                asset = Asset(path, file_path, body, os.stat(file_path))
+                assets[path] = asset
+                hashed[asset.hashed_path] = asset
+        self._assets, self._hashed = assets, hashed
+        return self
+
+    def add(self, path, body):
+        """Register generated content as an asset at ``path``.
+
+        The plain path moves to the new content; hashed paths of earlier
+        content stay servable, since cached pages may still reference them.
+        """
+        asset = Asset(path, None, body, None)
+        self._hashed[asset.hashed_path] = asset
+        self._assets[path] = asset
+        return asset
+
+    def __len__(self):
+        return len(self._assets)
+
+    def __iter__(self):
+        return iter(self._assets.values())
+
+    def url(self, path):
+        """Fingerprinted URL for a static path; unknown paths are left as-is"""
+        asset = self._assets.get(path)
+        return f"{self.prefix}/{asset.hashed_path if asset else path}"
+
+    def lookup(self, path):
+        """(asset, is_hashed) for a request path, or (None, False)"""
+        asset = self._hashed.get(path)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(path), False
+
+    def response(self, request, path):
+        """Serve a static asset, negotiating a precompressed variant"""
+        asset, hashed = self.lookup(path)
+        if asset is None:
+            return Response("File not found", status_code=404)
+        headers = {
+            'ETag': asset.etag,
+            'Cache-Control': IMMUTABLE if hashed else REVALIDATE,
+        }
+        if asset.body is None:
+            return FileResponse(asset.file_path, media_type=asset.media_type,
+                                headers=headers, stat_result=asset.stat)
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = negotiate(request.headers.get('accept-encoding'), asset.variants)
+        if encoding:
+            # Each encoding is a different representation with its own validator
+            headers['ETag'] = f'"{asset.digest}-{encoding}"'
+            headers['Content-Encoding'] = encoding
+        if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+            return Response(status_code=304, headers=headers)
+        body = asset.variants[encoding] if encoding else asset.body
+        return Response(body, media_type=asset.media_type, headers=headers)
+
+    def write(self, out_dir='build/static'):
+        """Write hashed files and .gz/.br variants for deployment"""
+        written = 0
+        for asset in self:
+            target = os.path.join(out_dir, asset.hashed_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if asset.body is None:
+                with open(asset.file_path, 'rb') as src, open(target, 'wb') as dst:
+                    dst.write(src.read())
+            else:
+                with open(target, 'wb') as f:
+                    f.write(asset.body)
+                for encoding, data in asset.variants.items():
+                    suffix = '.gz' if encoding == 'gzip' else f'.{encoding}'
+                    with open(target + suffix, 'wb') as f:
+                        f.write(data)
+                        written += 1
+            written += 1
+        return written
+
+
+def main():
+    """Build fingerprinted assets into build/static"""
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else 'build/static'
+    table = AssetTable('static')
+    written = table.write(out_dir)
+    print(f"📦 Wrote {written} files for {len(table)} assets to {out_dir}")
+    if brotli is None:
+        print("ℹ️  Install 'brotli' to also produce .br variants")
+    for asset in table:
+        if asset.variants:
+            sizes = ', '.join(f"{enc} {len(data):,}" for enc, data in asset.variants.items())
+            print(f"  {asset.path} → {asset.hashed_path} ({len(asset.body):,} bytes; {sizes})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Audio bundles for the Hiragana flashcard application.
+Joins the clips for a category (or the whole catalog) into one cacheable MP3
+payload with a JSON manifest of byte offsets and durations, so the client can
+play any character in the bundle without another round trip.
+"""
+
+import hashlib
+import json
+import threading
+
+from starlette.responses import Response
+
+from audio_index import IMMUTABLE, REVALIDATE
+from mp3 import scan
+from page_cache import etag_matches
+
+ALL = 'all'
+
+
+class AudioBundle:
+    """Concatenated clip payload and its manifest"""
+    __slots__ = ('name', 'version', 'body', 'digest', 'etag', 'manifest', 'manifest_body', 'manifest_etag')
+
+    def __init__(self, name, version, body, clips):
+        self.name = name
+        self.version = version
+        self.body = body
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{self.digest}"'
+        self.manifest = {
+            'name': name,
+            'url': f"/audio/bundle/{name}?v={self.digest[:12]}",
+            'size': len(body),
+            'clips': clips,
+        }
+        self.manifest_body = json.dumps(self.manifest, ensure_ascii=False,
+                                        separators=(',', ':')).encode('utf-8')
+        self.manifest_etag = '"' + hashlib.blake2b(self.manifest_body, digest_size=16).hexdigest() + '"'
+
+
+class AudioBundles:
+    """Builds and caches audio bundles per category, catalog and audio index version"""
+
+    def __init__(self, catalog, audio_index):
+        self.catalog = catalog
+        self.audio = audio_index
+        self._bundles = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Bundle names: every category plus the full syllabary"""
+        return (ALL, *self.catalog.categories())
+
+    def get(self, name):
+        """Bundle for a category or ``all``, or None for unknown names"""
+        version = (self.catalog.version, self.audio.version)
+        bundle = self._bundles.get(name)
+        if bundle is not None and bundle.version == version:
+            return bundle
+        if name == ALL:
+            chars = list(self.catalog)
+        elif name in self.catalog.categories():
+            chars = self.catalog.category(name)
+        else:
+            return None
+        bundle = self.build(name, version, chars)
+        with self._lock:
+            self._bundles[name] = bundle
+        return bundle
+
+    def build(self, name, version, chars):
+        """Concatenate the MPEG audio of each character's clip"""
+        parts, clips, offset, start_time = [], [], 0, 0.0
+        for char in chars:
+            clip = self.audio.get(char.id)
+            if clip is None:
+                continue
+            data = clip.body
+            if data is None:
+                with open(clip.path, 'rb') as f:
+                    data = f.read()
+            info = scan(data)
+            # Drop ID3 tags so the payload stays a clean frame sequence
+            frames = data[info.audio_start:info.audio_end]
+            parts.append(frames)
+            clips.append({
+                'id': char.id,
+                'romaji': char.romaji,
+                'url': self.audio.url(char.id),
+                'offset': offset,
+                'length': len(frames),
+                'start': round(start_time, 4),
+                'duration': round(info.duration, 4),
+            })
+            offset += len(frames)
+            start_time += info.duration
+        return AudioBundle(name, version, b''.join(parts), clips)
+
+    def response(self, request, bundle):
+        """Serve a bundle payload with validators and caching headers"""
+        fingerprinted = request.query_params.get('v') == bundle.digest[:12]
+        headers = {
+            'ETag': bundle.etag,
+            'Cache-Control': IMMUTABLE if fingerprinted else REVALIDATE,
+        }
+        if etag_matches(request.headers.get('if-none-match'), bundle.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(bundle.body, media_type='audio/mpeg', headers=headers)
+
+    def manifest_response(self, request, bundle):
+        """Serve a bundle's JSON manifest; it always revalidates"""
+        headers = {'ETag': bundle.manifest_etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), bundle.manifest_etag):
+            return Response(status_code=304, headers=headers)
+        return Response(bundle.manifest_body, media_type='application/json', headers=headers)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Audio fetcher for the Hiragana flashcard application.
+Downloads the pronunciation clips listed in data/audio_sources.json on a
+thread pool, with a token bucket per host instead of fixed sleeps. Interrupted
+downloads resume with HTTP Range requests, every file is checked against the
+manifest's SHA-256 before it is moved into place, and clips that already
+match are skipped.
+
+Usage:
+    python3 audio_fetch.py                               # fetch missing or bad clips
+    python3 audio_fetch.py -j 16 --rate 8                # more workers, 8 requests/s per host
+    python3 audio_fetch.py --mirror http://localhost:8000 # fetch from a local stand-in server
+    python3 audio_fetch.py --record                      # store checksums of the local clips
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+MANIFEST = 'data/audio_sources.json'
+AUDIO_DIR = 'static/audio'
+USER_AGENT = 'hiragana-audio-fetch/1.0'
+CHUNK_SIZE = 64 * 1024
+
+# Requests per second per host, and how many may go out back to back
+RATE = 4.0
+BURST = 4
+RETRIES = 4
+
+
+class Source:
+    """One manifest entry"""
+    __slots__ = ('file', 'url', 'character', 'size', 'sha256')
+
+    def __init__(self, file, url, character=None, size=None, sha256=None):
+        self.file = file
+        self.url = url
+        self.character = character
+        self.size = size
+        self.sha256 = sha256
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FetchResult:
+    """Outcome of fetching one source"""
+    __slots__ = ('source', 'status', 'bytes', 'resumed', 'error')
+
+    def __init__(self, source, status, bytes=0, resumed=False, error=None):
+        self.source = source
+        self.status = status        # 'downloaded', 'skipped' or 'failed'
+        self.bytes = bytes
+        self.resumed = resumed
+        self.error = error
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second with bursts of up to ``burst``"""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_manifest(path=MANIFEST):
+    with open(path, encoding='utf-8') as f:
+        return [Source(**entry) for entry in json.load(f)['sources']]
+
+
+def save_manifest(sources, path=MANIFEST):
+    lines = ',\n'.join('    ' + json.dumps(source.as_dict(), ensure_ascii=False) for source in sources)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('{\n  "sources": [\n' + lines + '\n  ]\n}\n')
+    os.replace(path + '.tmp', path)
+
+
+def file_digest(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def matches(path, source):
+    """True if ``path`` exists and agrees with the manifest's size and checksum"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if source.size is not None and size != source.size:
+        return False
+    return source.sha256 is None or file_digest(path) == source.sha256
+
+
+def mirrored(url, mirror):
+    """``url`` with its scheme and host replaced by those of ``mirror``"""
+    if not mirror:
+        return url
+    base = urlsplit(mirror)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip('/') + parts.path, parts.query, ''))
+
+
+def _download(url, part, offset, timeout):
+    """Stream ``url`` into ``part`` from ``offset``; returns (bytes written, resumed)"""
+    headers = {'User-Agent': USER_AGENT}
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as resp:
+        resumed = offset > 0 and resp.status == 206
+        if resumed and not resp.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+            raise ValueError(f"server resumed from the wrong offset: {resp.headers.get('Content-Range')}")
+        written = 0
+        # A 200 to a Range request is the whole file again
+        with open(part, 'ab' if resumed else 'wb') as f:
+            for chunk in iter(lambda: resp.read(CHUNK_SIZE), b''):
+                f.write(chunk)
+                written += len(chunk)
+        # urllib returns a short body rather than raising when the peer hangs up
+        expected = resp.headers.get('Content-Length')
+        if expected is not None and written < int(expected):
+            raise ConnectionError(f"connection closed after {written} of {expected} bytes")
+    return written, resumed
+
+
+def fetch(source, dest_dir=AUDIO_DIR, bucket=None, mirror=None, retries=RETRIES, timeout=30):
+    """Download one source unless the local copy already matches"""
+    target = os.path.join(dest_dir, source.file)
+    if matches(target, source):
+        return FetchResult(source, 'skipped')
+    part = target + '.part'
+    url = mirrored(source.url, mirror)
+    total, resumed, error = 0, False, None
+    for attempt in range(retries):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if source.size is not None and offset >= source.size:
+            # Complete (or overlong) leftovers are checked below, not re-requested
+            written, was_resumed = 0, offset > 0
+        else:
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                written, was_resumed = _download(url, part, offset, timeout)
+            except urllib.error.HTTPError as e:
+                error = f"HTTP {e.code}"
+                if e.code == 416:
+                    os.remove(part)     # our partial no longer lines up with the file
+                elif e.code != 429 and e.code < 500:
+                    break
+                time.sleep(min(2 ** attempt, 10) * 0.5)
+                continue
+            except (OSError, ValueError) as e:
+                # Connection dropped: keep the partial file and resume from it
+                error = str(e) or e.__class__.__name__
+                time.sleep(min(2 ** attempt, 10) * 0.5)
+                continue
+        total += written
+        resumed = resumed or was_resumed
+        if source.sha256 is not None and file_digest(part) != source.sha256:
+            error = "checksum mismatch"
+            os.remove(part)
+            continue
+        os.replace(part, target)
+        return FetchResult(source, 'downloaded', total, resumed)
+    return FetchResult(source, 'failed', total, resumed, error)
+
+
+def run(sources, dest_dir=AUDIO_DIR, workers=8, rate=RATE, burst=BURST, mirror=None):
+    """Fetch every source concurrently, rate limited per host; results in manifest order"""
+    os.makedirs(dest_dir, exist_ok=True)
+    buckets = {urlsplit(mirrored(source.url, mirror)).netloc: None for source in sources}
+    for host in buckets:
+        buckets[host] = TokenBucket(rate, burst)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fetch, source, dest_dir,
+                               buckets[urlsplit(mirrored(source.url, mirror)).netloc], mirror)
+                   for source in sources]
+        return [future.result() for future in futures]
+
+
+def record(sources, dest_dir=AUDIO_DIR):
+    """Fill in size and checksum from the local clips; returns entries updated"""
+    updated = 0
+    for source in sources:
+        path = os.path.join(dest_dir, source.file)
+        if not os.path.exists(path):
+            continue
+        size, digest = os.path.getsize(path), file_digest(path)
+        if (source.size, source.sha256) != (size, digest):
+            source.size, source.sha256 = size, digest
+            updated += 1
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download pronunciation clips listed in the manifest")
+    parser.add_argument('--manifest', default=MANIFEST, help="JSON list of sources")
+    parser.add_argument('--dest', default=AUDIO_DIR, help="directory to write clips to")
+    parser.add_argument('-j', '--jobs', type=int, default=8, help="concurrent downloads")
+    parser.add_argument('--rate', type=float, default=RATE, help="requests per second per host")
+    parser.add_argument('--burst', type=int, default=BURST, help="requests allowed back to back per host")
+    parser.add_argument('--mirror', help="fetch from this base URL instead of each source's host")
+    parser.add_argument('--record', action='store_true',
+                        help="store the sizes and checksums of the local clips in the manifest")
+    args = parser.parse_args(argv)
+
+    sources = load_manifest(args.manifest)
+    if args.record:
+        updated = record(sources, args.dest)
+        save_manifest(sources, args.manifest)
+        print(f"📝 Recorded checksums for {updated} of {len(sources)} sources in {args.manifest}")
+        return 0
+
+    hosts = {urlsplit(mirrored(source.url, args.mirror)).netloc for source in sources}
+    print(f"🎵 Fetching {len(sources)} clips from {len(hosts)} host(s) on {args.jobs} workers "
+          f"({args.rate:g} requests/s per host)")
+    start = time.perf_counter()
+    results = run(sources, args.dest, args.jobs, args.rate, args.burst, args.mirror)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        source = result.source
+        if result.status == 'failed':
+            print(f"  ❌ {source.file} ({source.character}): {result.error}")
+        elif result.status == 'downloaded':
+            note = ' (resumed)' if result.resumed else ''
+            print(f"  📥 {source.file} ({source.character}): {result.bytes} bytes{note}")
+    counts = {status: sum(1 for r in results if r.status == status)
+              for status in ('downloaded', 'skipped', 'failed')}
+    received = sum(r.bytes for r in results)
+    print(f"✅ {counts['downloaded']} downloaded, ⏭️  {counts['skipped']} already valid, "
+          f"❌ {counts['failed']} failed in {elapsed:.2f}s ({received / 1024:.1f} KiB)")
+    unverified = sum(1 for source in sources if source.sha256 is None)
+    if unverified:
+        print(f"⚠️  {unverified} sources have no checksum; run with --record to add them")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
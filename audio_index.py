@@ -0,0 +1,275 @@
+"""
+Audio manifest index for the Hiragana flashcard application.
+Maps each character id to its clip's path, size, mtime and content hash once,
+so /audio/{char_id} can serve byte ranges and validators without touching the
+database or the filesystem metadata on every click. Clips up to
+``INLINE_LIMIT`` bytes are held in memory, so serving one never blocks on
+file I/O. Normalized clips from audio_pipeline.py are preferred when present,
+and clients whose Accept header allows it get the smaller Opus variant. Clips
+added or replaced on disk (by audio_pipeline.py or audio_fetch.py) are picked
+up by ``refresh(rescan=True)``, which compares the directory listing.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from email.utils import formatdate
+
+from starlette.responses import FileResponse, Response
+
+from metrics import log_event
+from page_cache import etag_matches
+
+# Clip URLs carry the content hash, so a matching request can be cached forever
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=3600'
+
+# Output directory of audio_pipeline.py, relative to the audio directory
+PROCESSED = 'processed'
+OPUS = 'audio/ogg; codecs=opus'
+# Media ranges that explicitly accept Ogg Opus; wildcards alone don't, since
+# not every browser that sends */* can play it
+OPUS_RANGES = {'audio/ogg', 'audio/opus', 'application/ogg'}
+
+# Clips up to this size are kept in memory; larger ones stream from disk
+INLINE_LIMIT = 256 * 1024
+# Files whose appearance or change triggers a rebuild on rescan
+CLIP_EXTENSIONS = ('.mp3', '.opus')
+
+
+class AudioClip:
+    """Metadata for one audio file on disk"""
+    __slots__ = ('char_id', 'romaji', 'path', 'size', 'mtime', 'stat',
+                 'digest', 'etag', 'last_modified', 'media_type', 'opus', 'fingerprint', 'body')
+
+    def __init__(self, char_id, romaji, path, stat, digest, media_type='audio/mpeg', body=None):
+        self.char_id = char_id
+        self.romaji = romaji
+        self.path = path
+        self.stat = stat
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.digest = digest
+        self.etag = f'"{digest}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.media_type = media_type
+        # Opus variant of the same clip, if one was generated
+        self.opus = None
+        # Changes whenever any variant does; used in cache-busting URLs
+        self.fingerprint = digest
+        # File contents for small clips, None for ones served from disk
+        self.body = body
+
+    def add_opus(self, clip):
+        """Attach an Opus variant and fold its hash into the fingerprint"""
+        self.opus = clip
+        self.fingerprint = hashlib.blake2b(f"{self.digest}:{clip.digest}".encode(),
+                                           digest_size=16).hexdigest()
+        return self
+
+
+def file_digest(path, chunk_size=65536):
+    """Content hash of a file"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_small(path, stat, limit=INLINE_LIMIT):
+    """(contents or None, content hash): files up to ``limit`` bytes are read once"""
+    if stat.st_size > limit:
+        return None, file_digest(path)
+    with open(path, 'rb') as f:
+        body = f.read()
+    return body, hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def parse_range(header, size):
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None when the header should be ignored (absent, malformed,
+    reversed or multiple ranges, which are answered with the full body) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec or '-' not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split('-', 1))
+    # ASCII digits only: str.isdigit() also accepts characters like '²'
+    if not (first or last) or not all(part.isascii() and part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def accepts_opus(header):
+    """True if an Accept header names an Ogg/Opus type with a non-zero q"""
+    if not header:
+        return False
+    for part in header.split(','):
+        media_range, *params = (piece.strip() for piece in part.split(';'))
+        if media_range.lower() not in OPUS_RANGES:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            return True
+    return False
+
+
+class AudioIndex:
+    """Index of pronunciation clips for every catalog row"""
+
+    def __init__(self, catalog, audio_dir='static/audio'):
+        self.catalog = catalog
+        self.audio_dir = audio_dir
+        self._lock = threading.Lock()
+        self._clips = {}
+        self._missing = ()
+        self._version = None
+        self._listing = None
+        # Bumped on every build, so caches of clip data know when to rebuild
+        self.version = 0
+        self.refresh()
+
+    def refresh(self, rescan=False):
+        """Rebuild the index if the catalog changed since the last build.
+
+        With ``rescan``, also rebuild when a clip file was added, removed or
+        changed. Returns True if the index was rebuilt.
+        """
+        listing = self.listing() if rescan else None
+        if self._version != self.catalog.version or (rescan and listing != self._listing):
+            with self._lock:
+                if self._version != self.catalog.version or (rescan and listing != self._listing):
+                    self.build(listing)
+                    return True
+        return False
+
+    def listing(self):
+        """Sorted (path, size, mtime) of the clip files in the audio directories"""
+        files = []
+        for directory in (self.audio_dir, os.path.join(self.audio_dir, PROCESSED)):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(CLIP_EXTENSIONS) and entry.is_file():
+                            stat = entry.stat()
+                            files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                continue
+        return sorted(files)
+
+    def build(self, listing=None):
+        """Stat and hash every clip referenced by the catalog"""
+        version = self.catalog.version
+        listing = self.listing() if listing is None else listing
+        clips, missing = {}, []
+        processed = os.path.join(self.audio_dir, PROCESSED)
+        for char in self.catalog:
+            # The normalized MP3 wins over the original recording
+            clip = (self._clip(char, os.path.join(processed, f"{char.romaji}.mp3"))
+                    or self._clip(char, os.path.join(self.audio_dir, f"{char.romaji}.mp3")))
+            if clip is None:
+                missing.append(char)
+                continue
+            opus = self._clip(char, os.path.join(processed, f"{char.romaji}.opus"), OPUS)
+            clips[char.id] = clip.add_opus(opus) if opus else clip
+        self._clips, self._missing, self._version = clips, tuple(missing), version
+        self._listing = listing
+        self.version += 1
+        if missing:
+            log_event(logging.WARNING, 'audio_missing', count=len(missing),
+                      characters=[f"{c.character} ({c.romaji})" for c in missing])
+        return self
+
+    @staticmethod
+    def _clip(char, path, media_type='audio/mpeg'):
+        try:
+            stat = os.stat(path)
+            body, digest = read_small(path, stat)
+            return AudioClip(char.id, char.romaji, path, stat, digest, media_type, body)
+        except OSError:
+            return None
+
+    def get(self, char_id):
+        """Clip for a character id, or None when there is no audio"""
+        return self._clips.get(char_id)
+
+    @property
+    def missing(self):
+        """Catalog characters that have no audio file"""
+        return self._missing
+
+    def __len__(self):
+        return len(self._clips)
+
+    def url(self, char_id):
+        """Cache-busting URL for a character's clip"""
+        clip = self._clips.get(char_id)
+        if clip is None:
+            return f"/audio/{char_id}"
+        return f"/audio/{char_id}?v={clip.fingerprint[:12]}"
+
+    def response(self, request, clip):
+        """Serve a clip with validators, caching and byte-range support"""
+        fingerprinted = request.query_params.get('v') == clip.fingerprint[:12]
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': IMMUTABLE if fingerprinted else REVALIDATE,
+        }
+        if clip.opus is not None:
+            headers['Vary'] = 'Accept'
+            if accepts_opus(request.headers.get('accept')):
+                clip = clip.opus
+        headers['ETag'] = clip.etag
+        headers['Last-Modified'] = clip.last_modified
+        if etag_matches(request.headers.get('if-none-match'), clip.etag):
+            return Response(status_code=304, headers=headers)
+
+        # Honour If-Range: only send a partial body if the client's copy is current
+        if_range = request.headers.get('if-range')
+        range_header = request.headers.get('range')
+        if if_range and if_range not in (clip.etag, clip.last_modified):
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, clip.size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f"bytes */{clip.size}"})
+
+        if byte_range is None:
+            if clip.body is not None:
+                return Response(clip.body, media_type=clip.media_type, headers=headers)
+            return FileResponse(clip.path, media_type=clip.media_type,
+                                headers=headers, stat_result=clip.stat)
+        start, end = byte_range
+        if clip.body is not None:
+            body = clip.body[start:end + 1]
+        else:
+            with open(clip.path, 'rb') as f:
+                f.seek(start)
+                body = f.read(end - start + 1)
+        headers['Content-Range'] = f"bytes {start}-{end}/{clip.size}"
+        return Response(body, status_code=206, media_type=clip.media_type, headers=headers)
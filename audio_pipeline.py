@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Audio generation and normalization pipeline for the Hiragana flashcard application.
+Runs a process pool over every catalog row, takes the recorded clip from
+static/audio (or synthesizes one with espeak-ng when there is none), trims
+leading and trailing silence, normalizes loudness, and writes Opus and MP3
+variants to static/audio/processed. Rows whose source and settings haven't
+changed since the last run are skipped.
+
+Requires ffmpeg (with libopus and libmp3lame) and, for rows without a
+recording, espeak-ng or espeak.
+
+Usage:
+    python3 audio_pipeline.py              # process changed rows
+    python3 audio_pipeline.py -j 8 --force # reprocess everything on 8 workers
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+AUDIO_DIR = 'static/audio'
+PROCESSED_DIR = os.path.join(AUDIO_DIR, 'processed')
+MANIFEST = 'manifest.json'
+
+SETTINGS = {
+    'loudness': -16,        # integrated loudness target, LUFS
+    'true_peak': -1.5,      # dBTP
+    'loudness_range': 11,   # LU
+    'silence': -50,         # dB below which leading/trailing audio is trimmed
+    'sample_rate': 48000,
+    'opus_bitrate': '32k',
+    'mp3_bitrate': '64k',
+    'voice': 'ja',
+}
+
+# Output extension -> ffmpeg encoder arguments
+FORMATS = {
+    'opus': lambda s: ['-c:a', 'libopus', '-b:a', s['opus_bitrate'], '-application', 'voip'],
+    'mp3': lambda s: ['-c:a', 'libmp3lame', '-b:a', s['mp3_bitrate']],
+}
+
+
+def settings_key(settings=SETTINGS):
+    """Short hash of the processing settings; changing any setting reprocesses"""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def filter_chain(settings=SETTINGS):
+    """ffmpeg filter graph: trim silence at both ends, then normalize loudness"""
+    trim = (f"silenceremove=start_periods=1:start_threshold={settings['silence']}dB"
+            f":start_silence=0.02")
+    return ','.join((
+        trim, 'areverse', trim, 'areverse',
+        f"loudnorm=I={settings['loudness']}:TP={settings['true_peak']}:LRA={settings['loudness_range']}",
+    ))
+
+
+def source_digest(path):
+    """SHA-256 of a recorded source clip"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_tools():
+    """Paths of ffmpeg and an espeak binary (either may be None)"""
+    return shutil.which('ffmpeg'), shutil.which('espeak-ng') or shutil.which('espeak')
+
+
+def plan(chars, settings=SETTINGS, audio_dir=AUDIO_DIR):
+    """One job per catalog row: (romaji, text, source path or None, source digest)"""
+    jobs = []
+    for char in chars:
+        path = os.path.join(audio_dir, f"{char.romaji}.mp3")
+        if os.path.exists(path):
+            jobs.append((char.romaji, char.character, path, source_digest(path)))
+        else:
+            # Synthesized: the text and voice are the source
+            text_digest = hashlib.sha256(f"tts:{settings['voice']}:{char.character}".encode()).hexdigest()
+            jobs.append((char.romaji, char.character, None, text_digest))
+    return jobs
+
+
+def is_current(entry, digest, key, romaji, out_dir=PROCESSED_DIR):
+    """True if a manifest entry matches and every output still exists"""
+    return (entry is not None and entry.get('source') == digest and entry.get('settings') == key
+            and all(os.path.exists(os.path.join(out_dir, f"{romaji}.{ext}")) for ext in FORMATS))
+
+
+def process(job, settings, ffmpeg, espeak, out_dir=PROCESSED_DIR):
+    """Render one row's variants; runs in a worker process.
+
+    Returns (romaji, digest, error or None, {ext: bytes written}).
+    """
+    romaji, text, source, digest = job
+    with tempfile.TemporaryDirectory(prefix='hiragana-audio-') as tmp:
+        if source is None:
+            if espeak is None:
+                return romaji, digest, "no recording and espeak is not installed", {}
+            source = os.path.join(tmp, 'tts.wav')
+            result = subprocess.run([espeak, '-v', settings['voice'], '-w', source, text],
+                                    capture_output=True)
+            if result.returncode != 0:
+                return romaji, digest, result.stderr.decode(errors='replace').strip(), {}
+        sizes = {}
+        for ext, encoder in FORMATS.items():
+            target = os.path.join(out_dir, f"{romaji}.{ext}")
+            partial = os.path.join(tmp, f"out.{ext}")
+            result = subprocess.run(
+                [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+                 '-af', filter_chain(settings), '-ac', '1', '-ar', str(settings['sample_rate']),
+                 '-map_metadata', '-1', *encoder(settings), partial],
+                capture_output=True)
+            if result.returncode != 0:
+                return romaji, digest, result.stderr.decode(errors='replace').strip(), sizes
+            # Publish whole files only; readers never see a half-written clip
+            shutil.move(partial, target + '.tmp')
+            os.replace(target + '.tmp', target)
+            sizes[ext] = os.path.getsize(target)
+    return romaji, digest, None, sizes
+
+
+def load_manifest(out_dir=PROCESSED_DIR):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, out_dir=PROCESSED_DIR):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def run(chars, workers=None, force=False, settings=SETTINGS,
+        audio_dir=AUDIO_DIR, out_dir=PROCESSED_DIR):
+    """Process every stale row in parallel; returns (processed, skipped, failed)"""
+    ffmpeg, espeak = find_tools()
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required: install it and re-run")
+    os.makedirs(out_dir, exist_ok=True)
+    key = settings_key(settings)
+    manifest = load_manifest(out_dir)
+    jobs = plan(chars, settings, audio_dir)
+    stale = [job for job in jobs
+             if force or not is_current(manifest.get(job[0]), job[3], key, job[0], out_dir)]
+    processed, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process, job, settings, ffmpeg, espeak, out_dir) for job in stale]
+        for future in futures:
+            romaji, digest, error, sizes = future.result()
+            if error:
+                failed.append((romaji, error))
+                manifest.pop(romaji, None)
+                continue
+            manifest[romaji] = {'source': digest, 'settings': key, 'sizes': sizes}
+            processed.append((romaji, sizes))
+    save_manifest(manifest, out_dir)
+    return processed, len(jobs) - len(stale), failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalize and encode pronunciation clips")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('--force', action='store_true', help="reprocess rows even if unchanged")
+    parser.add_argument('--db', default='data/hiragana.db', help="database file")
+    args = parser.parse_args(argv)
+
+    from catalog import Catalog
+    catalog = Catalog(args.db)
+    print(f"🎛️  Processing audio for {len(catalog)} characters on {args.jobs} workers...")
+    start = time.perf_counter()
+    try:
+        processed, skipped, failed = run(list(catalog), args.jobs, args.force)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    for romaji, error in failed:
+        print(f"  ❌ {romaji}: {error}")
+    opus = sum(sizes.get('opus', 0) for _, sizes in processed)
+    mp3 = sum(sizes.get('mp3', 0) for _, sizes in processed)
+    print(f"✅ {len(processed)} processed, ⏭️  {skipped} unchanged, ❌ {len(failed)} failed "
+          f"in {elapsed:.2f}s")
+    if processed:
+        print(f"📦 Opus {opus / 1024:.1f} KiB vs MP3 {mp3 / 1024:.1f} KiB")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+In-process load test and latency benchmark for the Hiragana flashcard application.
+Drives the ASGI `app` directly (no network, no server) with a weighted mix of
+requests at a configurable concurrency, reports throughput, latency percentiles
+and bytes per response for each route, and can compare the results with a
+baseline saved locally on the same machine so regressions fail the run.
+
+Usage:
+    python3 benchmark.py                               # default mix, 2000 requests
+    python3 benchmark.py -n 10000 -c 64 -o results.json
+    python3 benchmark.py --save-baseline               # store benchmarks/baseline.json
+    python3 benchmark.py --baseline benchmarks/baseline.json --threshold 0.25
+    python3 benchmark.py --classroom 30,100,300        # SSE fan-out latency by audience size
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from urllib.parse import quote
+
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+
+# Route name -> relative weight in the default mix
+DEFAULT_MIX = {
+    'summary': 35,
+    'summary_htmx': 5,
+    'flashcard': 15,
+    'flashcard_htmx': 15,
+    'audio': 20,
+    'static': 10,
+    'search': 10,
+}
+
+
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BOLD = '\033[1m'
+    END = '\033[0m'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def request_scope(path, headers=()):
+    """ASGI scope for a GET of ``path``"""
+    raw_path, _, query = path.partition('?')
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': raw_path,
+        'raw_path': raw_path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'bench')] + [(k.lower().encode(), v.encode()) for k, v in headers],
+        'client': ('127.0.0.1', 50000),
+        'server': ('bench', 80),
+    }
+
+
+async def asgi_request(app, path, headers=()):
+    """Send one GET through the ASGI interface; returns (status, body_bytes)"""
+    scope = request_scope(path, headers)
+    received = False
+    status, size = 0, 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.sleep(3600)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status, size
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            size += len(message.get('body', b''))
+        elif message['type'] == 'http.response.pathsend':
+            size += os.path.getsize(message['path'])
+
+    await app(scope, receive, send)
+    return status, size
+
+
+async def asgi_stream(app, path, on_body, disconnect):
+    """Hold a streaming GET open, passing each body chunk to ``on_body``, until ``disconnect`` is set"""
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            on_body(message['body'])
+
+    await app(request_scope(path), receive, send)
+
+
+async def run_classroom(app_module, sizes, rounds):
+    """Time each card from the teacher's publish to its arrival on every student's stream"""
+    hub = app_module.classrooms
+    # Measure past the per-room cap if asked to
+    hub.max_subscribers = max(hub.max_subscribers, *sizes)
+    chars = list(app_module.catalog)
+    results = {}
+    for size in sizes:
+        room = hub.create('benchmark')
+        disconnect, arrived = asyncio.Event(), asyncio.Event()
+        latencies, remaining, started = [], 0, 0.0
+
+        def on_body(body):
+            nonlocal remaining
+            if b'\nevent: card\n' in body:
+                latencies.append(time.perf_counter() - started)
+                remaining -= 1
+                if not remaining:
+                    arrived.set()
+
+        streams = [asyncio.ensure_future(asgi_stream(app_module.app, f'/classroom/{room.code}/events',
+                                                     on_body, disconnect))
+                   for _ in range(size)]
+        while len(room.subscribers) < size:
+            if any(stream.done() for stream in streams):
+                raise RuntimeError(f"a classroom stream ended early ({len(room.subscribers)} of {size} joined)")
+            await asyncio.sleep(0.005)
+
+        publish, fanout = [], []
+        # The first round renders the card fragment; it isn't measured
+        for i in range(rounds + 1):
+            if i == 1:
+                latencies.clear()
+            remaining = size
+            arrived.clear()
+            started = time.perf_counter()
+            app_module.show_card(room, chars[i % len(chars)])
+            published = time.perf_counter() - started
+            await asyncio.wait_for(arrived.wait(), 60)
+            if i:
+                publish.append(published)
+                fanout.append(time.perf_counter() - started)
+
+        disconnect.set()
+        await asyncio.gather(*streams)
+        hub.close(room)
+        latencies.sort()
+        fanout.sort()
+        results[size] = {
+            'subscribers': size,
+            'rounds': rounds,
+            'publish_ms': round(sum(publish) / len(publish) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'last_p50_ms': round(percentile(fanout, 50) * 1000, 3),
+            'last_max_ms': round(fanout[-1] * 1000, 3),
+        }
+    return results
+
+
+def print_classroom(results):
+    print(f"\n{Colors.BOLD}{'students':>9}{'publish ms':>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'last p50':>10}{'last max':>10}{Colors.END}")
+    for r in results.values():
+        print(f"{r['subscribers']:>9}{r['publish_ms']:>12}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['last_p50_ms']:>10}{r['last_max_ms']:>10}")
+    print("\n📡 publish: render and queue for every student; p50/p99: per-student arrival; "
+          "last: until the final student has the card")
+
+
+def parse_sizes(text):
+    """Parse '30,100,300' into audience sizes"""
+    try:
+        sizes = [int(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated student counts, got '{text}'")
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError("student counts must be positive")
+    return sizes
+
+
+class Lifespan:
+    """Minimal ASGI lifespan driver so startup/shutdown handlers run"""
+
+    def __init__(self, app):
+        self.app = app
+        self.inbox = asyncio.Queue()
+        self.finished = {}
+        self.task = None
+
+    async def _send(self, message):
+        # e.g. 'lifespan.startup.complete' or 'lifespan.shutdown.failed'
+        phase = message['type'].split('.')[1]
+        self.finished[phase].set()
+
+    async def _run(self, phase):
+        self.finished[phase] = asyncio.Event()
+        await self.inbox.put({'type': f'lifespan.{phase}'})
+        await self.finished[phase].wait()
+
+    async def startup(self):
+        scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}, 'state': {}}
+        self.task = asyncio.ensure_future(self.app(scope, self.inbox.get, self._send))
+        await self._run('startup')
+
+    async def shutdown(self):
+        await self._run('shutdown')
+        await self.task
+
+
+def build_targets(app_module):
+    """Request generators for each route name in the mix"""
+    char_ids = [char.id for char in app_module.catalog]
+    # Every prefix of every romaji, as typed one keystroke at a time
+    prefixes = sorted({char.romaji[:i] for char in app_module.catalog
+                       for i in range(1, len(char.romaji) + 1)})
+    static_urls = [app_module.assets.url(asset.path) for asset in app_module.assets
+                   if not asset.path.startswith('audio/')]
+    gzip = (('Accept-Encoding', 'gzip, br'),)
+    # What a current browser sends, so pages come from the compressed cache
+    browser = (('Accept-Encoding', 'gzip, deflate, br, zstd'),)
+    htmx = (('HX-Request', 'true'),) + browser
+    return {
+        'summary': lambda: ('/', browser),
+        'summary_htmx': lambda: ('/', htmx),
+        'flashcard': lambda: (f'/flashcard/{random.choice(char_ids)}', browser),
+        'flashcard_htmx': lambda: (f'/flashcard/{random.choice(char_ids)}', htmx),
+        'audio': lambda: (app_module.audio.url(random.choice(char_ids)), ()),
+        'static': lambda: (random.choice(static_urls), gzip),
+        'search': lambda: (f'/search?q={quote(random.choice(prefixes))}', htmx),
+    }
+
+
+async def run_load(app, targets, mix, total, concurrency, warmup):
+    """Issue ``total`` requests across ``concurrency`` workers"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    plan = random.choices(names, weights=weights, k=total)
+    samples = {name: [] for name in names}
+    sizes = {name: 0 for name in names}
+    statuses = {name: {} for name in names}
+
+    # Warm caches so the measurement reflects steady state
+    for name in names:
+        for _ in range(warmup):
+            path, headers = targets[name]()
+            await asgi_request(app, path, headers)
+
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(plan):
+            name = plan[position]
+            position += 1
+            path, headers = targets[name]()
+            start = time.perf_counter()
+            status, size = await asgi_request(app, path, headers)
+            samples[name].append(time.perf_counter() - start)
+            sizes[name] += size
+            statuses[name][status] = statuses[name].get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return samples, sizes, statuses, elapsed
+
+
+def summarise(samples, sizes, statuses, elapsed):
+    """Per-route and overall statistics"""
+    routes = {}
+    for name, values in samples.items():
+        if not values:
+            continue
+        values.sort()
+        routes[name] = {
+            'requests': len(values),
+            'throughput_rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+            'mean_bytes': round(sizes[name] / len(values)),
+            'statuses': {str(code): count for code, count in sorted(statuses[name].items())},
+        }
+    total = sum(len(values) for values in samples.values())
+    return {
+        'total_requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'routes': routes,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Routes whose p95 latency or throughput regressed past ``threshold``"""
+    regressions = []
+    for name, current in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        if before['p95_ms'] > 0 and current['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms → {current['p95_ms']}ms")
+        if before['throughput_rps'] > 0 and current['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} → {current['throughput_rps']} req/s")
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{Colors.BOLD}{'route':<16}{'reqs':>7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'bytes':>9}  status{Colors.END}")
+    for name, r in results['routes'].items():
+        statuses = ' '.join(f"{code}×{count}" for code, count in r['statuses'].items())
+        print(f"{name:<16}{r['requests']:>7}{r['throughput_rps']:>10}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['mean_bytes']:>9}  {statuses}")
+    print(f"\n📊 {results['total_requests']} requests in {results['elapsed_s']}s "
+          f"→ {results['throughput_rps']} req/s overall")
+
+
+def parse_mix(text):
+    """Parse 'summary=5,audio=2' into a mix dict"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown route '{name}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-process ASGI benchmark for every route")
+    parser.add_argument('-n', '--requests', type=int, default=2000, help="total measured requests")
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help="concurrent in-flight requests")
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="weighted route mix, e.g. 'summary=5,flashcard=3,audio=2'")
+    parser.add_argument('--warmup', type=int, default=5, help="unmeasured requests per route before the run")
+    parser.add_argument('--seed', type=int, default=1234, help="random seed for the request plan")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against this baseline JSON and fail on regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed regression fraction (default 0.2)")
+    parser.add_argument('--sync', action='store_true',
+                        help="run every handler on the threadpool (HIRAGANA_ASYNC=0) for comparison")
+    parser.add_argument('--threads', type=int, help="threadpool size (HIRAGANA_THREADPOOL)")
+    parser.add_argument('--classroom', type=parse_sizes, metavar='SIZES',
+                        help="measure classroom fan-out for these audience sizes, e.g. '30,100,300'")
+    parser.add_argument('--rounds', type=int, default=50, help="cards published per classroom size")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help=f"store the results as the new baseline (default {DEFAULT_BASELINE})")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    # Read by app.py at import time
+    if args.sync:
+        os.environ['HIRAGANA_ASYNC'] = '0'
+    if args.threads:
+        os.environ['HIRAGANA_THREADPOOL'] = str(args.threads)
+    import app as app_module
+    app = app_module.app
+
+    async def run():
+        life = Lifespan(app)
+        await life.startup()
+        try:
+            return await run_load(app, build_targets(app_module), args.mix,
+                                  args.requests, args.concurrency, args.warmup)
+        finally:
+            await life.shutdown()
+
+    if args.classroom:
+        async def run_fanout():
+            life = Lifespan(app)
+            await life.startup()
+            try:
+                return await run_classroom(app_module, args.classroom, args.rounds)
+            finally:
+                await life.shutdown()
+
+        print(f"🏁 Broadcasting {args.rounds} cards to classrooms of {', '.join(map(str, args.classroom))}")
+        results = {'classroom': list(asyncio.run(run_fanout()).values()),
+                   'config': {'rounds': args.rounds, 'python': platform.python_version(),
+                              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}}
+        print_classroom({r['subscribers']: r for r in results['classroom']})
+        if args.output:
+            os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"💾 Saved results to {args.output}")
+        return 0
+
+    print(f"🏁 Benchmarking {args.requests} requests at concurrency {args.concurrency}")
+    results = summarise(*asyncio.run(run()))
+    results['config'] = {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'mix': args.mix,
+        'async_routes': app_module.ASYNC_ROUTES,
+        'threadpool': app_module.THREADPOOL_SIZE,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    print_results(results)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved results to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{Colors.RED}❌ Regressions beyond {args.threshold:.0%} against {args.baseline}:{Colors.END}")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n{Colors.GREEN}✅ No regressions beyond {args.threshold:.0%} against {args.baseline}{Colors.END}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+In-memory character catalog for the Hiragana flashcard application.
+Loads the character table once into compact records with precomputed lookup
+indexes, and reloads only when the character table itself changes.
+"""
+
+import os
+import threading
+
+import database
+
+
+class Character:
+    """Compact, read-only record for one catalog row"""
+    __slots__ = ('id', 'character', 'romaji', 'pronunciation', 'category', 'order_index')
+
+    def __init__(self, id, character, romaji, pronunciation, category, order_index):
+        self.id = id
+        self.character = character
+        self.romaji = romaji
+        self.pronunciation = pronunciation
+        self.category = category
+        self.order_index = order_index
+
+    def __repr__(self):
+        return f"Character(id={self.id}, character={self.character!r}, romaji={self.romaji!r})"
+
+
+class _Snapshot:
+    """Immutable set of records and indexes for one version of the data"""
+    __slots__ = ('version', 'rows', 'by_id', 'by_romaji', 'by_category', 'categories')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = tuple(sorted(rows, key=lambda c: (c.order_index, c.id)))
+        self.by_id = {c.id: c for c in self.rows}
+        self.by_romaji = {}
+        by_category = {}
+        for c in self.rows:
+            self.by_romaji.setdefault(c.romaji, c)
+            by_category.setdefault(c.category, []).append(c.id)
+        # Categories keep the order of their first character
+        self.categories = tuple(by_category)
+        self.by_category = {cat: tuple(ids) for cat, ids in by_category.items()}
+
+
+class Catalog:
+    """Character catalog backed by a SQLite table.
+
+    Reads are served from an in-memory snapshot. Each call to ``refresh()``
+    costs a ``PRAGMA data_version`` query. Only after another connection has
+    committed is the table's trigger-maintained change counter read. The table
+    is re-read only when that counter moved, so review events and snapshots
+    written to the same file don't cause reloads. The version only moves when
+    the rows actually differ.
+    """
+
+    COLUMNS = 'id, character, romaji, pronunciation, category, order_index'
+
+    def __init__(self, db_path='data/hiragana.db', table='items'):
+        self.db_path = db_path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+        self._table_version = None
+        self._rows = None
+        self._snapshot = _Snapshot(0, [])
+        self.refresh()
+
+    def _connect(self):
+        if self._conn is None:
+            # data_version is per connection, so the catalog keeps its own
+            self._conn = database.connect(self.db_path, readonly=True, check_same_thread=False)
+        return self._conn
+
+    def refresh(self):
+        """Reload the catalog if the database changed; returns the current version"""
+        with self._lock:
+            if not os.path.exists(self.db_path):
+                return self._snapshot.version
+            conn = self._connect()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                # Any commit to the file bumps data_version; the change counter
+                # says whether it touched this table (None: not tracked yet)
+                table_version = database.table_version(conn, self.table)
+                if table_version is None or table_version != self._table_version:
+                    rows = conn.execute(f'SELECT {self.COLUMNS} FROM [{self.table}]').fetchall()
+                    if rows != self._rows:
+                        self._snapshot = _Snapshot(self._snapshot.version + 1,
+                                                   [Character(*row) for row in rows])
+                        self._rows = rows
+                    self._table_version = table_version
+                self._data_version = data_version
+            return self._snapshot.version
+
+    def close(self):
+        """Close the catalog's database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._data_version = None
+                self._table_version = None
+
+    @property
+    def version(self):
+        """Monotonic counter that changes whenever the data is reloaded"""
+        return self._snapshot.version
+
+    def __len__(self):
+        return len(self._snapshot.rows)
+
+    def __iter__(self):
+        return iter(self._snapshot.rows)
+
+    def rows(self):
+        """Every character in catalog order, as a shared tuple"""
+        return self._snapshot.rows
+
+    def get(self, char_id):
+        """Character by id, or None"""
+        return self._snapshot.by_id.get(char_id)
+
+    def by_romaji(self, romaji):
+        """Character by romaji, or None"""
+        return self._snapshot.by_romaji.get(romaji)
+
+    def categories(self):
+        """Category names in catalog order"""
+        return self._snapshot.categories
+
+    def category(self, name):
+        """Characters in a category, sorted by order_index"""
+        snap = self._snapshot
+        return [snap.by_id[i] for i in snap.by_category.get(name, ())]
@@ -0,0 +1,214 @@
+"""
+Live classroom broadcasts for the Hiragana flashcard application.
+A teacher moves a room to a card; the card fragment is rendered once, framed
+once as a Server-Sent Event, and the same bytes are queued for every student's
+stream. Each student has a small bounded queue: a newer card replaces one still
+waiting to be sent, and the oldest event is dropped if the queue is full, so a
+slow reader never holds up the teacher or the other students. A reconnecting
+EventSource sends Last-Event-ID and gets the current card only if it missed it.
+
+The hub lives on the event loop and isn't thread-safe; use it from async
+handlers.
+"""
+
+import asyncio
+import collections
+import secrets
+import time
+
+# Events waiting per student before the oldest is dropped
+QUEUE_SIZE = 8
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT = 15
+
+# Reconnect delay suggested to the browser, in milliseconds
+RETRY_MS = 3000
+
+MAX_SUBSCRIBERS = 500
+
+# Rooms with no students and no activity for this long are closed
+ROOM_TTL = 6 * 60 * 60
+
+# Join codes avoid characters that are easy to misread (0/O, 1/I)
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+CODE_LENGTH = 5
+
+
+def sse_frame(event_id, kind, data):
+    """One Server-Sent Event with ``data`` split over data: lines"""
+    lines = data.splitlines() or [b'']
+    return b''.join((f'id: {event_id}\nevent: {kind}\n'.encode('ascii'),
+                     *(b'data: ' + line + b'\n' for line in lines), b'\n'))
+
+
+class Event:
+    """A published event, framed once for every subscriber"""
+    __slots__ = ('id', 'kind', 'data', 'frame', 'coalesce', 'published_at')
+
+    def __init__(self, event_id, kind, data, coalesce):
+        self.id = event_id
+        self.kind = kind
+        self.data = data
+        self.frame = sse_frame(event_id, kind, data)
+        # A newer event of the same kind makes this one redundant
+        self.coalesce = coalesce
+        self.published_at = time.perf_counter()
+
+
+class Subscriber:
+    """One student's stream: a bounded queue and a wake-up flag"""
+    __slots__ = ('queue', 'size', 'wakeup', 'sent', 'dropped', 'coalesced')
+
+    def __init__(self, size=QUEUE_SIZE):
+        self.queue = collections.deque()
+        self.size = size
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def push(self, event):
+        if event.coalesce:
+            for queued in self.queue:
+                if queued.kind == event.kind:
+                    self.queue.remove(queued)
+                    self.coalesced += 1
+                    break
+        if len(self.queue) >= self.size:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(event)
+        self.wakeup.set()
+
+    async def next(self, timeout):
+        """Every queued event, or [] if none arrived within ``timeout`` seconds"""
+        if not self.queue:
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        events = list(self.queue)
+        self.queue.clear()
+        return events
+
+
+class Room:
+    """A teacher's broadcast and the students following it"""
+    __slots__ = ('code', 'teacher', 'subscribers', 'current', 'card_id', 'last_id',
+                 'touched', 'closed')
+
+    def __init__(self, code, teacher):
+        self.code = code
+        self.teacher = teacher
+        self.subscribers = set()
+        self.current = None     # latest coalescing event, replayed to new students
+        self.card_id = None
+        self.last_id = 0
+        self.touched = time.time()
+        self.closed = False
+
+
+class ClassroomHub:
+    """Rooms by join code, with fan-out counters for the metrics endpoint"""
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.rooms = {}
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def create(self, teacher):
+        """New room with an unused join code"""
+        self.expire()
+        while True:
+            code = ''.join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+            if code not in self.rooms:
+                break
+        room = self.rooms[code] = Room(code, teacher)
+        return room
+
+    def get(self, code):
+        """Open room for a join code, or None"""
+        return self.rooms.get(code.upper())
+
+    def publish(self, room, kind, data, coalesce=True):
+        """Frame ``data`` once and queue it for every subscriber; returns the Event"""
+        room.last_id += 1
+        room.touched = time.time()
+        event = Event(room.last_id, kind, data, coalesce)
+        if coalesce:
+            room.current = event
+        for subscriber in room.subscribers:
+            subscriber.push(event)
+        self.published += 1
+        return event
+
+    def subscribe(self, room, last_event_id=None):
+        """Add a student, or None when the room is full.
+
+        The current card is queued unless Last-Event-ID shows the student
+        already has it.
+        """
+        if len(room.subscribers) >= self.max_subscribers:
+            return None
+        subscriber = Subscriber()
+        current = room.current
+        if current is not None and (last_event_id is None or last_event_id < current.id):
+            subscriber.push(current)
+        room.subscribers.add(subscriber)
+        room.touched = time.time()
+        return subscriber
+
+    def unsubscribe(self, room, subscriber):
+        room.subscribers.discard(subscriber)
+        room.touched = time.time()
+        self.sent += subscriber.sent
+        self.dropped += subscriber.dropped
+        self.coalesced += subscriber.coalesced
+
+    async def stream(self, room, subscriber, heartbeat=HEARTBEAT):
+        """Server-Sent Events body for one subscriber"""
+        try:
+            yield f'retry: {RETRY_MS}\n\n'.encode('ascii')
+            while True:
+                events = await subscriber.next(heartbeat)
+                if not events:
+                    # Keeps proxies from closing the idle connection
+                    yield b': ping\n\n'
+                    continue
+                for event in events:
+                    yield event.frame
+                    subscriber.sent += 1
+                    if event.kind == 'closed':
+                        return
+        finally:
+            self.unsubscribe(room, subscriber)
+
+    def close(self, room):
+        """Tell every student the class is over and forget the room"""
+        room.closed = True
+        self.publish(room, 'closed', b'', coalesce=False)
+        self.rooms.pop(room.code, None)
+
+    def expire(self, now=None):
+        """Close rooms that nobody has used for ROOM_TTL"""
+        now = time.time() if now is None else now
+        for room in [room for room in self.rooms.values()
+                     if not room.subscribers and now - room.touched > ROOM_TTL]:
+            self.close(room)
+
+    def report(self):
+        """Open rooms, connected students and fan-out counters"""
+        live = [subscriber for room in self.rooms.values() for subscriber in room.subscribers]
+        return {
+            'rooms': len(self.rooms),
+            'subscribers': len(live),
+            'published': self.published,
+            'sent': self.sent + sum(subscriber.sent for subscriber in live),
+            'dropped': self.dropped + sum(subscriber.dropped for subscriber in live),
+            'coalesced': self.coalesced + sum(subscriber.coalesced for subscriber in live),
+        }
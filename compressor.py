@@ -0,0 +1,164 @@
+"""
+Response compression for the Hiragana flashcard application.
+Negotiates zstd, brotli or gzip from Accept-Encoding for dynamic text
+responses, tracks bytes saved and CPU time per encoding, and provides an ASGI
+middleware for responses that aren't already encoded. Cached pages compress
+once per catalog version through ``Compressor.compress(..., cached=True)``.
+"""
+
+import gzip
+import threading
+import time
+
+from assets import brotli, negotiate
+from metrics import record
+
+try:
+    import zstandard
+except ImportError:  # optional: brotli and gzip are used otherwise
+    zstandard = None
+
+# Most effective first; only installed encoders are offered
+PREFERENCE = ('zstd', 'br', 'gzip')
+
+# Bodies smaller than this aren't worth the CPU or the header
+MIN_SIZE = 512
+
+# Compressible media types; audio, images and archives already are compressed
+TEXT_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+              'image/svg+xml')
+
+# (on-the-fly level, level for bodies cached per catalog version)
+LEVELS = {'zstd': (3, 19), 'br': (4, 11), 'gzip': (6, 9)}
+
+
+def _encoders():
+    encoders = {'gzip': lambda body, level: gzip.compress(body, compresslevel=level, mtime=0)}
+    if brotli is not None:
+        encoders['br'] = lambda body, level: brotli.compress(body, quality=level)
+    if zstandard is not None:
+        encoders['zstd'] = lambda body, level: zstandard.ZstdCompressor(level=level).compress(body)
+    return encoders
+
+
+def compressible(media_type):
+    """True for text-like media types"""
+    return bool(media_type) and media_type.lower().startswith(TEXT_TYPES)
+
+
+class EncodingStats:
+    """Work done by one encoder"""
+    __slots__ = ('count', 'bytes_in', 'bytes_out', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+
+class Compressor:
+    """Encoders available in this environment, with per-encoding statistics"""
+
+    def __init__(self, preference=PREFERENCE, min_size=MIN_SIZE):
+        self._encoders = _encoders()
+        self.preference = tuple(encoding for encoding in preference if encoding in self._encoders)
+        self.min_size = min_size
+        self._lock = threading.Lock()
+        self.stats = {encoding: EncodingStats() for encoding in self.preference}
+
+    def negotiate(self, header, size=None):
+        """Best encoding for an Accept-Encoding header, or None"""
+        if size is not None and size < self.min_size:
+            return None
+        return negotiate(header, self.preference, self.preference)
+
+    def compress(self, body, encoding, cached=False):
+        """``body`` encoded with ``encoding``; time is charged to the request's compress phase"""
+        level = LEVELS[encoding][1 if cached else 0]
+        start = time.perf_counter()
+        data = self._encoders[encoding](body, level)
+        elapsed = time.perf_counter() - start
+        record('compress', elapsed)
+        with self._lock:
+            stats = self.stats[encoding]
+            stats.count += 1
+            stats.bytes_in += len(body)
+            stats.bytes_out += len(data)
+            stats.seconds += elapsed
+        return data
+
+    def report(self):
+        """{encoding: {count, bytes_in, bytes_out, ratio, seconds}}"""
+        with self._lock:
+            return {encoding: {'count': s.count, 'bytes_in': s.bytes_in, 'bytes_out': s.bytes_out,
+                               'ratio': round(s.bytes_out / s.bytes_in, 4) if s.bytes_in else 0.0,
+                               'seconds': round(s.seconds, 6)}
+                    for encoding, s in self.stats.items()}
+
+
+def _vary(headers):
+    """Response headers with Accept-Encoding added to Vary"""
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == b'vary':
+            if b'accept-encoding' not in value.lower():
+                headers[i] = (name, value + b', Accept-Encoding')
+            return headers
+    return [*headers, (b'vary', b'Accept-Encoding')]
+
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses single-message text responses.
+
+    Responses that already carry a Content-Encoding (cached pages, static
+    assets), partial content, non-text media and streamed bodies pass through
+    untouched.
+    """
+
+    def __init__(self, app, compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        accept = None
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept = value.decode('latin-1')
+                break
+        if not accept or self.compressor.negotiate(accept) is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message['type'] == 'http.response.start':
+                headers = {name.lower(): value for name, value in message.get('headers', [])}
+                if (message['status'] == 200 and b'content-encoding' not in headers
+                        and compressible(headers.get(b'content-type', b'').decode('latin-1'))):
+                    # Hold the start until the body shows whether it is worth encoding
+                    start_message = message
+                    return
+            elif start_message is not None:
+                start, start_message = start_message, None
+                body = message.get('body', b'')
+                encoding = None
+                if not message.get('more_body', False):
+                    encoding = self.compressor.negotiate(accept, len(body))
+                headers = [(name, value) for name, value in start.get('headers', [])
+                           if name.lower() != b'content-length' or encoding is None]
+                if encoding is not None:
+                    body = self.compressor.compress(body, encoding)
+                    # The encoded bytes differ, so a strong validator becomes weak
+                    headers = [(name, b'W/' + value if name.lower() == b'etag'
+                                and not value.startswith(b'W/') else value)
+                               for name, value in headers]
+                    headers += [(b'content-encoding', encoding.encode()),
+                                (b'content-length', str(len(body)).encode())]
+                    message = {**message, 'body': body}
+                await send({**start, 'headers': _vary(headers)})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Data-pack importer for the Hiragana flashcard application.
+Streams character rows from versioned JSONL or CSV pack files and upserts them
+into the character table in a single transaction per pack. Packs whose
+checksum hasn't changed since the last import are skipped, and re-importing a
+pack only touches the rows that pack added, changed or dropped.
+
+Usage:
+    python3 data_packs.py                      # import every pack in data/packs
+    python3 data_packs.py data/packs/kanji.csv # import specific packs
+    python3 data_packs.py --force              # re-import even if unchanged
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import database
+
+PACK_DIR = 'data/packs'
+PACK_EXTENSIONS = ('.jsonl', '.csv')
+FIELDS = ('character', 'romaji', 'pronunciation', 'category', 'order_index')
+BATCH_SIZE = 5000
+
+# The app's character table, as fast_app creates it
+ITEMS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS [{table}] (
+        [id] INTEGER PRIMARY KEY,
+        [character] TEXT,
+        [romaji] TEXT,
+        [pronunciation] TEXT,
+        [category] TEXT,
+        [order_index] INTEGER
+    )
+'''
+
+ITEMS_INDEXES = (
+    'CREATE UNIQUE INDEX IF NOT EXISTS [idx_{table}_character] ON [{table}] (character)',
+    'CREATE INDEX IF NOT EXISTS [idx_{table}_category] ON [{table}] (category, order_index)',
+    'CREATE INDEX IF NOT EXISTS [idx_{table}_order_index] ON [{table}] (order_index)',
+    'CREATE INDEX IF NOT EXISTS [idx_{table}_romaji] ON [{table}] (romaji)',
+)
+
+# Which pack last imported each version, and which rows each pack owns
+PACK_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS data_packs (
+        name TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        rows INTEGER NOT NULL,
+        imported_at REAL NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS data_pack_items (
+        pack TEXT NOT NULL,
+        character TEXT NOT NULL,
+        PRIMARY KEY (pack, character)
+    ) WITHOUT ROWID''',
+)
+
+
+class PackResult:
+    """Outcome of importing one pack"""
+    __slots__ = ('name', 'rows', 'changed', 'removed', 'seconds', 'skipped')
+
+    def __init__(self, name, rows=0, changed=0, removed=0, seconds=0.0, skipped=False):
+        self.name = name
+        self.rows = rows
+        self.changed = changed
+        self.removed = removed
+        self.seconds = seconds
+        self.skipped = skipped
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def pack_name(path):
+    """Pack name from its file name, e.g. data/packs/hiragana.jsonl -> hiragana"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def find_packs(pack_dir=PACK_DIR):
+    """Pack files in a directory, in name order"""
+    if not os.path.isdir(pack_dir):
+        return []
+    return [os.path.join(pack_dir, name) for name in sorted(os.listdir(pack_dir))
+            if name.endswith(PACK_EXTENSIONS)]
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 of a pack file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _row(record, where):
+    missing = [field for field in FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"{where}: missing {', '.join(missing)}")
+    try:
+        order_index = int(record['order_index'])
+    except ValueError:
+        raise ValueError(f"{where}: order_index must be an integer") from None
+    return (record['character'], record['romaji'], record['pronunciation'],
+            record['category'], order_index)
+
+
+def iter_rows(path):
+    """Stream (character, romaji, pronunciation, category, order_index) tuples"""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            for line_no, record in enumerate(csv.DictReader(f), start=2):
+                yield _row(record, f"{path}:{line_no}")
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield _row(json.loads(line), f"{path}:{line_no}")
+
+
+def prepare(conn, table='items'):
+    """Create the character table, its indexes, change triggers and the pack bookkeeping tables"""
+    conn.execute(ITEMS_SCHEMA.format(table=table))
+    for sql in ITEMS_INDEXES:
+        conn.execute(sql.format(table=table))
+    for sql in PACK_SCHEMA:
+        conn.execute(sql)
+    database.track_changes(conn, table)
+
+
+def import_pack(conn, path, table='items', force=False, batch_size=BATCH_SIZE):
+    """Upsert one pack's rows in a single transaction; skips unchanged packs"""
+    name = pack_name(path)
+    start = time.perf_counter()
+    checksum = file_checksum(path)
+    stored = conn.execute('SELECT checksum, rows FROM data_packs WHERE name = ?', (name,)).fetchone()
+    if stored and stored[0] == checksum and not force:
+        return PackResult(name, rows=stored[1], seconds=time.perf_counter() - start, skipped=True)
+
+    with conn:
+        conn.execute('''CREATE TEMP TABLE IF NOT EXISTS pack_rows (
+                            character TEXT PRIMARY KEY, romaji TEXT, pronunciation TEXT,
+                            category TEXT, order_index INTEGER)''')
+        conn.execute('DELETE FROM temp.pack_rows')
+        rows = iter_rows(path)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            # A character repeated within a pack keeps its last row
+            conn.executemany('INSERT OR REPLACE INTO temp.pack_rows VALUES (?, ?, ?, ?, ?)', batch)
+        count = conn.execute('SELECT COUNT(*) FROM temp.pack_rows').fetchone()[0]
+
+        # Only rows whose values differ are written, so ids and pages stay put.
+        # rowcount leaves out the change-counter triggers' own updates
+        changed = conn.execute(f'''
+            INSERT INTO [{table}] (character, romaji, pronunciation, category, order_index)
+            SELECT character, romaji, pronunciation, category, order_index FROM temp.pack_rows WHERE true
+            ON CONFLICT (character) DO UPDATE SET
+                romaji = excluded.romaji, pronunciation = excluded.pronunciation,
+                category = excluded.category, order_index = excluded.order_index
+            WHERE romaji IS NOT excluded.romaji OR pronunciation IS NOT excluded.pronunciation
+               OR category IS NOT excluded.category OR order_index IS NOT excluded.order_index
+        ''').rowcount
+
+        # Rows this pack used to provide, unless another pack still does
+        removed = conn.execute(f'''
+            DELETE FROM [{table}] WHERE character IN (
+                SELECT character FROM data_pack_items
+                WHERE pack = ? AND character NOT IN (SELECT character FROM temp.pack_rows)
+                  AND character NOT IN (SELECT character FROM data_pack_items WHERE pack != ?))
+        ''', (name, name)).rowcount
+
+        conn.execute('''DELETE FROM data_pack_items WHERE pack = ?
+                        AND character NOT IN (SELECT character FROM temp.pack_rows)''', (name,))
+        conn.execute('INSERT OR IGNORE INTO data_pack_items SELECT ?, character FROM temp.pack_rows', (name,))
+        conn.execute('INSERT OR REPLACE INTO data_packs VALUES (?, ?, ?, ?, ?)',
+                     (name, path, checksum, count, time.time()))
+        conn.execute('DELETE FROM temp.pack_rows')
+    return PackResult(name, count, changed, removed, time.perf_counter() - start)
+
+
+def import_packs(paths, db_path=database.DB_PATH, table='items', force=False):
+    """Import each pack in turn; returns a PackResult per pack"""
+    conn = database.connect(db_path)
+    try:
+        with conn:
+            prepare(conn, table)
+        results = [import_pack(conn, path, table, force) for path in paths]
+        if any(not result.skipped for result in results):
+            conn.execute('PRAGMA optimize')
+        return results
+    finally:
+        conn.close()
+
+
+def print_result(result):
+    if result.skipped:
+        print(f"⏭️  {result.name}: unchanged ({result.rows} rows), skipped")
+    else:
+        print(f"📦 {result.name}: {result.rows} rows, {result.changed} inserted/updated, "
+              f"{result.removed} removed in {result.seconds:.3f}s "
+              f"({result.rows_per_second:,.0f} rows/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import character data packs into the database")
+    parser.add_argument('packs', nargs='*', help=f"pack files (default: every pack in {PACK_DIR})")
+    parser.add_argument('--db', default=database.DB_PATH, help="database file")
+    parser.add_argument('--table', default='items', help="character table")
+    parser.add_argument('--force', action='store_true', help="re-import packs even if unchanged")
+    args = parser.parse_args(argv)
+
+    paths = args.packs or find_packs()
+    if not paths:
+        print(f"❌ No data packs found in {PACK_DIR}")
+        return 1
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    for result in import_packs(paths, args.db, args.table, args.force):
+        print_result(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Shared SQLite access layer for the Hiragana flashcard application.
+Opens connections with WAL, synchronous=NORMAL, memory-mapped I/O and a sized
+page cache; keeps a pool of read-only connections for request handlers and a
+single writer connection; and records how long callers wait for each and how
+long each named query holds its connection.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DB_PATH = 'data/hiragana.db'
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -16 * 1024),      # negative: KiB, so 16 MiB
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+# Per-table change counters maintained by triggers. PRAGMA data_version moves
+# on every commit to the file (review events, snapshots); these move only when
+# the tracked table's rows do
+VERSION_TABLE = 'table_versions'
+
+
+def track_changes(conn, table):
+    """Install triggers that count inserts, updates and deletes on ``table``"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'INSERT OR IGNORE INTO {VERSION_TABLE} (name, version) VALUES (?, 0)', (table,))
+    for action in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS [{table}_version_{action.lower()}]
+            AFTER {action} ON [{table}]
+            BEGIN
+                UPDATE {VERSION_TABLE} SET version = version + 1 WHERE name = '{table}';
+            END
+        ''')
+
+
+def table_version(conn, table):
+    """The change counter for ``table``, or None if it isn't tracked"""
+    try:
+        row = conn.execute(f'SELECT version FROM {VERSION_TABLE} WHERE name = ?', (table,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def configure(conn, readonly=False):
+    """Apply the standard PRAGMAs to a connection"""
+    for name, value in PRAGMAS:
+        if readonly and name == 'journal_mode':
+            continue
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def connect(path=DB_PATH, readonly=False, check_same_thread=True):
+    """Open a configured connection; read-only connections can't take the write lock"""
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True,
+                               check_same_thread=check_same_thread, cached_statements=128)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=check_same_thread, cached_statements=128)
+    return configure(conn, readonly)
+
+
+class LatencyStats:
+    """Running count, total and maximum of a duration in seconds"""
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        mean = self.total / self.count if self.count else 0.0
+        return {'count': self.count, 'mean_ms': round(mean * 1000, 3), 'max_ms': round(self.max * 1000, 3)}
+
+
+class Database:
+    """Reader pool plus a single writer connection for one database file"""
+
+    def __init__(self, path=DB_PATH, readers=4, table='items'):
+        self.path = path
+        self.table = table
+        # The writer sets WAL mode, which read-only connections can't do themselves
+        self._writer = connect(path, check_same_thread=False)
+        self._writer_lock = threading.Lock()
+        with self._writer:
+            exists = self._writer.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                          (table,)).fetchone()
+            if exists:
+                track_changes(self._writer, table)
+        self._pool = queue.Queue()
+        for _ in range(readers):
+            self._pool.put(connect(path, readonly=True, check_same_thread=False))
+        self._stats_lock = threading.Lock()
+        self.stats = {'reader_wait': LatencyStats(), 'writer_wait': LatencyStats()}
+
+    def _record(self, name, seconds):
+        with self._stats_lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = LatencyStats()
+            stats.add(seconds)
+
+    @contextmanager
+    def reader(self, query=None):
+        """Borrow a read-only connection from the pool.
+
+        With ``query``, the time the block holds the connection is recorded
+        under that name. Statements are kept in each connection's cache, so a
+        named query is compiled once per connection.
+        """
+        start = time.perf_counter()
+        conn = self._pool.get()
+        acquired = time.perf_counter()
+        self._record('reader_wait', acquired - start)
+        try:
+            yield conn
+        finally:
+            if query:
+                self._record(query, time.perf_counter() - acquired)
+            self._pool.put(conn)
+
+    @contextmanager
+    def writer(self, query=None):
+        """Hold the single writer connection inside a transaction.
+
+        With ``query``, the time until the transaction ends, commit included,
+        is recorded under that name.
+        """
+        start = time.perf_counter()
+        with self._writer_lock:
+            acquired = time.perf_counter()
+            self._record('writer_wait', acquired - start)
+            try:
+                with self._writer:
+                    yield self._writer
+            finally:
+                if query:
+                    self._record(query, time.perf_counter() - acquired)
+
+    def report(self):
+        """Reader and writer wait times, named query latency, and idle readers"""
+        with self._stats_lock:
+            report = {name: stats.as_dict() for name, stats in self.stats.items()}
+        report['readers_idle'] = self._pool.qsize()
+        return report
+
+    def close(self):
+        """Close the writer and every idle reader"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            self._writer.close()
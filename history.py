@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Streaming export and import of learning history for the Hiragana flashcard
+application. Review events are written as fixed-width binary records in
+chunks straight from a database cursor, so memory stays constant however
+large the history is. Imports are parsed incrementally as bytes arrive and
+staged in batches, then moved into the log in one transaction once the whole
+stream has parsed, so a bad file never leaves a partial import. A character
+table in the header lets histories move between databases whose ids differ.
+
+File layout (little-endian):
+    b'HIRA', u16 version, u16 reserved
+    u32 n, then n x (u32 id, u8 length, UTF-8 character)    -- id -> character
+    blocks: b'L' u16 length, UTF-8 learner id               -- following records' learner
+            b'R' u32 n, then n x RECORD                     -- review records
+            b'E' u64 total records                          -- end of stream
+
+Usage:
+    python3 history.py export -o school.hist             # every learner
+    python3 history.py export --learner <id> -o me.hist
+    python3 history.py import school.hist
+
+The import writes straight to the database. Stop the app first: it keeps
+learner state in memory and would overwrite the rebuilt statistics with its
+next snapshot. Start it again after 'stats.py --rebuild'.
+"""
+
+import argparse
+import sqlite3
+import struct
+import sys
+import time
+
+MAGIC = b'HIRA'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+COUNT = struct.Struct('<I')
+CHARACTER = struct.Struct('<IB')
+LEARNER = struct.Struct('<H')
+END = struct.Struct('<Q')
+# card id, grade, reviewed_at, response_ms
+RECORD = struct.Struct('<IBdI')
+NO_RESPONSE = 0xFFFFFFFF
+
+# Records per block; a block is also one chunk of the HTTP response
+CHUNK_RECORDS = 4096
+BATCH_SIZE = 5000
+MEDIA_TYPE = 'application/vnd.hiragana-history'
+# Parsed events of uploads still in progress
+STAGING_TABLE = 'history_import'
+
+
+_NO_LEARNER = object()
+
+
+class HistoryFormatError(ValueError):
+    """The stream is not a history export, or is truncated"""
+
+
+def header(chars):
+    """File header with the exporting catalog's id -> character table"""
+    parts = [HEADER.pack(MAGIC, VERSION, 0), COUNT.pack(len(chars))]
+    for char in chars:
+        text = char.character.encode('utf-8')
+        parts.append(CHARACTER.pack(char.id, len(text)) + text)
+    return b''.join(parts)
+
+
+def export_chunks(conn, chars, learner_id=None, chunk_records=CHUNK_RECORDS):
+    """Yield the export as byte chunks, reading the cursor ``chunk_records`` at a time"""
+    yield header(chars)
+    current = _NO_LEARNER
+    if learner_id is None:
+        cursor = conn.execute('''
+            SELECT learner_id, card_id, grade, reviewed_at, response_ms
+            FROM review_events ORDER BY learner_id, reviewed_at, id
+        ''')
+    else:
+        # The learner column is constant here; not reading it saves a third of the scan
+        cursor = conn.execute('''
+            SELECT NULL, card_id, grade, reviewed_at, response_ms
+            FROM review_events WHERE learner_id = ? ORDER BY reviewed_at, id
+        ''', (learner_id,))
+        text = learner_id.encode('utf-8')
+        yield b'L' + LEARNER.pack(len(text)) + text
+        current = None
+    buffer = bytearray(1 + COUNT.size + chunk_records * RECORD.size)
+    total = 0
+    while True:
+        rows = cursor.fetchmany(chunk_records)
+        if not rows:
+            break
+        out, n, offset = [], 0, 1 + COUNT.size
+        for learner, card_id, grade, reviewed_at, response_ms in rows:
+            if learner != current:
+                if n:
+                    out.append(_block(buffer, n))
+                    n, offset = 0, 1 + COUNT.size
+                text = learner.encode('utf-8')
+                out.append(b'L' + LEARNER.pack(len(text)) + text)
+                current = learner
+            RECORD.pack_into(buffer, offset, card_id, grade, reviewed_at,
+                             NO_RESPONSE if response_ms is None else response_ms)
+            offset += RECORD.size
+            n += 1
+        if n:
+            out.append(_block(buffer, n))
+        total += len(rows)
+        yield b''.join(out)
+    yield b'E' + END.pack(total)
+
+
+def _text(buf, start, length):
+    """UTF-8 text from the stream; bad bytes are a format error, not a crash"""
+    try:
+        return bytes(buf[start:start + length]).decode('utf-8')
+    except UnicodeDecodeError:
+        raise HistoryFormatError("invalid UTF-8 in the stream") from None
+
+
+def _block(buffer, n):
+    buffer[0:1] = b'R'
+    COUNT.pack_into(buffer, 1, n)
+    return bytes(buffer[:1 + COUNT.size + n * RECORD.size])
+
+
+class HistoryReader:
+    """Incremental parser: ``feed()`` bytes as they arrive, get events back.
+
+    Character ids are mapped to this catalog through the export's character
+    table; records for characters it doesn't have are counted in ``skipped``.
+    """
+
+    def __init__(self, catalog):
+        self.local = {char.character: char.id for char in catalog}
+        self.ids = None         # exported id -> local id (or None)
+        self.learner = None
+        self.records = 0
+        self.skipped = 0
+        self.finished = False
+        self._buffer = bytearray()
+        self._remaining = 0     # records left in the current block
+        self._state = 'header'
+
+    def feed(self, data):
+        """Parse ``data``; returns [(learner_id, card_id, grade, reviewed_at, response_ms)]"""
+        self._buffer += data
+        events, pos, buf = [], 0, self._buffer
+        while True:
+            if self._state == 'records':
+                available = min(self._remaining, (len(buf) - pos) // RECORD.size)
+                if not available:
+                    if self._remaining:
+                        break
+                    self._state = 'block'
+                    continue
+                end = pos + available * RECORD.size
+                for card_id, grade, reviewed_at, response_ms in RECORD.iter_unpack(buf[pos:end]):
+                    local = self.ids.get(card_id)
+                    if local is None:
+                        self.skipped += 1
+                        continue
+                    events.append((self.learner, local, grade, reviewed_at,
+                                   None if response_ms == NO_RESPONSE else response_ms))
+                self.records += available
+                self._remaining -= available
+                pos = end
+            elif self._state == 'block':
+                if pos >= len(buf):
+                    break
+                tag = buf[pos:pos + 1]
+                if tag == b'R':
+                    if len(buf) - pos < 1 + COUNT.size:
+                        break
+                    if self.learner is None:
+                        raise HistoryFormatError("records before any learner")
+                    self._remaining = COUNT.unpack_from(buf, pos + 1)[0]
+                    pos += 1 + COUNT.size
+                    self._state = 'records'
+                elif tag == b'L':
+                    if len(buf) - pos < 1 + LEARNER.size:
+                        break
+                    length = LEARNER.unpack_from(buf, pos + 1)[0]
+                    start = pos + 1 + LEARNER.size
+                    if len(buf) < start + length:
+                        break
+                    self.learner = _text(buf, start, length)
+                    pos = start + length
+                elif tag == b'E':
+                    if len(buf) - pos < 1 + END.size:
+                        break
+                    total = END.unpack_from(buf, pos + 1)[0]
+                    if total != self.records:
+                        raise HistoryFormatError(f"expected {total} records, read {self.records}")
+                    pos += 1 + END.size
+                    self.finished = True
+                    self._state = 'done'
+                else:
+                    raise HistoryFormatError(f"unknown block {bytes(tag)!r}")
+            elif self._state == 'header':
+                if len(buf) < HEADER.size + COUNT.size:
+                    break
+                magic, version, _ = HEADER.unpack_from(buf, 0)
+                if magic != MAGIC or version != VERSION:
+                    raise HistoryFormatError("not a history export")
+                count = COUNT.unpack_from(buf, HEADER.size)[0]
+                ids, offset = {}, HEADER.size + COUNT.size
+                for _ in range(count):
+                    if len(buf) < offset + CHARACTER.size:
+                        break
+                    char_id, length = CHARACTER.unpack_from(buf, offset)
+                    offset += CHARACTER.size
+                    if len(buf) < offset + length:
+                        break
+                    ids[char_id] = self.local.get(_text(buf, offset, length))
+                    offset += length
+                else:
+                    self.ids, pos = ids, offset
+                    self._state = 'block'
+                    continue
+                break   # character table not complete yet
+            else:
+                if pos < len(buf):
+                    raise HistoryFormatError("data after the end of the stream")
+                break
+        del self._buffer[:pos]
+        return events
+
+    def close(self):
+        """Raise if the stream ended early"""
+        if not self.finished:
+            raise HistoryFormatError("stream ended before the end marker")
+
+
+def store_batch(conn, events):
+    """Insert events that aren't already present; returns the ones inserted"""
+    if not events:
+        return []
+    existing = set()
+    by_learner = {}
+    for event in events:
+        by_learner.setdefault(event[0], []).append(event[3])
+    for learner_id, times in by_learner.items():
+        existing.update(conn.execute('''
+            SELECT learner_id, card_id, reviewed_at FROM review_events
+            WHERE learner_id = ? AND reviewed_at BETWEEN ? AND ?
+        ''', (learner_id, min(times), max(times))).fetchall())
+    new = []
+    for event in events:
+        key = event[:2] + (event[3],)
+        if key not in existing:
+            existing.add(key)
+            new.append(event)
+    conn.executemany('''
+        INSERT INTO review_events (learner_id, card_id, grade, reviewed_at, response_ms)
+        VALUES (?, ?, ?, ?, ?)
+    ''', new)
+    return new
+
+
+def stage_batch(conn, import_id, events):
+    """Park parsed events until the whole upload has been read"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {STAGING_TABLE} (
+            import_id TEXT NOT NULL,
+            learner_id TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            grade INTEGER NOT NULL,
+            reviewed_at REAL NOT NULL,
+            response_ms INTEGER
+        )
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{STAGING_TABLE}_import ON {STAGING_TABLE} (import_id)')
+    conn.executemany(f'INSERT INTO {STAGING_TABLE} VALUES (?, ?, ?, ?, ?, ?)',
+                     [(import_id, *event) for event in events])
+
+
+def commit_staged(conn, import_id, batch_size=BATCH_SIZE):
+    """Move a staged upload into review_events; returns the number inserted.
+
+    Run inside one transaction so the import lands whole or not at all.
+    """
+    inserted = 0
+    cursor = conn.execute(f'''
+        SELECT learner_id, card_id, grade, reviewed_at, response_ms
+        FROM {STAGING_TABLE} WHERE import_id = ? ORDER BY rowid
+    ''', (import_id,))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        inserted += len(store_batch(conn, rows))
+    discard_staged(conn, import_id)
+    return inserted
+
+
+def discard_staged(conn, import_id):
+    """Drop what an upload staged"""
+    try:
+        conn.execute(f'DELETE FROM {STAGING_TABLE} WHERE import_id = ?', (import_id,))
+    except sqlite3.OperationalError:
+        pass    # nothing was ever staged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import learning history")
+    parser.add_argument('--db', default='data/hiragana.db', help="database file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write review history to a file")
+    export.add_argument('-o', '--output', required=True, help="output file ('-' for stdout)")
+    export.add_argument('--learner', help="only this learner's history")
+    load = commands.add_parser('import', help="add review history from a file")
+    load.add_argument('input', help="history file")
+    args = parser.parse_args(argv)
+
+    import database
+    from catalog import Catalog
+    catalog = Catalog(args.db)
+    conn = database.connect(args.db, readonly=args.command == 'export')
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'review_events'").fetchone():
+            print("❌ No review_events table; run the app once to create it")
+            return 1
+        start = time.perf_counter()
+        if args.command == 'export':
+            out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+            size = 0
+            try:
+                for chunk in export_chunks(conn, list(catalog), args.learner):
+                    out.write(chunk)
+                    size += len(chunk)
+            finally:
+                if out is not sys.stdout.buffer:
+                    out.close()
+            if args.output != '-':
+                print(f"📤 Exported {size:,} bytes in {time.perf_counter() - start:.3f}s to {args.output}")
+            return 0
+
+        reader, inserted, batch = HistoryReader(catalog), 0, []
+        with open(args.input, 'rb') as f:
+            with conn:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    batch.extend(reader.feed(chunk))
+                    if len(batch) >= BATCH_SIZE:
+                        inserted += len(store_batch(conn, batch))
+                        batch = []
+                reader.close()
+                inserted += len(store_batch(conn, batch))
+    except HistoryFormatError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+    print(f"📥 Imported {inserted} of {reader.records} records in {time.perf_counter() - start:.3f}s "
+          f"({reader.records - inserted - reader.skipped} already present, "
+          f"{reader.skipped} for unknown characters)")
+    if inserted:
+        print("ℹ️  With the app stopped, run 'python stats.py --rebuild' to update progress statistics")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Hot-path instrumentation for the Hiragana flashcard application.
+Times named phases of each request (database, rendering, file serving),
+reports them in a Server-Timing header, aggregates per-route latency
+histograms and counters, and renders them in the Prometheus text format.
+Also provides sampled, level-gated structured logging.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, Prometheus style (+Inf is implicit)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_phases = contextvars.ContextVar('request_phases', default=None)
+
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s %(message)s')
+log = logging.getLogger('hiragana')
+log.setLevel(os.environ.get('HIRAGANA_LOG_LEVEL', 'WARNING').upper())
+
+# Fraction of requests written to the access log at INFO
+LOG_SAMPLE_RATE = float(os.environ.get('HIRAGANA_LOG_SAMPLE', '0.01'))
+
+
+def log_event(level, event, **fields):
+    """Write one structured log line, skipping all formatting when the level is off"""
+    if log.isEnabledFor(level):
+        log.log(level, json.dumps({'event': event, **fields}, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def timed(phase):
+    """Add the duration of the block to the current request's ``phase``"""
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+def record(phase, seconds):
+    """Add an already-measured duration to the current request's ``phase``"""
+    phases = _phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    """Request counters and latency histograms by route, plus custom gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}      # (route, method, status) -> count
+        self.latency = {}       # route -> Histogram
+        self.phases = {}        # (route, phase) -> Histogram
+        self.sizes = {}         # (route, content-coding) -> bytes sent
+        self.gauges = {}        # name -> (help, callable returning {labels: value})
+
+    def observe(self, route, method, status, seconds, phases, size, encoding='identity'):
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get(route)
+            if hist is None:
+                hist = self.latency[route] = Histogram()
+            hist.observe(seconds)
+            for phase, value in phases.items():
+                hist = self.phases.get((route, phase))
+                if hist is None:
+                    hist = self.phases[(route, phase)] = Histogram()
+                hist.observe(value)
+            key = (route, encoding)
+            self.sizes[key] = self.sizes.get(key, 0) + size
+
+    def gauge(self, name, help_text, collect):
+        """Register a gauge; ``collect()`` returns {label-dict-as-tuple: value}"""
+        self.gauges[name] = (help_text, collect)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines += ['# HELP hiragana_requests_total Requests by route, method and status',
+                      '# TYPE hiragana_requests_total counter']
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'hiragana_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            lines += ['# HELP hiragana_response_bytes_total Response body bytes by route and content-coding',
+                      '# TYPE hiragana_response_bytes_total counter']
+            for (route, encoding), size in sorted(self.sizes.items()):
+                lines.append(f'hiragana_response_bytes_total{{route="{route}",encoding="{encoding}"}} {size}')
+            lines += ['# HELP hiragana_request_seconds Request latency by route',
+                      '# TYPE hiragana_request_seconds histogram']
+            for route, hist in sorted(self.latency.items()):
+                lines += _histogram_lines('hiragana_request_seconds', f'route="{route}"', hist)
+            lines += ['# HELP hiragana_phase_seconds Time spent per request phase by route',
+                      '# TYPE hiragana_phase_seconds histogram']
+            for (route, phase), hist in sorted(self.phases.items()):
+                lines += _histogram_lines('hiragana_phase_seconds', f'route="{route}",phase="{phase}"', hist)
+        for name, (help_text, collect) in sorted(self.gauges.items()):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            for labels, value in sorted(collect().items()):
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, labels, hist):
+    lines, running = [], 0
+    for bound, count in zip(BUCKETS, hist.counts):
+        running += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+    lines.append(f'{name}_sum{{{labels}}} {hist.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {hist.count}')
+    return lines
+
+
+class MetricsMiddleware:
+    """ASGI middleware that times requests and adds a Server-Timing header"""
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        phases = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        status, size, encoding = 0, 0, 'identity'
+
+        async def send_with_timing(message):
+            nonlocal status, size, encoding
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                for name, value in message.get('headers', []):
+                    if name.lower() == b'content-encoding':
+                        encoding = value.decode('latin-1')
+                elapsed = time.perf_counter() - start
+                timing = ', '.join(f'{name};dur={value * 1000:.3f}' for name, value in phases.items())
+                timing = f'{timing}, app;dur={elapsed * 1000:.3f}' if timing else f'app;dur={elapsed * 1000:.3f}'
+                message = {**message, 'headers': [*message.get('headers', []),
+                                                  (b'server-timing', timing.encode('latin-1'))]}
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _phases.reset(token)
+            elapsed = time.perf_counter() - start
+            route = scope.get('route')
+            label = getattr(route, 'path', None) or 'unmatched'
+            self.registry.observe(label, scope['method'], status, elapsed, phases, size, encoding)
+            if LOG_SAMPLE_RATE and random.random() < LOG_SAMPLE_RATE:
+                log_event(logging.INFO, 'request', method=scope['method'], path=scope['path'],
+                          route=label, status=status, ms=round(elapsed * 1000, 3), bytes=size,
+                          encoding=encoding,
+                          phases={k: round(v * 1000, 3) for k, v in phases.items()})
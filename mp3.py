@@ -0,0 +1,137 @@
+"""
+Minimal in-process MP3 frame parser for the Hiragana flashcard application.
+Walks MPEG audio frame headers to find the audio region, frame count,
+bitrate, sample rate and duration without decoding or external tools.
+"""
+
+# Bitrates in kbps indexed by [version_is_v1][layer][bitrate_index]
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates indexed by the 2-bit version field
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),   # MPEG-1
+    2: (22050, 24000, 16000),   # MPEG-2
+    0: (11025, 12000, 8000),    # MPEG-2.5
+}
+
+_VERSIONS = {3: '1', 2: '2', 0: '2.5'}
+
+
+class FrameHeader:
+    """Decoded fields of a 4-byte MPEG audio frame header"""
+    __slots__ = ('version', 'layer', 'bitrate', 'sample_rate', 'padding',
+                 'channels', 'length', 'samples')
+
+    def __init__(self, version, layer, bitrate, sample_rate, padding, channels, length, samples):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.channels = channels
+        self.length = length
+        self.samples = samples
+
+
+def parse_header(data, pos=0):
+    """Parse the frame header at ``data[pos:pos+4]``, or None if it isn't one"""
+    if pos + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    layer = 4 - layer_bits
+    v1 = version_bits == 3
+    bitrate = _BITRATES[(v1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][rate_index]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if (b3 >> 6) == 3 else 2
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or v1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return FrameHeader(_VERSIONS[version_bits], layer, bitrate, sample_rate,
+                       padding, channels, length, samples)
+
+
+def audio_region(data):
+    """(start, end) of the MPEG audio stream, excluding ID3v2 and ID3v1 tags"""
+    start, end = 0, len(data)
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14
+                | (data[8] & 0x7F) << 7 | (data[9] & 0x7F))
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    if end - start >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return min(start, end), end
+
+
+class Mp3Info:
+    """Summary of a scanned MP3 stream"""
+    __slots__ = ('audio_start', 'audio_end', 'frames', 'samples', 'sample_rate',
+                 'bitrate', 'channels', 'duration', 'sync_errors', 'truncated', 'version', 'layer')
+
+    def __init__(self):
+        self.audio_start = 0
+        self.audio_end = 0
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = 0
+        self.bitrate = 0
+        self.channels = 0
+        self.duration = 0.0
+        self.sync_errors = 0
+        self.truncated = False
+        self.version = None
+        self.layer = None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def scan(data):
+    """Walk every frame in ``data`` and summarise the stream"""
+    info = Mp3Info()
+    start, end = audio_region(data)
+    info.audio_start, info.audio_end = start, end
+    pos, total_bits = start, 0
+    while pos + 4 <= end:
+        header = parse_header(data, pos)
+        if header is None:
+            # Lost sync: count it and resynchronise on the next candidate byte
+            info.sync_errors += 1
+            pos = data.find(b'\xff', pos + 1, end)
+            if pos < 0:
+                break
+            continue
+        if pos + header.length > end:
+            info.truncated = True
+            break
+        if info.frames == 0:
+            info.sample_rate = header.sample_rate
+            info.channels = header.channels
+            info.version = header.version
+            info.layer = header.layer
+        info.frames += 1
+        info.samples += header.samples
+        total_bits += header.bitrate * header.samples
+        pos += header.length
+    if info.frames and info.sample_rate:
+        info.duration = info.samples / info.sample_rate
+        info.bitrate = total_bits // info.samples
+    return info
@@ -0,0 +1,67 @@
+"""
+Versioned precache manifest for the Hiragana flashcard application's
+service worker. Lists every page, clip and static asset with a revision so the
+worker can precache the whole app and fetch only entries that changed.
+"""
+
+import hashlib
+import json
+import threading
+
+from starlette.responses import Response
+
+from page_cache import etag_matches
+
+
+class PrecacheManifest:
+    """Manifest of offline URLs, rebuilt when the catalog version changes.
+
+    ``entries`` is a callable yielding ``(url, revision, htmx)`` tuples; the
+    application supplies it so this module stays independent of page layout.
+    """
+
+    def __init__(self, catalog, entries):
+        self.catalog = catalog
+        self.entries = entries
+        self._lock = threading.Lock()
+        self._version = None
+        self.body = b''
+        self.etag = ''
+
+    def build(self):
+        """Collect every entry and serialize the manifest"""
+        version = self.catalog.version
+        entries = []
+        for url, revision, htmx in self.entries():
+            entry = {'url': url, 'revision': revision}
+            if htmx:
+                entry['htmx'] = True
+            entries.append(entry)
+        digest = hashlib.blake2b(digest_size=16)
+        for entry in entries:
+            digest.update(f"{entry['url']} {entry['revision']} {entry.get('htmx', False)}\n".encode('utf-8'))
+        manifest = {'version': digest.hexdigest(), 'entries': entries}
+        self.body = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+        self.etag = f'"{manifest["version"]}"'
+        self._version = version
+        return manifest
+
+    def refresh(self):
+        """Rebuild the manifest if the catalog changed"""
+        if self._version != self.catalog.version:
+            with self._lock:
+                if self._version != self.catalog.version:
+                    self.build()
+
+    def invalidate(self):
+        """Rebuild on the next refresh, for changes the catalog version doesn't cover"""
+        with self._lock:
+            self._version = None
+
+    def response(self, request):
+        """Serve the manifest; it is always revalidated"""
+        self.refresh()
+        headers = {'ETag': self.etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type='application/json', headers=headers)
@@ -0,0 +1,144 @@
+"""
+Rendered-page cache for the Hiragana flashcard application.
+Stores the final HTML bytes and a strong ETag for each page, keyed by catalog
+version and by whether the request came from HTMX, and answers conditional
+GETs with 304 Not Modified. Compressed variants are kept alongside the page,
+so each page is encoded once per catalog version per content-coding.
+
+Handlers running on the event loop serve pages inside ``cached_only()``; a page
+that would need rendering, or a compressed variant that would need encoding,
+raises CacheMiss so the caller can retry off the loop.
+"""
+
+import contextvars
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from fasthtml.common import to_xml
+from starlette.responses import Response
+
+from metrics import timed
+
+
+# True while the current task may only serve pages that are already rendered
+_cached_only = contextvars.ContextVar('cached_only', default=False)
+
+
+class CacheMiss(Exception):
+    """A page needs rendering or encoding, which isn't allowed inside ``cached_only()``"""
+
+
+@contextmanager
+def cached_only():
+    """Raise CacheMiss instead of rendering a stale page or encoding a missing variant"""
+    token = _cached_only.set(True)
+    try:
+        yield
+    finally:
+        _cached_only.reset(token)
+
+
+def may_block():
+    """False inside ``cached_only()``, where work that can block must be deferred"""
+    return not _cached_only.get()
+
+
+class CachedPage:
+    """Serialized page body, its validator and encoded variants for one catalog version"""
+    __slots__ = ('version', 'body', 'etag', 'variants')
+
+    def __init__(self, version, body, etag):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.variants = {}
+
+
+def make_etag(body):
+    """Strong ETag derived from the response bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def is_htmx(request):
+    """True for HTMX swaps, False for direct navigation and history restores"""
+    headers = request.headers
+    return 'hx-request' in headers and 'hx-history-restore-request' not in headers
+
+
+class PageCache:
+    """Cache of rendered pages that is invalidated by the catalog version"""
+
+    def __init__(self, catalog, compressor=None):
+        self.catalog = catalog
+        self.compressor = compressor
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def page(self, key, render, htmx=False):
+        """Cached page for ``key``, rendering it with ``render()`` when stale"""
+        version = self.catalog.version
+        entry = self._pages.get((key, htmx))
+        if entry is None or entry.version != version:
+            if _cached_only.get():
+                raise CacheMiss(key)
+            body = to_xml(render()).encode('utf-8')
+            entry = CachedPage(version, body, make_etag(body))
+            with self._lock:
+                self._pages[(key, htmx)] = entry
+        return entry
+
+    def response(self, request, key, render, fragment=None):
+        """HTML response for a cached page, or 304 if the client's copy is current.
+
+        HTMX requests get ``fragment()`` when one is given, so a swap into the
+        page doesn't carry a second document with its own head and scripts.
+        Rendering counts as the request's render phase; encoding a variant is
+        charged to compress by the compressor.
+        """
+        htmx = is_htmx(request)
+        with timed('render'):
+            entry = self.page(key, fragment if htmx and fragment else render, htmx)
+        headers = {
+            'ETag': entry.etag,
+            'Cache-Control': 'no-cache',
+            'Vary': 'HX-Request, HX-History-Restore-Request',
+        }
+        body = entry.body
+        encoding = None
+        if self.compressor is not None:
+            headers['Vary'] += ', Accept-Encoding'
+            encoding = self.compressor.negotiate(request.headers.get('accept-encoding'), len(body))
+        if encoding:
+            # Each encoding is a different representation with its own validator
+            headers['ETag'] = f'{entry.etag[:-1]}-{encoding}"'
+            headers['Content-Encoding'] = encoding
+        if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            body = entry.variants.get(encoding)
+            if body is None:
+                if _cached_only.get():
+                    raise CacheMiss(key)
+                body = entry.variants[encoding] = self.compressor.compress(entry.body, encoding, cached=True)
+        return Response(body, media_type='text/html; charset=utf-8', headers=headers)
+
+    def clear(self):
+        """Drop every cached page"""
+        with self._lock:
+            self._pages.clear()
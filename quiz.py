@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Batched multiple-choice quiz engine for the Hiragana flashcard application.
+Builds whole rounds of kana → romaji, romaji → kana and audio → kana questions
+in one call, drawing distractors from a phonetic similarity matrix over the
+romaji and pronunciation columns that is computed once per catalog version
+(vectorized with NumPy when it is installed, a block of rows at a time) and
+re-ranked by the mistakes learners actually make. Cards that read the same as
+the answer (カ for か) are never offered, since they would also be correct.
+
+Usage (benchmark):
+    python3 quiz.py                 # build time and µs per question
+    python3 quiz.py -n 50 --rounds 500
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:  # optional: a sparse pure-Python path is always available
+    numpy = None
+
+KINDS = ('kana', 'romaji', 'audio')
+CHOICES = 4
+# Similar cards kept per row; distractors come from the top of this list
+CANDIDATES = 16
+# How far one recorded confusion can lift a candidate, and how fast it saturates
+MISTAKE_WEIGHT = 1.0
+MISTAKE_HALF = 3
+# Similarity scores held at once; rows per block shrink as the catalog grows,
+# so building stays within ~16 MB of scores instead of n × n floats
+BLOCK_CELLS = 1 << 22
+# Features shared by at least this share of cards are scored with a dense
+# matrix product; rarer ones only touch the cards that have them
+DENSE_SHARE = 1 / 64
+
+VOWELS = 'aiueo'
+
+
+def features(char):
+    """Weighted phonetic features: vowel, consonant onset and letter bigrams"""
+    romaji = char.romaji.lower()
+    vowel = romaji[-1] if romaji and romaji[-1] in VOWELS else ''
+    onset = romaji[:-1] if vowel else romaji
+    feats = {f'v:{vowel}': 1.0, f'c:{onset}': 1.0}
+    for prefix, text, weight in (('r', romaji, 0.5), ('p', (char.pronunciation or '').lower(), 0.25)):
+        text = f'^{text}$'
+        for i in range(len(text) - 1):
+            key = f'{prefix}:{text[i:i + 2]}'
+            feats[key] = feats.get(key, 0.0) + weight
+    norm = sum(w * w for w in feats.values()) ** 0.5
+    return {key: w / norm for key, w in feats.items()}
+
+
+class Question:
+    """One multiple-choice question; ``options`` are card ids"""
+    __slots__ = ('card_id', 'kind', 'options')
+
+    def __init__(self, card_id, kind, options):
+        self.card_id = card_id
+        self.kind = kind
+        self.options = options
+
+
+class _Similarity:
+    """Cosine similarity between every pair of cards for one catalog version"""
+
+    def __init__(self, version, chars):
+        self.version = version
+        self.ids = [char.id for char in chars]
+        self.row = {char_id: i for i, char_id in enumerate(self.ids)}
+        self.romaji = [char.romaji for char in chars]
+        self._feats = [features(char) for char in chars]
+        self._candidates = {}
+        if numpy is not None and self.ids:
+            self._candidates = {char_id: [] for char_id in self.ids}
+            postings = {}
+            for i, feats in enumerate(self._feats):
+                for key, weight in feats.items():
+                    postings.setdefault(key, []).append((i, weight))
+            postings = {key: (numpy.array([i for i, _ in pairs], dtype=numpy.intp),
+                              numpy.array([w for _, w in pairs], dtype=numpy.float32))
+                        for key, pairs in postings.items()}
+            n = len(self.ids)
+            common = [key for key, (cols, _) in postings.items() if len(cols) >= n * DENSE_SHARE]
+            dense = numpy.zeros((n, len(common)), dtype=numpy.float32)
+            for c, key in enumerate(common):
+                cols, weights = postings.pop(key)
+                dense[cols, c] = weights
+            sounds = {}
+            sound = numpy.array([sounds.setdefault(romaji, len(sounds)) for romaji in self.romaji])
+            keep = min(CANDIDATES, n - 1)
+            step = max(1, BLOCK_CELLS // n)
+            for start in range(0, n if keep > 0 else 0, step):
+                stop = min(start + step, n)
+                scores = dense[start:stop] @ dense.T
+                # Each rare feature of the block's rows adds its weight pairs
+                # against only the cards that share it
+                block = {}
+                for i in range(start, stop):
+                    for key, weight in self._feats[i].items():
+                        if key in postings:
+                            rows, weights = block.setdefault(key, ([], []))
+                            rows.append(i - start)
+                            weights.append(weight)
+                for key, (rows, weights) in block.items():
+                    cols, others = postings[key]
+                    scores[numpy.ix_(rows, cols)] += numpy.outer(numpy.array(weights, dtype=numpy.float32),
+                                                                  others)
+                # The card itself and cards with the same reading are never distractors
+                scores[sound[start:stop, None] == sound[None, :]] = -numpy.inf
+                top = numpy.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+                for offset, cols in enumerate(top):
+                    row = scores[offset]
+                    ranked = sorted(((float(row[j]), self.ids[j]) for j in cols
+                                     if row[j] > -numpy.inf), reverse=True)
+                    self._candidates[self.ids[start + offset]] = ranked
+        else:
+            # Inverted index so each row only scores cards it shares a feature with
+            self._postings = {}
+            for i, feats in enumerate(self._feats):
+                for key, weight in feats.items():
+                    self._postings.setdefault(key, []).append((i, weight))
+
+    def candidates(self, card_id):
+        """Most similar other cards as (score, id), best first"""
+        ranked = self._candidates.get(card_id)
+        if ranked is None:
+            i = self.row[card_id]
+            romaji = self.romaji[i]
+            scores = {}
+            for key, weight in self._feats[i].items():
+                for j, other in self._postings[key]:
+                    if self.romaji[j] != romaji:
+                        scores[j] = scores.get(j, 0.0) + weight * other
+            best = sorted(scores.items(), key=lambda item: -item[1])[:CANDIDATES]
+            ranked = self._candidates[card_id] = [(score, self.ids[j]) for j, score in best]
+        return ranked
+
+    def same_reading(self, card_id, other):
+        """True when both cards have the same romaji, like か and カ"""
+        return self.romaji[self.row[card_id]] == self.romaji[self.row[other]]
+
+
+class QuizEngine:
+    """Round generator with distractors ranked by similarity and past mistakes"""
+
+    TABLE = 'quiz_confusions'
+
+    def __init__(self, catalog, db):
+        self.catalog = catalog
+        self.db = db
+        self._lock = threading.Lock()
+        self._similarity = None
+        self._ranked = {}       # card id -> distractor ids, best first
+        self._mistakes = {}     # card id -> {wrongly chosen id: count}
+        with db.writer() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    card_id INTEGER NOT NULL,
+                    chosen_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (card_id, chosen_id)
+                ) WITHOUT ROWID
+            ''')
+        with db.reader() as conn:
+            for card_id, chosen_id, count in conn.execute(f'SELECT card_id, chosen_id, count FROM {self.TABLE}'):
+                self._mistakes.setdefault(card_id, {})[chosen_id] = count
+
+    def similarity(self):
+        """Similarity matrix for the current catalog version"""
+        version = self.catalog.version
+        sim = self._similarity
+        if sim is None or sim.version != version:
+            with self._lock:
+                sim = self._similarity
+                if sim is None or sim.version != version:
+                    sim = self._similarity = _Similarity(version, list(self.catalog))
+                    self._ranked = {}
+        return sim
+
+    def distractors(self, card_id):
+        """Other card ids a learner is likely to confuse with ``card_id``"""
+        sim = self.similarity()
+        ranked = self._ranked.get(card_id)
+        if ranked is None:
+            scores = {other: score for score, other in sim.candidates(card_id)}
+            for other, count in self._mistakes.get(card_id, {}).items():
+                if other in sim.row and not sim.same_reading(card_id, other):
+                    scores[other] = scores.get(other, 0.0) + MISTAKE_WEIGHT * count / (count + MISTAKE_HALF)
+            ranked = sorted(scores, key=lambda other: -scores[other])
+            self._ranked[card_id] = ranked
+        return ranked
+
+    def round(self, n, kinds=KINDS, rng=random, card_ids=None, has_audio=None):
+        """``n`` questions, each with ``CHOICES`` shuffled options.
+
+        When ``has_audio(card_id)`` is given, audio questions are only asked
+        about cards it is true for.
+        """
+        sim = self.similarity()
+        pool = list(card_ids) if card_ids is not None else sim.ids
+        if has_audio is not None and tuple(kinds) == ('audio',):
+            pool = [card_id for card_id in pool if has_audio(card_id)]
+        if not pool:
+            return []
+        cards = rng.sample(pool, n) if n <= len(pool) else [rng.choice(pool) for _ in range(n)]
+        silent = tuple(kind for kind in kinds if kind != 'audio')
+        questions = []
+        for card_id in cards:
+            # Sample from the closest few so rounds don't repeat verbatim
+            near = self.distractors(card_id)[:2 * (CHOICES - 1)]
+            options = rng.sample(near, min(CHOICES - 1, len(near))) + [card_id]
+            rng.shuffle(options)
+            card_kinds = kinds if has_audio is None or has_audio(card_id) else silent
+            questions.append(Question(card_id, rng.choice(card_kinds), options))
+        return questions
+
+    def record(self, answers):
+        """Store (card_id, chosen_id) answers; wrong ones re-rank distractors"""
+        mistakes = [(card_id, chosen_id) for card_id, chosen_id in answers if chosen_id != card_id]
+        if not mistakes:
+            return 0
+        with self._lock:
+            for card_id, chosen_id in mistakes:
+                counts = self._mistakes.setdefault(card_id, {})
+                counts[chosen_id] = counts.get(chosen_id, 0) + 1
+                self._ranked.pop(card_id, None)
+        with self.db.writer('quiz_record') as conn:
+            conn.executemany(f'''
+                INSERT INTO {self.TABLE} (card_id, chosen_id, count) VALUES (?, ?, 1)
+                ON CONFLICT (card_id, chosen_id) DO UPDATE SET count = count + 1
+            ''', mistakes)
+        return len(mistakes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quiz round generation benchmark")
+    parser.add_argument('-n', '--questions', type=int, default=50, help="questions per round")
+    parser.add_argument('--rounds', type=int, default=200, help="rounds to generate")
+    parser.add_argument('--db', default='data/hiragana.db', help="database file")
+    args = parser.parse_args(argv)
+
+    from catalog import Catalog
+    from database import Database
+    catalog = Catalog(args.db)
+    db = Database(args.db, readers=1)
+    engine = QuizEngine(catalog, db)
+
+    start = time.perf_counter()
+    engine.similarity()
+    build = time.perf_counter() - start
+    backend = 'numpy' if numpy is not None else 'pure Python'
+    print(f"🧮 Similarity for {len(catalog)} cards built in {build * 1000:.2f}ms ({backend})")
+
+    rng = random.Random(1234)
+    engine.round(args.questions, rng=rng)       # warm the distractor cache
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        engine.round(args.questions, rng=rng)
+    elapsed = time.perf_counter() - start
+    per_question = elapsed / (args.rounds * args.questions) * 1e6
+    print(f"📝 {args.rounds} rounds of {args.questions} questions: "
+          f"{elapsed / args.rounds * 1000:.3f}ms per round, {per_question:.2f}µs per question")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Write-behind review event log for the Hiragana flashcard application.
+Grade events go onto an in-process queue and a background writer commits them
+to SQLite in batches, so request handlers never wait on the database lock.
+A batch that fails to commit is logged and retried with exponential backoff
+before its events' Futures are failed.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import log_event
+
+_STOP = object()
+
+# Commit attempts per batch, and the delay before the first retry (doubling)
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.1
+
+
+class ReviewEvent:
+    """One graded review"""
+    __slots__ = ('learner_id', 'card_id', 'grade', 'reviewed_at', 'response_ms')
+
+    def __init__(self, learner_id, card_id, grade, reviewed_at=None, response_ms=None):
+        self.learner_id = learner_id
+        self.card_id = card_id
+        self.grade = grade
+        self.reviewed_at = time.time() if reviewed_at is None else reviewed_at
+        self.response_ms = response_ms
+
+    def as_row(self):
+        return (self.learner_id, self.card_id, self.grade, self.reviewed_at, self.response_ms)
+
+
+class ReviewLog:
+    """Batched, write-behind writer for review events.
+
+    ``submit()`` returns immediately with a Future that resolves once the
+    event's batch has been committed. A batch is flushed when it reaches
+    ``max_batch`` events or ``max_delay`` seconds after its first event.
+    """
+
+    TABLE = 'review_events'
+
+    def __init__(self, db, max_batch=500, max_delay=0.05, after_flush=None,
+                 max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Called on the writer thread after each flush, e.g. to snapshot state
+        self.after_flush = after_flush
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.flushed_batches = 0
+        self.flushed_events = 0
+        self.retries = 0
+        self.failed_events = 0
+
+    def _create_table(self):
+        with self.db.writer() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    learner_id TEXT NOT NULL,
+                    card_id INTEGER NOT NULL,
+                    grade INTEGER NOT NULL,
+                    reviewed_at REAL NOT NULL,
+                    response_ms INTEGER
+                )
+            ''')
+            conn.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_learner
+                ON {self.TABLE} (learner_id, reviewed_at)
+            ''')
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the writer thread (idempotent)"""
+        with self._lock:
+            if not self.running:
+                ready = Future()
+                self._thread = threading.Thread(target=self._run, args=(ready,),
+                                                name='review-log-writer', daemon=True)
+                self._thread.start()
+                ready.result()
+        return self
+
+    def stop(self, timeout=None):
+        """Flush everything queued so far and stop the writer"""
+        with self._lock:
+            if self.running:
+                self._queue.put(_STOP)
+                self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, event):
+        """Queue an event; the returned Future resolves when it is durable"""
+        if not self.running:
+            self.start()
+        done = Future()
+        self._queue.put((event, done))
+        return done
+
+    def pending(self):
+        """Approximate number of events waiting to be written"""
+        return self._queue.qsize()
+
+    def _run(self, ready):
+        try:
+            self._create_table()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(True)
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Drain anything submitted before stop() was called
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._flush(leftover)
+
+    def _flush(self, batch):
+        rows = [event.as_row() for event, _ in batch]
+        delay = self.retry_delay
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self.db.writer('review_insert') as conn:
+                    conn.executemany(f'''
+                        INSERT INTO {self.TABLE} (learner_id, card_id, grade, reviewed_at, response_ms)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', rows)
+                break
+            except Exception as e:
+                log_event(logging.ERROR, 'review_log_flush_failed', events=len(batch),
+                          attempt=attempt, error=str(e))
+                if attempt == self.max_attempts:
+                    self.failed_events += len(batch)
+                    for _, done in batch:
+                        done.set_exception(e)
+                    return
+                # Events queued meanwhile wait for the retry; a locked or full
+                # database usually clears within a few attempts
+                self.retries += 1
+                time.sleep(delay)
+                delay *= 2
+        self.flushed_batches += 1
+        self.flushed_events += len(batch)
+        for _, done in batch:
+            done.set_result(True)
+        if self.after_flush is not None:
+            try:
+                self.after_flush()
+            except Exception as e:
+                log_event(logging.ERROR, 'review_log_after_flush_failed', error=str(e))
@@ -0,0 +1,322 @@
+"""
+Spaced-repetition scheduler for the Hiragana flashcard application.
+Implements SM-2 with one priority queue per learner keyed by due time, so
+picking the next card is O(log n) and never scans the review history.
+Card state is updated in place and snapshotted to SQLite for fast rebuilds.
+A learner only holds state for cards they have been shown, and queues of
+learners who have gone idle are dropped once they are snapshotted.
+"""
+
+import heapq
+import threading
+import time
+
+DAY = 24 * 60 * 60
+# A failed card comes back within the same session
+RELEARN_DELAY = 10 * 60
+
+# Queues unused for this long are dropped after a snapshot (reloaded on demand),
+# and at most MAX_LEARNERS stay in memory
+IDLE_TTL = 30 * 60
+MAX_LEARNERS = 10000
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# Button labels and their SM-2 quality scores (0-5)
+GRADES = {'again': 1, 'hard': 3, 'good': 4, 'easy': 5}
+
+
+class CardState:
+    """Scheduling state for one card of one learner"""
+    __slots__ = ('card_id', 'due', 'interval', 'ease', 'reps', 'lapses', 'last_review')
+
+    def __init__(self, card_id, due, interval=0.0, ease=DEFAULT_EASE, reps=0, lapses=0, last_review=None):
+        self.card_id = card_id
+        self.due = due
+        self.interval = interval
+        self.ease = ease
+        self.reps = reps
+        self.lapses = lapses
+        self.last_review = last_review
+
+    def as_row(self, learner_id):
+        return (learner_id, self.card_id, self.due, self.interval, self.ease,
+                self.reps, self.lapses, self.last_review)
+
+
+def sm2(state, quality, now):
+    """Apply one SM-2 review with quality 0-5 to ``state`` in place"""
+    if quality < 3:
+        state.reps = 0
+        state.lapses += 1
+        state.interval = 0.0
+        state.due = now + RELEARN_DELAY
+    else:
+        state.reps += 1
+        if state.reps == 1:
+            state.interval = 1.0
+        elif state.reps == 2:
+            state.interval = 6.0
+        else:
+            state.interval = round(state.interval * state.ease, 2)
+        state.due = now + state.interval * DAY
+    state.ease = max(MIN_EASE, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    state.last_review = now
+    return state
+
+
+class LearnerQueue:
+    """Cards of one learner in a min-heap ordered by due time.
+
+    Grading pushes a fresh heap entry and leaves the old one behind; stale
+    entries are recognised by their due time and dropped when they surface,
+    and the heap is compacted once they outnumber live cards. ``lock`` guards
+    the heap and states, since one learner's requests can run concurrently.
+    """
+
+    def __init__(self, states=()):
+        self.states = {s.card_id: s for s in states}
+        self.lock = threading.Lock()
+        self._seq = 0
+        self._heap = []
+        self._rebuild()
+        self.dirty = set()
+        self.touched = time.time()
+        # Catalog version of the card list ``introduce()`` last scanned, and
+        # how far it got; every card before the cursor is already enrolled
+        self.enrolled_version = None
+        self._cursor = 0
+
+    def _rebuild(self):
+        self._heap = []
+        for s in self.states.values():
+            self._heap.append((s.due, self._next_seq(), s.card_id))
+        heapq.heapify(self._heap)
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    def _push(self, state):
+        heapq.heappush(self._heap, (state.due, self._next_seq(), state.card_id))
+        if len(self._heap) > 2 * len(self.states) + 64:
+            self._rebuild()
+
+    def _top(self):
+        """Live entry at the top of the heap, discarding stale ones"""
+        heap = self._heap
+        while heap:
+            due, _, card_id = heap[0]
+            state = self.states.get(card_id)
+            if state is not None and state.due == due:
+                return state
+            heapq.heappop(heap)
+        return None
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, card_id):
+        return card_id in self.states
+
+    def _enroll(self, card_id, now):
+        state = CardState(card_id, now)
+        self.states[card_id] = state
+        self.dirty.add(card_id)
+        self._push(state)
+
+    def enroll(self, card_ids, now):
+        """Add new cards, due now in the given order"""
+        with self.lock:
+            for card_id in card_ids:
+                if card_id not in self.states:
+                    self._enroll(card_id, now)
+
+    def introduce(self, cards, version, now=None):
+        """Enroll the first of ``cards`` the learner hasn't seen; returns its id or None.
+
+        ``version`` identifies the card list, so the scan resumes where the
+        last call stopped instead of starting over.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            if version != self.enrolled_version:
+                self.enrolled_version, self._cursor = version, 0
+            while self._cursor < len(cards):
+                card_id = cards[self._cursor].id
+                self._cursor += 1
+                if card_id not in self.states:
+                    self._enroll(card_id, now)
+                    return card_id
+            return None
+
+    def next_card(self, now=None):
+        """Id of the most overdue card, or None if nothing is due yet"""
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self._top()
+            if state is None or state.due > now:
+                return None
+            return state.card_id
+
+    def next_due(self):
+        """Due time of the earliest card, or None for an empty queue"""
+        with self.lock:
+            state = self._top()
+            return None if state is None else state.due
+
+    def due_count(self, now=None):
+        """Number of cards due now (linear; for display, not the hot path)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return sum(1 for s in self.states.values() if s.due <= now)
+
+    def grade(self, card_id, quality, now=None):
+        """Record a review and reschedule the card"""
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self.states.get(card_id)
+            if state is None:
+                raise KeyError(card_id)
+            sm2(state, quality, now)
+            self.dirty.add(card_id)
+            self._push(state)
+            return state
+
+
+class Scheduler:
+    """Per-learner queues with a SQLite snapshot of every card's state"""
+
+    TABLE = 'review_schedule'
+
+    def __init__(self, db):
+        self.db = db
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._last_snapshot = time.time()
+        with db.writer() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    learner_id TEXT NOT NULL,
+                    card_id INTEGER NOT NULL,
+                    due REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    ease REAL NOT NULL,
+                    reps INTEGER NOT NULL,
+                    lapses INTEGER NOT NULL,
+                    last_review REAL,
+                    PRIMARY KEY (learner_id, card_id)
+                ) WITHOUT ROWID
+            ''')
+
+    def queue(self, learner_id):
+        """The learner's queue, rebuilt from the snapshot on first use"""
+        queue = self._queues.get(learner_id)
+        if queue is None:
+            states = self.load(learner_id)
+            with self._lock:
+                queue = self._queues.get(learner_id)
+                if queue is None:
+                    queue = self._queues[learner_id] = LearnerQueue(states)
+        queue.touched = time.time()
+        return queue
+
+    def grade(self, learner_id, card_id, quality, now=None):
+        """Grade a card in the learner's queue; returns the queue that holds the grade.
+
+        The card is marked dirty under the scheduler lock before grading, so an
+        eviction can't drop the queue between the lookup and the grade.
+        """
+        queue = self.queue(learner_id)
+        with self._lock:
+            # Re-adopt the queue if it was evicted since the lookup
+            queue = self._queues.setdefault(learner_id, queue)
+            with queue.lock:
+                if card_id not in queue.states:
+                    raise KeyError(card_id)
+                queue.dirty.add(card_id)
+        queue.grade(card_id, quality, now)
+        return queue
+
+    def rebuild(self, learner_id):
+        """Recompute the learner's card states by replaying review_events in time order.
+
+        Used after importing history, whose reviews may predate ones already
+        applied. Cards with no logged reviews keep their current state.
+        """
+        states = {}
+        with self.db.reader('schedule_rebuild') as conn:
+            rows = conn.execute('''
+                SELECT card_id, grade, reviewed_at FROM review_events
+                WHERE learner_id = ? ORDER BY reviewed_at, id
+            ''', (learner_id,))
+            for card_id, grade, reviewed_at in rows:
+                state = states.get(card_id)
+                if state is None:
+                    state = states[card_id] = CardState(card_id, reviewed_at)
+                sm2(state, grade, reviewed_at)
+        old = self.queue(learner_id)
+        with self._lock, old.lock:
+            for card_id, state in old.states.items():
+                states.setdefault(card_id, state)
+            queue = LearnerQueue(states.values())
+            queue.dirty = set(states)
+            self._queues[learner_id] = queue
+        return queue
+
+    def load(self, learner_id):
+        """Card states from the last snapshot"""
+        with self.db.reader('schedule_load') as conn:
+            rows = conn.execute(f'''
+                SELECT card_id, due, interval, ease, reps, lapses, last_review
+                FROM {self.TABLE} WHERE learner_id = ?
+            ''', (learner_id,)).fetchall()
+        return [CardState(*row) for row in rows]
+
+    def snapshot(self):
+        """Write every changed card state in one transaction; returns the row count"""
+        with self._lock:
+            rows = []
+            for learner_id, queue in self._queues.items():
+                with queue.lock:
+                    dirty, queue.dirty = queue.dirty, set()
+                    rows.extend(queue.states[c].as_row(learner_id) for c in dirty)
+            self._last_snapshot = time.time()
+        if rows:
+            with self.db.writer('schedule_snapshot') as conn:
+                conn.executemany(f'''
+                    INSERT OR REPLACE INTO {self.TABLE}
+                    (learner_id, card_id, due, interval, ease, reps, lapses, last_review)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+        self.evict()
+        return len(rows)
+
+    def evict(self, now=None):
+        """Drop queues with nothing left to snapshot; returns how many were dropped.
+
+        Queues idle for IDLE_TTL go first, then the least recently used beyond
+        MAX_LEARNERS. A dropped learner is reloaded from the snapshot on demand.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            clean = sorted((queue.touched, learner_id) for learner_id, queue in self._queues.items()
+                           if not queue.dirty)
+            excess = len(self._queues) - MAX_LEARNERS
+            dropped = 0
+            for touched, learner_id in clean:
+                if now - touched <= IDLE_TTL and dropped >= excess:
+                    break
+                del self._queues[learner_id]
+                dropped += 1
+        return dropped
+
+    def __len__(self):
+        return len(self._queues)
+
+    def maybe_snapshot(self, interval=30):
+        """Snapshot if at least ``interval`` seconds passed since the last one"""
+        if time.time() - self._last_snapshot >= interval:
+            return self.snapshot()
+        return 0
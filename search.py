@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Prefix and fuzzy search over the character catalog for the Hiragana flashcard
+application. Keeps sorted term lists, bucketed by length, for prefix lookups
+and a single-deletion index for typo-tolerant matches, and applies catalog
+changes incrementally so typeahead can run on every keystroke.
+
+Usage (benchmark):
+    python3 search.py                      # latency at several catalog sizes
+    python3 search.py --sizes 1000,100000 -n 5000
+"""
+
+import argparse
+import bisect
+import heapq
+import random
+import sys
+import threading
+import time
+import unicodedata
+
+# Record attributes that are searchable; missing ones (e.g. meaning) are skipped
+FIELDS = ('character', 'romaji', 'pronunciation', 'meaning')
+
+# Katakana (ァ..ヶ) folds onto hiragana so either script finds the same card
+_KATAKANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def normalize(text):
+    """Case-, width- and kana-folded form used for indexing and queries"""
+    return unicodedata.normalize('NFKC', text).casefold().translate(_KATAKANA).strip()
+
+
+def deletions(term):
+    """Every string made by deleting one character from ``term``"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def within_one_edit(a, b):
+    """True if ``a`` and ``b`` differ by at most one insertion, deletion or substitution"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+# Shorter queries are all one edit away from too many unrelated terms
+MIN_FUZZY_LENGTH = 3
+
+
+class SearchIndex:
+    """Incrementally maintained prefix and edit-distance-1 index.
+
+    ``refresh()`` compares the catalog against the records indexed last time
+    and only re-indexes rows that were added, removed or changed.
+    """
+
+    def __init__(self, catalog, fields=FIELDS):
+        self.catalog = catalog
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._version = None
+        self._records = {}      # id -> (character record, its terms)
+        self._postings = {}     # term -> set of ids
+        self._by_length = {}    # term length -> sorted distinct terms
+        self._deletes = {}      # one-deletion variant -> set of terms
+        self._ordered = {}      # term -> its ids as sorted (order_index, id), built on demand
+        self.refresh()
+
+    def _terms_for(self, char):
+        terms = set()
+        for field in self.fields:
+            value = getattr(char, field, None)
+            if value:
+                # Multi-word values (meanings) are searchable by each word too
+                text = normalize(str(value))
+                terms.add(text)
+                terms.update(text.split())
+        terms.discard('')
+        return terms
+
+    def _add(self, char, bulk=False):
+        terms = self._terms_for(char)
+        self._records[char.id] = (char, terms)
+        for term in terms:
+            ids = self._postings.get(term)
+            if ids is None:
+                ids = self._postings[term] = set()
+                bucket = self._by_length.setdefault(len(term), [])
+                if bulk:
+                    bucket.append(term)
+                else:
+                    bisect.insort(bucket, term)
+                for variant in deletions(term):
+                    self._deletes.setdefault(variant, set()).add(term)
+            ids.add(char.id)
+            self._ordered.pop(term, None)
+
+    def _remove(self, char_id):
+        _, terms = self._records.pop(char_id)
+        for term in terms:
+            ids = self._postings[term]
+            ids.discard(char_id)
+            self._ordered.pop(term, None)
+            if not ids:
+                del self._postings[term]
+                bucket = self._by_length[len(term)]
+                del bucket[bisect.bisect_left(bucket, term)]
+                for variant in deletions(term):
+                    holders = self._deletes[variant]
+                    holders.discard(term)
+                    if not holders:
+                        del self._deletes[variant]
+
+    @staticmethod
+    def _key(char):
+        return (char.character, char.romaji, char.pronunciation, char.category,
+                char.order_index, getattr(char, 'meaning', None))
+
+    def refresh(self):
+        """Apply catalog changes since the last refresh; returns rows re-indexed"""
+        if self._version == self.catalog.version:
+            return 0
+        with self._lock:
+            version = self.catalog.version
+            if self._version == version:
+                return 0
+            current = {char.id: char for char in self.catalog}
+            if not self._records:
+                # First build: append everything, then sort each bucket once
+                for char in current.values():
+                    self._add(char, bulk=True)
+                for bucket in self._by_length.values():
+                    bucket.sort()
+                self._version = version
+                return len(current)
+            changed = 0
+            for char_id in [i for i in self._records if i not in current]:
+                self._remove(char_id)
+                changed += 1
+            for char_id, char in current.items():
+                indexed = self._records.get(char_id)
+                if indexed is not None and self._key(indexed[0]) == self._key(char):
+                    # Same data; keep the catalog's current record object
+                    self._records[char_id] = (char, indexed[1])
+                    continue
+                if indexed is not None:
+                    self._remove(char_id)
+                self._add(char)
+                changed += 1
+            self._version = version
+            return changed
+
+    def __len__(self):
+        return len(self._postings)
+
+    def _ordered_ids(self, term):
+        ordered = self._ordered.get(term)
+        if ordered is None:
+            records = self._records
+            ordered = self._ordered[term] = sorted((records[i][0].order_index, i)
+                                                   for i in self._postings[term])
+        return ordered
+
+    def _take(self, terms, ranked, seen, limit):
+        """Append ids from ``terms`` in catalog order until ``ranked`` is full"""
+        for _, char_id in heapq.merge(*[self._ordered_ids(term) for term in terms]):
+            if char_id not in seen:
+                seen.add(char_id)
+                ranked.append(char_id)
+                if len(ranked) >= limit:
+                    return
+
+    def _fuzzy_terms(self, query):
+        """Terms within one insertion, deletion or substitution of ``query``"""
+        found = set(self._deletes.get(query, ()))
+        for variant in deletions(query) | {query}:
+            if variant in self._postings:
+                found.add(variant)
+            found.update(self._deletes.get(variant, ()))
+        found.discard(query)
+        # Shared deletions also pair terms two edits apart; keep true neighbours
+        return [term for term in found if within_one_edit(query, term)]
+
+    def search(self, query, limit=10, wait=True):
+        """Characters matching ``query``: exact, then prefix, then fuzzy.
+
+        With ``wait=False`` returns None instead of waiting for a refresh in
+        progress on another thread.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        if not self._lock.acquire(wait):
+            return None
+        try:
+            ranked, seen = [], set()
+            # Shorter completions rank first (the exact match is the shortest),
+            # so buckets are visited by length and the scan stops once full
+            for length in sorted(self._by_length):
+                if length < len(query):
+                    continue
+                bucket = self._by_length[length]
+                terms = []
+                for i in range(bisect.bisect_left(bucket, query), len(bucket)):
+                    if not bucket[i].startswith(query):
+                        break
+                    terms.append(bucket[i])
+                self._take(terms, ranked, seen, limit)
+                if len(ranked) >= limit:
+                    break
+            # Typo tolerance only when prefixes don't fill the list
+            if len(ranked) < limit and len(query) >= MIN_FUZZY_LENGTH:
+                self._take(self._fuzzy_terms(query), ranked, seen, limit)
+            return [self._records[char_id][0] for char_id in ranked]
+        finally:
+            self._lock.release()
+
+
+class _Row:
+    """Synthetic catalog row for the benchmark"""
+    __slots__ = ('id', 'character', 'romaji', 'pronunciation', 'category', 'order_index')
+
+    def __init__(self, id, character, romaji, pronunciation, category, order_index):
+        self.id = id
+        self.character = character
+        self.romaji = romaji
+        self.pronunciation = pronunciation
+        self.category = category
+        self.order_index = order_index
+
+
+class _SyntheticCatalog:
+    """Catalog-shaped list of generated rows"""
+
+    def __init__(self, size, seed=0):
+        rng = random.Random(seed)
+        syllables = ['a', 'i', 'u', 'e', 'o', 'ka', 'ki', 'ku', 'ke', 'ko', 'sa', 'shi', 'su',
+                     'ta', 'chi', 'tsu', 'na', 'ni', 'ha', 'hi', 'fu', 'ma', 'mi', 'ya', 'yu',
+                     'ra', 'ri', 'ru', 'wa', 'n']
+        self.version = 1
+        self.rows = []
+        for i in range(size):
+            romaji = ''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+            char = chr(0x4E00 + i % 20000) + (str(i // 20000) if i >= 20000 else '')
+            self.rows.append(_Row(i + 1, char, romaji, romaji + 'h', f'set-{i % 50}', i))
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def _percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def benchmark(sizes, queries_per_size, seed=1234):
+    """Build time and query latency percentiles for each catalog size"""
+    results = []
+    for size in sizes:
+        catalog = _SyntheticCatalog(size, seed)
+        start = time.perf_counter()
+        index = SearchIndex(catalog)
+        build = time.perf_counter() - start
+
+        rng = random.Random(seed)
+        queries = []
+        for _ in range(queries_per_size):
+            romaji = rng.choice(catalog.rows).romaji
+            cut = rng.randint(1, len(romaji))
+            query = romaji[:cut]
+            if rng.random() < 0.2 and len(query) > 1:
+                # Typo: swap one letter
+                pos = rng.randrange(len(query))
+                query = query[:pos] + rng.choice('aeiouknst') + query[pos + 1:]
+            queries.append(query)
+
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+
+        # One changed row, as an edit to a pack would cause
+        catalog.rows[0] = _Row(1, catalog.rows[0].character, 'changed', 'changed', 'set-0', 0)
+        catalog.version += 1
+        start = time.perf_counter()
+        index.refresh()
+        incremental = time.perf_counter() - start
+
+        results.append({
+            'size': size,
+            'terms': len(index),
+            'build_ms': round(build * 1000, 2),
+            'refresh_one_ms': round(incremental * 1000, 3),
+            'p50_us': round(_percentile(samples, 50) * 1e6, 1),
+            'p95_us': round(_percentile(samples, 95) * 1e6, 1),
+            'p99_us': round(_percentile(samples, 99) * 1e6, 1),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search index latency as the catalog grows")
+    parser.add_argument('--sizes', default='46,1000,10000,50000',
+                        help="comma-separated catalog sizes")
+    parser.add_argument('-n', '--queries', type=int, default=2000, help="queries per size")
+    parser.add_argument('--seed', type=int, default=1234, help="random seed")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"🔎 Search latency over {args.queries} typeahead queries per catalog size")
+    print(f"\n{'rows':>8}{'terms':>9}{'build ms':>10}{'refresh ms':>12}{'p50 µs':>9}{'p95 µs':>9}{'p99 µs':>9}")
+    for r in benchmark(sizes, args.queries, args.seed):
+        print(f"{r['size']:>8}{r['terms']:>9}{r['build_ms']:>10}{r['refresh_one_ms']:>12}"
+              f"{r['p50_us']:>9}{r['p95_us']:>9}{r['p99_us']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,122 @@
 // Audio handling for Hiragana flashcard application
 
+// Decoded clips from the audio bundle, keyed by their /audio URL
+const audioBundle = {
+    context: null,
+    clips: new Map(),
+    loading: null
+};
+
+// Fetch a bundle manifest and its payload, then decode every clip once
+function loadAudioBundle(manifestUrl) {
+    if (audioBundle.loading) {
+        return audioBundle.loading;
+    }
+    const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+    if (!AudioContextClass) {
+        return Promise.resolve();
+    }
+    audioBundle.loading = fetch(manifestUrl)
+        .then(response => response.json())
+        .then(manifest => fetch(manifest.url)
+            .then(response => response.arrayBuffer())
+            .then(payload => {
+                audioBundle.context = audioBundle.context || new AudioContextClass();
+                // Each clip is a self-contained run of MP3 frames within the payload
+                return Promise.all(manifest.clips.map(clip =>
+                    audioBundle.context
+                        .decodeAudioData(payload.slice(clip.offset, clip.offset + clip.length))
+                        .then(buffer => audioBundle.clips.set(clip.url, buffer))
+                        .catch(error => console.warn('Could not decode', clip.romaji, error))
+                ));
+            }))
+        .catch(error => {
+            console.warn('Audio bundle unavailable, using per-clip requests:', error);
+            audioBundle.loading = null;
+        });
+    return audioBundle.loading;
+}
+
+// Play a decoded clip from the bundle; returns false if it isn't loaded
+function playBundledAudio(url) {
+    const buffer = audioBundle.clips.get(url);
+    if (!buffer) {
+        return false;
+    }
+    const context = audioBundle.context;
+    if (context.state === 'suspended') {
+        context.resume();
+    }
+    const source = context.createBufferSource();
+    const gain = context.createGain();
+    source.buffer = buffer;
+    source.playbackRate.value = 0.9; // Slightly slower for learning
+    gain.gain.value = 0.8;
+    source.connect(gain).connect(context.destination);
+    source.start();
+    return true;
+}
+
+// Start loading the bundle named by the page, if any
+function initAudioBundle(root) {
+    const holder = (root || document).querySelector('[data-audio-bundle]');
+    if (holder) {
+        loadAudioBundle(holder.dataset.audioBundle);
+    }
+}
+
+// Follow a live classroom: each 'card' event replaces the shown card. The
+// browser reconnects by itself and sends Last-Event-ID, so a student who drops
+// out only receives the card they missed
+let classroomEvents = null;
+
+function initClassroom(root) {
+    const holder = (root || document).querySelector('[data-classroom-events]');
+    if (!holder || !window.EventSource) {
+        return;
+    }
+    if (classroomEvents) {
+        classroomEvents.close();
+    }
+    classroomEvents = new EventSource(holder.dataset.classroomEvents);
+    classroomEvents.addEventListener('card', event => {
+        const target = document.getElementById('classroom-card');
+        if (target) {
+            target.innerHTML = event.data;
+            htmx.process(target);
+        }
+    });
+    classroomEvents.addEventListener('closed', () => {
+        classroomEvents.close();
+        const target = document.getElementById('classroom-card');
+        if (target) {
+            target.innerHTML = '<div class="flashcard-romaji">Class ended</div>';
+        }
+    });
+}
+
+// Precache the app for offline use and pick up any data changes
+function registerServiceWorker() {
+    if (!('serviceWorker' in navigator)) {
+        return;
+    }
+    navigator.serviceWorker.register('/sw.js')
+        .then(registration => {
+            const worker = registration.active;
+            if (worker) {
+                worker.postMessage('sync');
+            }
+        })
+        .catch(error => console.warn('Service worker registration failed:', error));
+}
+
 // Simple audio playback function
 function playAudio(url) {
+    // Use the preloaded bundle when available: no network request per click
+    if (playBundledAudio(url)) {
+        return;
+    }
+
     // Create new audio element
     const audio = new Audio(url);
     
@@ -132,6 +247,9 @@ B          - Begin session
 // Initialize when page loads
 document.addEventListener('DOMContentLoaded', () => {
     showKeyboardHelp();
+    initAudioBundle();
+    initClassroom();
+    registerServiceWorker();
     
     // Add visual feedback to buttons on hover
     const buttons = document.querySelectorAll('.nav-btn');
@@ -160,6 +278,7 @@ document.body.addEventListener('htmx:afterSwap', (event) => {
     const contentArea = document.getElementById('content-area');
     if (contentArea) {
         contentArea.style.opacity = '1';
+        initAudioBundle(contentArea.parentNode);
         
         // Re-initialize button event listeners for new content
         const buttons = contentArea.querySelectorAll('.nav-btn');
@@ -0,0 +1,122 @@
+// Service worker for offline use of the Hiragana flashcard application
+
+const CACHE_NAME = 'hiragana-precache';
+const MANIFEST_URL = '/precache-manifest.json';
+// Revisions of the entries currently in the cache, stored alongside them
+const STATE_KEY = '/__precache-state';
+// Parallel downloads while precaching
+const CONCURRENCY = 6;
+
+// HTMX fragments and full pages share a URL, so fragments get their own key
+function cacheKey(url, htmx) {
+    if (!htmx) {
+        return url;
+    }
+    return url + (url.includes('?') ? '&' : '?') + '__htmx=1';
+}
+
+function entryKey(entry) {
+    return cacheKey(entry.url, entry.htmx);
+}
+
+// History restores send HX-Request too but get the full page, as on the server
+function isHtmx(request) {
+    return request.headers.has('HX-Request') && !request.headers.has('HX-History-Restore-Request');
+}
+
+async function readState(cache) {
+    const response = await cache.match(STATE_KEY);
+    return response ? response.json() : { version: null, revisions: {} };
+}
+
+// Download only the entries whose revision changed since the last sync
+async function syncPrecache() {
+    const response = await fetch(MANIFEST_URL, { cache: 'no-cache' });
+    if (!response.ok) {
+        return;
+    }
+    const manifest = await response.json();
+    const cache = await caches.open(CACHE_NAME);
+    const state = await readState(cache);
+    if (state.version === manifest.version) {
+        return;
+    }
+
+    const revisions = {};
+    const stale = [];
+    manifest.entries.forEach(entry => {
+        const key = entryKey(entry);
+        revisions[key] = entry.revision;
+        if (state.revisions[key] !== entry.revision) {
+            stale.push(entry);
+        }
+    });
+
+    const failed = new Set();
+    let next = 0;
+    async function worker() {
+        while (next < stale.length) {
+            const entry = stale[next++];
+            try {
+                const headers = entry.htmx ? { 'HX-Request': 'true' } : {};
+                const fresh = await fetch(entry.url, { headers, cache: 'no-cache' });
+                if (!fresh.ok) {
+                    throw new Error(`HTTP ${fresh.status}`);
+                }
+                await cache.put(entryKey(entry), fresh);
+            } catch (error) {
+                console.warn('Precache failed for', entry.url, error);
+                failed.add(entryKey(entry));
+            }
+        }
+    }
+    await Promise.all(Array.from({ length: CONCURRENCY }, worker));
+
+    // Entries that are no longer listed are removed from the cache
+    await Promise.all(Object.keys(state.revisions)
+        .filter(key => !(key in revisions))
+        .map(key => cache.delete(key)));
+
+    // Failed entries keep their old revision so the next sync retries them
+    failed.forEach(key => {
+        if (key in state.revisions) {
+            revisions[key] = state.revisions[key];
+        } else {
+            delete revisions[key];
+        }
+    });
+    const version = failed.size ? null : manifest.version;
+    await cache.put(STATE_KEY, new Response(JSON.stringify({ version, revisions }),
+        { headers: { 'Content-Type': 'application/json' } }));
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(syncPrecache().catch(error => console.warn('Precache failed:', error)));
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(self.clients.claim());
+});
+
+// Pages ask for a sync on load so data changes reach the cache
+self.addEventListener('message', event => {
+    if (event.data === 'sync') {
+        event.waitUntil(syncPrecache().catch(error => console.warn('Precache sync failed:', error)));
+    }
+});
+
+// Cache first; fall back to the network for anything not precached
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin || url.pathname === MANIFEST_URL) {
+        return;
+    }
+    const key = cacheKey(url.pathname + url.search, isHtmx(request));
+    event.respondWith(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.match(key, { ignoreVary: true }))
+            .then(cached => cached || fetch(request))
+    );
+});
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Per-learner progress statistics for the Hiragana flashcard application.
+Keeps materialized aggregates that each review event updates in O(1):
+accuracy per character and per category, answer and day streaks, mastery
+counts, and response-time percentiles from a compact log-bucketed sketch.
+Aggregates are snapshotted to SQLite like the scheduler's card states, and
+can be recomputed from the raw review log in one streaming pass.
+
+Usage:
+    python3 stats.py --rebuild          # recompute every learner from review_events
+
+Stop the app before rebuilding: it snapshots its in-memory aggregates over
+the rebuilt rows, and on shutdown too.
+"""
+
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+# SM-2 quality at or above which an answer counts as correct
+PASS_QUALITY = 3
+# Consecutive correct answers after which a card counts as mastered
+MASTERY_STREAK = 3
+
+# Relative error of the response-time sketch's quantiles
+SKETCH_ACCURACY = 0.02
+
+# Learners unused for this long are dropped after a snapshot (reloaded on
+# demand), and at most MAX_LEARNERS stay in memory
+IDLE_TTL = 30 * 60
+MAX_LEARNERS = 10000
+
+
+class LatencySketch:
+    """Log-bucketed histogram with bounded relative error (DDSketch style).
+
+    Adding a value is O(1); a quantile walks the occupied buckets, which stay
+    few because bucket width grows with the value.
+    """
+    __slots__ = ('counts', 'count', 'zeros')
+
+    _GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+    _LOG_GAMMA = math.log(_GAMMA)
+
+    def __init__(self, counts=None, zeros=0):
+        self.counts = counts or {}
+        self.zeros = zeros
+        self.count = zeros + sum(self.counts.values())
+
+    def add(self, value):
+        self.count += 1
+        if value <= 1:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._LOG_GAMMA)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile, or None when empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i]
+                return 2 * self._GAMMA ** index / (self._GAMMA + 1)
+        return 2 * self._GAMMA ** max(self.counts) / (self._GAMMA + 1)
+
+    def as_dict(self):
+        return {'zeros': self.zeros, 'counts': {str(k): v for k, v in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(k): v for k, v in data.get('counts', {}).items()}, data.get('zeros', 0))
+
+
+class LearnerStats:
+    """Running aggregates for one learner"""
+    __slots__ = ('reviews', 'correct', 'cards', 'categories', 'streak', 'best_streak',
+                 'day_streak', 'best_day_streak', 'last_day', 'mastered', 'response', 'last_review')
+
+    def __init__(self):
+        self.reviews = 0
+        self.correct = 0
+        self.cards = {}         # card id -> [reviews, correct, current correct streak]
+        self.categories = {}    # category -> [reviews, correct]
+        self.streak = 0
+        self.best_streak = 0
+        self.day_streak = 0
+        self.best_day_streak = 0
+        self.last_day = None
+        self.mastered = 0
+        self.response = LatencySketch()
+        self.last_review = None
+
+    def observe(self, card_id, category, quality, reviewed_at, response_ms=None):
+        """Fold one review into the aggregates"""
+        ok = quality >= PASS_QUALITY
+        self.reviews += 1
+        self.correct += ok
+        self.last_review = reviewed_at
+
+        card = self.cards.get(card_id)
+        if card is None:
+            card = self.cards[card_id] = [0, 0, 0]
+        card[0] += 1
+        card[1] += ok
+        was_mastered = card[2] >= MASTERY_STREAK
+        card[2] = card[2] + 1 if ok else 0
+        self.mastered += (card[2] >= MASTERY_STREAK) - was_mastered
+
+        if category is not None:
+            totals = self.categories.get(category)
+            if totals is None:
+                totals = self.categories[category] = [0, 0]
+            totals[0] += 1
+            totals[1] += ok
+
+        self.streak = self.streak + 1 if ok else 0
+        self.best_streak = max(self.best_streak, self.streak)
+
+        day = int(reviewed_at // DAY)
+        if day != self.last_day:
+            self.day_streak = self.day_streak + 1 if self.last_day == day - 1 else 1
+            self.best_day_streak = max(self.best_day_streak, self.day_streak)
+            self.last_day = day
+
+        if response_ms is not None:
+            self.response.add(response_ms)
+
+    @property
+    def accuracy(self):
+        return self.correct / self.reviews if self.reviews else None
+
+    @property
+    def learning(self):
+        """Cards reviewed at least once but not yet mastered"""
+        return len(self.cards) - self.mastered
+
+    def current_day_streak(self, now=None):
+        """Day streak, or 0 if the learner missed yesterday and today"""
+        today = int((time.time() if now is None else now) // DAY)
+        return self.day_streak if self.last_day is not None and today - self.last_day <= 1 else 0
+
+    def as_json(self):
+        return json.dumps({
+            'reviews': self.reviews, 'correct': self.correct,
+            'cards': {str(k): v for k, v in self.cards.items()},
+            'categories': self.categories,
+            'streak': self.streak, 'best_streak': self.best_streak,
+            'day_streak': self.day_streak, 'best_day_streak': self.best_day_streak,
+            'last_day': self.last_day, 'mastered': self.mastered,
+            'response': self.response.as_dict(), 'last_review': self.last_review,
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        stats = cls()
+        for name in ('reviews', 'correct', 'categories', 'streak', 'best_streak', 'day_streak',
+                     'best_day_streak', 'last_day', 'mastered', 'last_review'):
+            setattr(stats, name, data[name])
+        stats.cards = {int(k): v for k, v in data['cards'].items()}
+        stats.response = LatencySketch.from_dict(data['response'])
+        return stats
+
+
+class Statistics:
+    """Per-learner aggregates kept in memory and snapshotted to the database"""
+
+    TABLE = 'learner_stats'
+
+    def __init__(self, db, catalog):
+        self.db = db
+        self.catalog = catalog
+        self._learners = {}
+        self._used = {}         # learner id -> last access time
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._last_snapshot = time.time()
+        with db.writer() as conn:
+            create_table(conn)
+
+    def learner(self, learner_id):
+        """The learner's aggregates, loaded from the snapshot on first use"""
+        stats = self._learners.get(learner_id)
+        self._used[learner_id] = time.time()
+        if stats is None:
+            with self.db.reader('stats_load') as conn:
+                row = conn.execute(f'SELECT data FROM {self.TABLE} WHERE learner_id = ?',
+                                   (learner_id,)).fetchone()
+            with self._lock:
+                stats = self._learners.get(learner_id)
+                if stats is None:
+                    stats = self._learners[learner_id] = (LearnerStats.from_json(row[0]) if row
+                                                          else LearnerStats())
+        return stats
+
+    def observe(self, event):
+        """Apply one ReviewEvent"""
+        stats = self.learner(event.learner_id)
+        char = self.catalog.get(event.card_id)
+        with self._lock:
+            # Re-adopt the aggregates if an eviction raced with this lookup
+            stats = self._learners.setdefault(event.learner_id, stats)
+            stats.observe(event.card_id, char.category if char else None, event.grade,
+                          event.reviewed_at, event.response_ms)
+            self._dirty.add(event.learner_id)
+
+    def rebuild(self, learner_id):
+        """Recompute one learner from review_events in time order.
+
+        Used after importing history, whose reviews may predate ones already
+        observed; folding those in late would rewind the streaks.
+        """
+        stats = LearnerStats()
+        with self.db.reader('stats_rebuild') as conn:
+            rows = conn.execute('''
+                SELECT card_id, grade, reviewed_at, response_ms FROM review_events
+                WHERE learner_id = ? ORDER BY reviewed_at, id
+            ''', (learner_id,))
+            for card_id, grade, reviewed_at, response_ms in rows:
+                char = self.catalog.get(card_id)
+                stats.observe(card_id, char.category if char else None, grade, reviewed_at, response_ms)
+        with self._lock:
+            self._learners[learner_id] = stats
+            self._used[learner_id] = time.time()
+            self._dirty.add(learner_id)
+        return stats
+
+    def snapshot(self):
+        """Write every changed learner in one transaction; returns the row count"""
+        with self._lock:
+            rows = [(learner_id, self._learners[learner_id].as_json()) for learner_id in self._dirty]
+            self._dirty = set()
+            self._last_snapshot = time.time()
+        if rows:
+            with self.db.writer('stats_snapshot') as conn:
+                conn.executemany(f'INSERT OR REPLACE INTO {self.TABLE} (learner_id, data) VALUES (?, ?)', rows)
+        self.evict()
+        return len(rows)
+
+    def evict(self, now=None):
+        """Drop learners with nothing left to snapshot; returns how many were dropped.
+
+        Learners idle for IDLE_TTL go first, then the least recently used
+        beyond MAX_LEARNERS. A dropped learner is reloaded from the snapshot
+        on demand.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            clean = sorted((self._used.get(learner_id, 0.0), learner_id) for learner_id in self._learners
+                           if learner_id not in self._dirty)
+            excess = len(self._learners) - MAX_LEARNERS
+            dropped = 0
+            for used, learner_id in clean:
+                if now - used <= IDLE_TTL and dropped >= excess:
+                    break
+                del self._learners[learner_id]
+                self._used.pop(learner_id, None)
+                dropped += 1
+        return dropped
+
+    def __len__(self):
+        return len(self._learners)
+
+    def maybe_snapshot(self, interval=30):
+        """Snapshot if at least ``interval`` seconds passed since the last one"""
+        if time.time() - self._last_snapshot >= interval:
+            return self.snapshot()
+        return 0
+
+
+def create_table(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {Statistics.TABLE} (
+            learner_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def rebuild(conn, categories, batch_size=500):
+    """Recompute every learner's aggregates from review_events in one pass.
+
+    Events are streamed in learner order, so only one learner is held in
+    memory at a time. Returns (learners, events).
+    """
+    create_table(conn)
+    learners = events = 0
+    batch, current, stats = [], None, None
+    with conn:
+        conn.execute(f'DELETE FROM {Statistics.TABLE}')
+        cursor = conn.execute('''
+            SELECT learner_id, card_id, grade, reviewed_at, response_ms
+            FROM review_events ORDER BY learner_id, reviewed_at, id
+        ''')
+        for learner_id, card_id, grade, reviewed_at, response_ms in cursor:
+            if learner_id != current:
+                if stats is not None:
+                    batch.append((current, stats.as_json()))
+                    learners += 1
+                current, stats = learner_id, LearnerStats()
+                if len(batch) >= batch_size:
+                    conn.executemany(f'INSERT INTO {Statistics.TABLE} VALUES (?, ?)', batch)
+                    batch = []
+            stats.observe(card_id, categories.get(card_id), grade, reviewed_at, response_ms)
+            events += 1
+        if stats is not None:
+            batch.append((current, stats.as_json()))
+            learners += 1
+        if batch:
+            conn.executemany(f'INSERT INTO {Statistics.TABLE} VALUES (?, ?)', batch)
+    return learners, events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Learner statistics maintenance")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="recompute every learner's aggregates from the review log")
+    parser.add_argument('--db', default='data/hiragana.db', help="database file")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 0
+
+    import database
+    from catalog import Catalog
+    catalog = Catalog(args.db)
+    categories = {char.id: char.category for char in catalog}
+    conn = database.connect(args.db)
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'review_events'").fetchone()
+        if not exists:
+            print("❌ No review_events table; nothing to rebuild from")
+            return 1
+        start = time.perf_counter()
+        learners, events = rebuild(conn, categories)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    rate = events / elapsed if elapsed else 0.0
+    print(f"📊 Rebuilt statistics for {learners} learners from {events} events "
+          f"in {elapsed:.3f}s ({rate:,.0f} events/s)")
+    print("ℹ️  Start the app again to serve the rebuilt statistics")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
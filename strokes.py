@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Stroke-order diagrams for the Hiragana flashcard application.
+Imports per-character stroke paths from KanjiVG-style SVG files into
+data/strokes.json, then compiles them into minified SVG ``<symbol>`` sprite
+sheets that are registered as fingerprinted static assets. Pages reference a
+character with ``<use href="sheet#id">``, so a page of cards costs one request
+per sheet, and each sheet is cached as immutable.
+
+There is one sheet per script (hiragana, katakana, kanji); a script with more
+than SHEET_LIMIT characters is split by catalog category. A browser fetches a
+sheet only when something on the page uses it, so those load lazily.
+
+Usage:
+    python3 strokes.py import path/to/kanjivg/kanji   # every catalog character
+    python3 strokes.py sheets                          # sheet sizes
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+
+DATA_PATH = 'data/strokes.json'
+
+# KanjiVG's drawing grid
+VIEW_BOX = '0 0 109 109'
+
+# Characters per sheet before a script is split by category
+SHEET_LIMIT = 300
+
+# Decimal places kept in path coordinates; 0.1 units is a third of a pixel at 300px
+PRECISION = 1
+
+_TOKEN = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_PATH = re.compile(r'<path\b([^>]*)>')
+_ATTRIBUTE = re.compile(r'([\w:.-]+)\s*=\s*"([^"]*)"')
+_STROKE_ID = re.compile(r'-s(\d+)$')
+_VIEW_BOX = re.compile(r'\bviewBox\s*=\s*"([^"]*)"')
+
+
+def script(character):
+    """'hiragana', 'katakana' or 'kanji' from the first code point"""
+    cp = ord(character[0])
+    if 0x3040 <= cp <= 0x309F:
+        return 'hiragana'
+    if 0x30A0 <= cp <= 0x30FF:
+        return 'katakana'
+    return 'kanji'
+
+
+def symbol_id(character):
+    """Sprite symbol id for a character; stroke n is ``{id}-{n}``"""
+    return 'k' + ''.join(f'{ord(c):x}' for c in character)
+
+
+def slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-') or 'other'
+
+
+def _number(value, precision):
+    text = f'{round(float(value), precision):.{precision}f}'.rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        return '0'
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+
+def minify_path(d, precision=PRECISION):
+    """Path data with rounded numbers and only the separators the grammar needs"""
+    out, previous = [], None
+    for token in _TOKEN.findall(d):
+        if token[0].isalpha():
+            out.append(token)
+            previous = None
+            continue
+        number = _number(token, precision)
+        # A sign, or a second decimal point, already ends the previous number
+        if previous is not None and not (number[0] == '-' or (number[0] == '.' and '.' in previous)):
+            out.append(',')
+        out.append(number)
+        previous = number
+    return ''.join(out)
+
+
+def read_kanjivg(text):
+    """(viewBox, [path data in stroke order]) from a KanjiVG file"""
+    view_box = _VIEW_BOX.search(text)
+    strokes = []
+    for attributes in _PATH.findall(text):
+        attrs = dict(_ATTRIBUTE.findall(attributes))
+        number = _STROKE_ID.search(attrs.get('id', ''))
+        if number and attrs.get('d'):
+            strokes.append((int(number.group(1)), attrs['d']))
+    return (view_box.group(1) if view_box else VIEW_BOX,
+            [d for _, d in sorted(strokes)])
+
+
+def load(path=DATA_PATH):
+    """{character: [path data]} from the strokes file, or {} when there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['characters']
+
+
+def sheet(characters, paths):
+    """Minified sprite sheet with one symbol per character"""
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg">']
+    for character in characters:
+        sid = symbol_id(character)
+        parts.append(f'<symbol id="{sid}" viewBox="{VIEW_BOX}">')
+        # pathLength lets the page animate each stroke with unit dash lengths
+        parts.extend(f'<path id="{sid}-{n}" pathLength="1" d="{d}"/>'
+                     for n, d in enumerate(paths[character], 1))
+        parts.append('</symbol>')
+    parts.append('</svg>')
+    return ''.join(parts).encode('utf-8')
+
+
+class StrokeSymbol:
+    """Where a character's diagram lives: sheet URL, symbol id and stroke count"""
+    __slots__ = ('url', 'id', 'strokes')
+
+    def __init__(self, url, id, strokes):
+        self.url = url
+        self.id = id
+        self.strokes = strokes
+
+    @property
+    def href(self):
+        return f'{self.url}#{self.id}'
+
+    def stroke_href(self, n):
+        """Reference to stroke ``n`` (1-based) alone"""
+        return f'{self.url}#{self.id}-{n}'
+
+
+class StrokeSheets:
+    """Sprite sheets for the catalog, rebuilt when the catalog version changes"""
+
+    def __init__(self, catalog, assets, path=DATA_PATH):
+        self.catalog = catalog
+        self.assets = assets
+        self.paths = load(path)
+        self._lock = threading.Lock()
+        self._version = None
+        self._symbols = {}
+        self.sheets = {}        # asset path -> characters in the sheet
+
+    def refresh(self):
+        """Rebuild the sheets if the catalog changed"""
+        if self._version != self.catalog.version:
+            with self._lock:
+                if self._version != self.catalog.version:
+                    self.build()
+
+    def build(self):
+        """Group the catalog's characters into sheets and register each as an asset"""
+        version = self.catalog.version
+        by_script = {}
+        for char in self.catalog:
+            if self.paths.get(char.character):
+                by_script.setdefault(script(char.character), []).append(char)
+        groups = {}
+        for name, chars in by_script.items():
+            if len(chars) <= SHEET_LIMIT:
+                groups[name] = chars
+                continue
+            for char in chars:
+                groups.setdefault(f'{name}-{slug(char.category)}', []).append(char)
+        symbols, sheets = {}, {}
+        for name, chars in groups.items():
+            # Previously registered URLs stay valid for pages cached before a rebuild
+            asset = self.assets.add(f'strokes/{name}.svg',
+                                    sheet([char.character for char in chars], self.paths))
+            url = self.assets.url(asset.path)
+            for char in chars:
+                symbols[char.id] = StrokeSymbol(url, symbol_id(char.character),
+                                                len(self.paths[char.character]))
+            sheets[asset.path] = len(chars)
+        self._symbols, self.sheets = symbols, sheets
+        self._version = version
+
+    def get(self, char_id):
+        """StrokeSymbol for a character, or None without stroke data"""
+        self.refresh()
+        return self._symbols.get(char_id)
+
+
+def import_directory(source, catalog, data_path=DATA_PATH):
+    """Add every catalog character found in a KanjiVG directory to the strokes file.
+
+    Files are named by code point (``03042.svg``); characters already in the
+    file are kept, so packs for new scripts can be imported one at a time.
+    Returns (imported, missing characters).
+    """
+    paths = load(data_path)
+    imported, missing = 0, []
+    for char in catalog:
+        if len(char.character) != 1:
+            missing.append(char.character)
+            continue
+        file_path = os.path.join(source, f'{ord(char.character):05x}.svg')
+        if not os.path.exists(file_path):
+            missing.append(char.character)
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            view_box, strokes = read_kanjivg(f.read())
+        if view_box != VIEW_BOX or not strokes:
+            missing.append(char.character)
+            continue
+        paths[char.character] = [minify_path(d) for d in strokes]
+        imported += 1
+    os.makedirs(os.path.dirname(data_path) or '.', exist_ok=True)
+    tmp = data_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'source': 'KanjiVG (CC BY-SA 3.0), https://kanjivg.tagaini.net',
+                   'viewBox': VIEW_BOX,
+                   'characters': dict(sorted(paths.items()))},
+                  f, ensure_ascii=False, indent=0)
+        f.write('\n')
+    os.replace(tmp, data_path)
+    return imported, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stroke-order data and sprite sheets")
+    parser.add_argument('--db', default='data/hiragana.db', help="database file")
+    parser.add_argument('--data', default=DATA_PATH, help="stroke data file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    load_cmd = commands.add_parser('import', help="import strokes from a KanjiVG kanji/ directory")
+    load_cmd.add_argument('source', help="directory of <codepoint>.svg files")
+    commands.add_parser('sheets', help="build the sprite sheets and report their sizes")
+    args = parser.parse_args(argv)
+
+    from catalog import Catalog
+    catalog = Catalog(args.db)
+    if args.command == 'import':
+        if not os.path.isdir(args.source):
+            print(f"❌ {args.source} is not a directory")
+            return 1
+        imported, missing = import_directory(args.source, catalog, args.data)
+        print(f"✏️  Imported strokes for {imported} of {len(catalog)} characters into {args.data}")
+        if missing:
+            print(f"⚠️  No usable stroke data for: {' '.join(missing)}")
+        print("ℹ️  Restart the app to serve the new sheets")
+        return 0
+
+    from assets import AssetTable
+    table = AssetTable('static')
+    sheets = StrokeSheets(catalog, table, args.data)
+    sheets.refresh()
+    if not sheets.sheets:
+        print(f"❌ No stroke data for the catalog in {args.data}; run 'strokes.py import' first")
+        return 1
+    for path, count in sheets.sheets.items():
+        asset, _ = table.lookup(path)
+        sizes = ', '.join(f"{enc} {len(data):,}" for enc, data in asset.variants.items())
+        print(f"🖌️  {path} → {asset.hashed_path}: {count} characters, {len(asset.body):,} bytes ({sizes})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,77 +1,31 @@
 #!/usr/bin/env python3
 """
-<<<<<<< HEAD
-Quick test script to verify all audio files are accessible
-=======
 Audio file test script for Hiragana flashcard application.
-Tests existence and playability of audio files for all hiragana characters.
->>>>>>> origin/flashcards-for-hiragana
+Verifies every clip in-process by walking its MPEG frame headers (sync,
+bitrate, sample rate, duration and truncation) on a process pool, compares
+the clips with the character catalog, and writes a JSON report. No audio
+player or sound device is needed, so it runs on headless CI.
 """
 
+import argparse
+import json
 import os
-import sqlite3
-<<<<<<< HEAD
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
 
-def test_audio_files():
-    """Test that all expected audio files exist"""
-    
-    # Connect to database
-    conn = sqlite3.connect('data/hiragana.db')
-    cursor = conn.cursor()
-    
-    # Get all characters and their romaji
-    cursor.execute("SELECT romaji FROM items ORDER BY order_index")
-    characters = cursor.fetchall()
-    conn.close()
-    
-    print("🎵 Testing Hiragana Audio Files")
-    print("=" * 50)
-    
-    missing_files = []
-    found_files = []
-    
-    for (romaji,) in characters:
-        audio_file = f"static/audio/{romaji}.mp3"
-        if os.path.exists(audio_file):
-            size = os.path.getsize(audio_file)
-            found_files.append(f"✅ {romaji}.mp3 ({size:,} bytes)")
-        else:
-            missing_files.append(f"❌ {romaji}.mp3 (missing)")
-    
-    # Print results
-    print(f"📊 Results: {len(found_files)} found, {len(missing_files)} missing")
-    print()
-    
-    if found_files:
-        print("Found files:")
-        for file_info in found_files[:10]:  # Show first 10
-            print(f"  {file_info}")
-        if len(found_files) > 10:
-            print(f"  ... and {len(found_files) - 10} more")
-        print()
-    
-    if missing_files:
-        print("Missing files:")
-        for file_info in missing_files:
-            print(f"  {file_info}")
-        print()
-    
-    print(f"🎯 Total audio files available: {len(found_files)}/46")
-    
-    if len(found_files) == 46:
-        print("🎉 All audio files are ready!")
-        return True
-    else:
-        print(f"⚠️  {len(missing_files)} audio files are missing")
-        return False
+import database
+from mp3 import scan
 
-if __name__ == "__main__":
-    test_audio_files()
-=======
-import subprocess
-import sys
-from pathlib import Path
-from typing import List, Dict, Tuple
+AUDIO_DIR = 'static/audio'
+DEFAULT_REPORT = 'build/audio_report.json'
+
+# Plausible length of one spoken syllable, in seconds
+MIN_DURATION = 0.1
+MAX_DURATION = 10.0
+SAMPLE_RATES = {8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000}
 
 # Color codes for terminal output
 class Colors:
@@ -85,238 +39,189 @@ class Colors:
     BOLD = '\033[1m'
     END = '\033[0m'
 
-def get_hiragana_characters() -> List[Dict]:
-    """Get all hiragana characters from database"""
-    if not os.path.exists('data/hiragana.db'):
-        print(f"{Colors.RED}❌ Database not found: data/hiragana.db{Colors.END}")
+def get_hiragana_characters(db_path: str = database.DB_PATH) -> List[Dict]:
+    """Get all characters from the database the app reads"""
+    if not os.path.exists(db_path):
+        print(f"{Colors.RED}❌ Database not found: {db_path}{Colors.END}")
         return []
-    
+
     try:
-        conn = sqlite3.connect('data/hiragana.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, character, romaji, pronunciation, category, order_index 
-            FROM hiragana_characters 
+        conn = database.connect(db_path, readonly=True)
+        rows = conn.execute("""
+            SELECT id, character, romaji, pronunciation, category, order_index
+            FROM items
             ORDER BY order_index
-        """)
-        
-        characters = []
-        for row in cursor.fetchall():
-            characters.append({
-                'id': row[0],
-                'character': row[1],
-                'romaji': row[2],
-                'pronunciation': row[3],
-                'category': row[4],
-                'order_index': row[5]
-            })
-        
+        """).fetchall()
         conn.close()
-        return characters
-        
     except Exception as e:
         print(f"{Colors.RED}❌ Database error: {e}{Colors.END}")
         return []
 
-def check_audio_file_exists(romaji: str) -> bool:
-    """Check if audio file exists for given romaji"""
-    audio_path = Path(f"static/audio/{romaji}.mp3")
-    return audio_path.exists()
+    keys = ('id', 'character', 'romaji', 'pronunciation', 'category', 'order_index')
+    return [dict(zip(keys, row)) for row in rows]
 
-def test_audio_playback(romaji: str) -> Tuple[bool, str]:
-    """Test if audio file can be played (requires system audio tools)"""
-    audio_path = Path(f"static/audio/{romaji}.mp3")
-    
-    if not audio_path.exists():
-        return False, "File not found"
-    
+def verify_file(path: str) -> Dict:
+    """Parse one clip's frames and list anything wrong with it"""
+    result = {'path': path, 'size': 0, 'errors': [], 'warnings': []}
     try:
-        # Try different audio players based on OS
-        if sys.platform == "darwin":  # macOS
-            result = subprocess.run(
-                ["afplay", str(audio_path)], 
-                capture_output=True, 
-                timeout=5,
-                check=True
-            )
-            return True, "Playback successful (afplay)"
-            
-        elif sys.platform.startswith("linux"):  # Linux
-            # Try multiple players
-            for player in ["aplay", "paplay", "mpg123", "ffplay"]:
-                try:
-                    result = subprocess.run(
-                        [player, str(audio_path)], 
-                        capture_output=True, 
-                        timeout=5,
-                        check=True
-                    )
-                    return True, f"Playback successful ({player})"
-                except (subprocess.CalledProcessError, FileNotFoundError):
-                    continue
-            return False, "No compatible audio player found"
-            
-        elif sys.platform == "win32":  # Windows
-            # Use Windows Media Player command line
-            try:
-                result = subprocess.run(
-                    ["powershell", "-c", f"(New-Object Media.SoundPlayer '{audio_path}').PlaySync()"],
-                    capture_output=True,
-                    timeout=5,
-                    check=True
-                )
-                return True, "Playback successful (Windows Media)"
-            except subprocess.CalledProcessError:
-                return False, "Windows Media playback failed"
-        else:
-            return False, f"Unsupported OS: {sys.platform}"
-            
-    except subprocess.TimeoutExpired:
-        return False, "Playback timeout"
-    except subprocess.CalledProcessError as e:
-        return False, f"Playback error: {e.returncode}"
-    except FileNotFoundError:
-        return False, "Audio player not found"
-    except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        result['errors'].append(f"unreadable: {e}")
+        return result
+
+    info = scan(data)
+    result['size'] = len(data)
+    result.update({
+        'frames': info.frames,
+        'duration': round(info.duration, 4),
+        'bitrate': info.bitrate,
+        'sample_rate': info.sample_rate,
+        'channels': info.channels,
+        'version': info.version,
+        'layer': info.layer,
+        'sync_errors': info.sync_errors,
+        'truncated': info.truncated,
+    })
+
+    if info.frames == 0:
+        result['errors'].append("no MPEG audio frames")
+        return result
+    if info.truncated:
+        result['errors'].append("last frame is truncated")
+    if info.sample_rate not in SAMPLE_RATES:
+        result['errors'].append(f"unexpected sample rate {info.sample_rate}")
+    if info.duration < MIN_DURATION:
+        result['errors'].append(f"too short ({info.duration:.3f}s)")
+    elif info.duration > MAX_DURATION:
+        result['errors'].append(f"too long ({info.duration:.1f}s)")
+    if info.sync_errors:
+        result['warnings'].append(f"{info.sync_errors} resync attempts after lost frame sync")
+    return result
+
+def verify_directory(audio_dir: str, jobs: Optional[int] = None) -> Dict[str, Dict]:
+    """Verify every .mp3 in a directory in parallel, keyed by romaji"""
+    names = sorted(name for name in os.listdir(audio_dir) if name.endswith('.mp3'))
+    paths = [os.path.join(audio_dir, name) for name in names]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(verify_file, paths, chunksize=max(1, len(paths) // 64)))
+    return {name[:-4]: result for name, result in zip(names, results)}
 
-def create_missing_directories():
-    """Create static/audio directory if it doesn't exist"""
-    audio_dir = Path("static/audio")
-    audio_dir.mkdir(parents=True, exist_ok=True)
-    print(f"{Colors.BLUE}📁 Created/verified directory: {audio_dir}{Colors.END}")
+def flag_outliers(results: Dict[str, Dict]):
+    """Warn about clips whose encoding differs from the rest of the set"""
+    decoded = [r for r in results.values() if r.get('frames')]
+    for field, label in (('sample_rate', 'sample rate'), ('channels', 'channel count')):
+        common = Counter(r[field] for r in decoded).most_common(1)
+        if not common:
+            continue
+        usual = common[0][0]
+        for r in decoded:
+            if r[field] != usual:
+                r['warnings'].append(f"{label} {r[field]} differs from the usual {usual}")
+    bitrates = Counter(r['bitrate'] // 1000 for r in decoded)
+    return dict(sorted(bitrates.items()))
 
-def print_header():
+def build_report(characters: List[Dict], results: Dict[str, Dict], elapsed: float) -> Dict:
+    """Combine per-file results with the catalog comparison"""
+    by_romaji = {char['romaji']: char for char in characters}
+    missing = [{'id': c['id'], 'character': c['character'], 'romaji': c['romaji']}
+               for c in characters if c['romaji'] not in results]
+    orphans = sorted(romaji for romaji in results if romaji not in by_romaji)
+    bitrates = flag_outliers(results)
+    clips = []
+    for romaji, result in results.items():
+        char = by_romaji.get(romaji)
+        clips.append({'romaji': romaji, 'id': char['id'] if char else None,
+                      'character': char['character'] if char else None, **result})
+    failed = [clip for clip in clips if clip['errors']]
+    return {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'elapsed_s': round(elapsed, 3),
+        'summary': {
+            'characters': len(characters),
+            'files': len(results),
+            'ok': len(results) - len(failed),
+            'failed': len(failed),
+            'warnings': sum(1 for clip in clips if clip['warnings']),
+            'missing': len(missing),
+            'orphans': len(orphans),
+            'bitrates_kbps': {str(k): v for k, v in bitrates.items()},
+            'total_duration_s': round(sum(clip.get('duration', 0) for clip in clips), 2),
+        },
+        'missing': missing,
+        'orphans': orphans,
+        'clips': clips,
+    }
+
+def print_header(audio_dir: str):
     """Print test header"""
     print(f"\n{Colors.BOLD}{Colors.CYAN}{'='*80}")
     print(f"🎵 HIRAGANA AUDIO FILE TEST SUITE")
     print(f"{'='*80}{Colors.END}")
-    print(f"{Colors.WHITE}Testing audio file existence and playability for all hiragana characters{Colors.END}\n")
-
-def print_category_header(category: str):
-    """Print category header"""
-    category_name = category.replace('-', ' ').title()
-    print(f"\n{Colors.BOLD}{Colors.PURPLE}📚 {category_name}{Colors.END}")
-    print(f"{Colors.PURPLE}{'-' * (len(category_name) + 4)}{Colors.END}")
+    print(f"{Colors.WHITE}Verifying MPEG frames of every clip in {audio_dir} against the catalog{Colors.END}\n")
 
-def print_character_result(char_data: Dict, exists: bool, playback_result: Tuple[bool, str]):
-    """Print result for a single character"""
-    char = char_data['character']
-    romaji = char_data['romaji']
-    
-    # Existence check
-    exist_symbol = f"{Colors.GREEN}✅" if exists else f"{Colors.RED}❌"
-    
-    # Playback check
-    playback_success, playback_msg = playback_result
-    if not exists:
-        playback_symbol = f"{Colors.YELLOW}⏸️"
-        playback_status = "Skipped (file missing)"
-    elif playback_success:
-        playback_symbol = f"{Colors.GREEN}🔊"
-        playback_status = playback_msg
-    else:
-        playback_symbol = f"{Colors.RED}🔇"
-        playback_status = playback_msg
-    
-    print(f"  {char} ({romaji:>3}) │ File: {exist_symbol} │ Audio: {playback_symbol} │ {playback_status}{Colors.END}")
+def print_problems(report: Dict):
+    """Print every failing clip, warning, missing file and orphan"""
+    for clip in report['clips']:
+        label = f"{clip['character'] or '?'} ({clip['romaji']:>3})"
+        for error in clip['errors']:
+            print(f"  {Colors.RED}❌ {label} │ {error}{Colors.END}")
+        for warning in clip['warnings']:
+            print(f"  {Colors.YELLOW}⚠️  {label} │ {warning}{Colors.END}")
+    for char in report['missing']:
+        print(f"  {Colors.YELLOW}📄 {AUDIO_DIR}/{char['romaji']}.mp3 missing (for {char['character']}){Colors.END}")
+    for romaji in report['orphans']:
+        print(f"  {Colors.BLUE}🗂️  {romaji}.mp3 has no catalog row{Colors.END}")
 
-def print_summary(results: List[Dict]):
+def print_summary(report: Dict):
     """Print test summary"""
-    total = len(results)
-    files_exist = sum(1 for r in results if r['file_exists'])
-    playback_success = sum(1 for r in results if r['playback_success'])
-    
+    s = report['summary']
     print(f"\n{Colors.BOLD}{Colors.CYAN}📊 TEST SUMMARY{Colors.END}")
     print(f"{Colors.CYAN}{'='*50}{Colors.END}")
-    print(f"{Colors.WHITE}Total characters tested: {Colors.BOLD}{total}{Colors.END}")
-    print(f"{Colors.WHITE}Audio files found:      {Colors.GREEN if files_exist == total else Colors.YELLOW}{files_exist}/{total} ({files_exist/total*100:.1f}%){Colors.END}")
-    print(f"{Colors.WHITE}Playback successful:    {Colors.GREEN if playback_success == total else Colors.YELLOW}{playback_success}/{total} ({playback_success/total*100:.1f}%){Colors.END}")
-    
-    if files_exist < total:
-        missing = total - files_exist
-        print(f"\n{Colors.YELLOW}⚠️  {missing} audio file(s) missing{Colors.END}")
-    
-    if playback_success < files_exist:
-        failed = files_exist - playback_success
-        print(f"{Colors.RED}🚨 {failed} audio file(s) failed playback test{Colors.END}")
-    
-    if files_exist == total and playback_success == total:
-        print(f"\n{Colors.GREEN}{Colors.BOLD}🎉 ALL TESTS PASSED! All audio files exist and can be played.{Colors.END}")
+    print(f"{Colors.WHITE}Catalog characters:     {Colors.BOLD}{s['characters']}{Colors.END}")
+    print(f"{Colors.WHITE}Audio files verified:   {Colors.GREEN if not s['failed'] else Colors.YELLOW}{s['ok']}/{s['files']} ok{Colors.END}")
+    print(f"{Colors.WHITE}Missing / orphaned:     {s['missing']} / {s['orphans']}{Colors.END}")
+    bitrates = ', '.join(f"{k} kbps×{v}" for k, v in s['bitrates_kbps'].items())
+    print(f"{Colors.WHITE}Bitrates:               {bitrates or 'n/a'}{Colors.END}")
+    print(f"{Colors.WHITE}Total audio:            {s['total_duration_s']}s in {report['elapsed_s']}s{Colors.END}")
+    if not s['failed'] and not s['missing']:
+        print(f"\n{Colors.GREEN}{Colors.BOLD}🎉 ALL TESTS PASSED! Every character has a valid clip.{Colors.END}")
 
-def generate_missing_files_list(results: List[Dict]):
-    """Generate list of missing audio files"""
-    missing = [r for r in results if not r['file_exists']]
-    if missing:
-        print(f"\n{Colors.BOLD}{Colors.YELLOW}📋 MISSING AUDIO FILES{Colors.END}")
-        print(f"{Colors.YELLOW}{'='*30}{Colors.END}")
-        for result in missing:
-            romaji = result['character_data']['romaji']
-            char = result['character_data']['character']
-            print(f"{Colors.YELLOW}  📄 static/audio/{romaji}.mp3 (for {char}){Colors.END}")
-
-def main():
+def main(argv=None):
     """Main test function"""
-    print_header()
-    
-    # Create directories if needed
-    create_missing_directories()
-    
-    # Get all characters from database
-    characters = get_hiragana_characters()
+    parser = argparse.ArgumentParser(description="Verify pronunciation clips without playing them")
+    parser.add_argument('--audio-dir', default=AUDIO_DIR, help="directory of <romaji>.mp3 clips")
+    parser.add_argument('--db', default=database.DB_PATH, help="database file")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('-o', '--output', default=DEFAULT_REPORT, help="JSON report path")
+    parser.add_argument('--strict', action='store_true', help="treat warnings as failures")
+    args = parser.parse_args(argv)
+
+    print_header(args.audio_dir)
+    characters = get_hiragana_characters(args.db)
     if not characters:
         print(f"{Colors.RED}❌ No characters found in database{Colors.END}")
-        sys.exit(1)
-    
-    print(f"{Colors.WHITE}Found {len(characters)} hiragana characters in database{Colors.END}")
-    
-    # Test each character's audio file
-    results = []
-    current_category = None
-    
-    for char_data in characters:
-        # Print category header when category changes
-        if char_data['category'] != current_category:
-            current_category = char_data['category']
-            print_category_header(current_category)
-        
-        # Check file existence
-        exists = check_audio_file_exists(char_data['romaji'])
-        
-        # Test playback (only if file exists)
-        if exists:
-            playback_result = test_audio_playback(char_data['romaji'])
-        else:
-            playback_result = (False, "File not found")
-        
-        # Store result
-        result = {
-            'character_data': char_data,
-            'file_exists': exists,
-            'playback_success': playback_result[0],
-            'playback_message': playback_result[1]
-        }
-        results.append(result)
-        
-        # Print individual result
-        print_character_result(char_data, exists, playback_result)
-    
-    # Print summary
-    print_summary(results)
-    generate_missing_files_list(results)
-    
-    print(f"\n{Colors.CYAN}Test completed!{Colors.END}")
-    
-    # Return appropriate exit code
-    all_exist = all(r['file_exists'] for r in results)
-    all_playable = all(r['playback_success'] for r in results if r['file_exists'])
-    
-    if all_exist and all_playable:
-        sys.exit(0)  # Success
-    else:
-        sys.exit(1)  # Some tests failed
+        return 1
+    if not os.path.isdir(args.audio_dir):
+        print(f"{Colors.RED}❌ Audio directory not found: {args.audio_dir}{Colors.END}")
+        return 1
+
+    start = time.perf_counter()
+    results = verify_directory(args.audio_dir, args.jobs)
+    report = build_report(characters, results, time.perf_counter() - start)
+
+    print_problems(report)
+    print_summary(report)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n{Colors.CYAN}💾 Report written to {args.output}{Colors.END}")
+
+    s = report['summary']
+    if s['failed'] or s['missing'] or (args.strict and s['warnings']):
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
->>>>>>> origin/flashcards-for-hiragana
+    sys.exit(main())
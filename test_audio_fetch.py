@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Audio fetcher test script for the Hiragana flashcard application.
+Serves clips from a local stand-in HTTP server (with Range support and an
+optional dropped connection) and checks that audio_fetch.py downloads them
+whole, resumes partial files and re-downloads after a checksum mismatch.
+Runs with pytest or on its own; no network access is needed.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from audio_fetch import Source, TokenBucket, fetch
+
+# Larger than one read chunk, so downloads take several reads
+CLIP = bytes(range(256)) * 800
+CLIP_SHA256 = hashlib.sha256(CLIP).hexdigest()
+
+
+class StandIn(ThreadingHTTPServer):
+    """Serves ``files`` by path and records each request's Range header"""
+    daemon_threads = True
+
+    def __init__(self, files):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.files = files
+        self.ranges = []
+        # Bytes to send before hanging up on the next response, if any
+        self.cut_after = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        range_header = self.headers.get('Range')
+        self.server.ranges.append(range_header)
+        start = int(range_header[len('bytes='):].split('-')[0]) if range_header else 0
+        if start >= len(body):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(body)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        cut, self.server.cut_after = self.server.cut_after, None
+        self.wfile.write(body[start:] if cut is None else body[start:start + cut])
+        if cut is not None:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Fixture:
+    """A running stand-in server and an empty destination directory"""
+
+    def __enter__(self):
+        self.server = StandIn({'/audio/ka.mp3': CLIP})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._tmp = tempfile.TemporaryDirectory(prefix='hiragana-fetch-')
+        self.dest = self._tmp.name
+        self.target = os.path.join(self.dest, 'ka.mp3')
+        self.source = Source('ka.mp3', 'https://audio.example/audio/ka.mp3', 'か', len(CLIP), CLIP_SHA256)
+        return self
+
+    def fetch(self, **kwargs):
+        return fetch(self.source, self.dest, TokenBucket(100, 10), self.server.url, **kwargs)
+
+    def read(self):
+        with open(self.target, 'rb') as f:
+            return f.read()
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self._tmp.cleanup()
+
+
+def test_full_download():
+    with Fixture() as fx:
+        result = fx.fetch()
+        assert result.status == 'downloaded', result.error
+        assert (result.bytes, result.resumed) == (len(CLIP), False)
+        assert fx.read() == CLIP
+        assert fx.server.ranges == [None]
+        assert not os.path.exists(fx.target + '.part')
+        # A clip that already matches is not requested again
+        assert fx.fetch().status == 'skipped'
+        assert len(fx.server.ranges) == 1
+
+
+def test_resume_partial_file():
+    with Fixture() as fx:
+        half = len(CLIP) // 2
+        with open(fx.target + '.part', 'wb') as f:
+            f.write(CLIP[:half])
+        result = fx.fetch()
+        assert result.status == 'downloaded', result.error
+        assert (result.bytes, result.resumed) == (len(CLIP) - half, True)
+        assert fx.server.ranges == [f'bytes={half}-']
+        assert fx.read() == CLIP
+
+
+def test_resume_after_dropped_connection():
+    with Fixture() as fx:
+        fx.server.cut_after = 70000
+        result = fx.fetch()
+        assert result.status == 'downloaded', result.error
+        assert result.resumed
+        assert fx.server.ranges == [None, 'bytes=70000-']
+        assert fx.read() == CLIP
+
+
+def test_redownload_after_checksum_mismatch():
+    with Fixture() as fx:
+        # A local clip with the right size but the wrong contents is replaced
+        with open(fx.target, 'wb') as f:
+            f.write(bytes(len(CLIP)))
+        result = fx.fetch()
+        assert result.status == 'downloaded', result.error
+        assert fx.read() == CLIP
+
+        # A corrupt partial fails the check once resumed, and is fetched again whole
+        os.remove(fx.target)
+        fx.server.ranges.clear()
+        half = len(CLIP) // 2
+        with open(fx.target + '.part', 'wb') as f:
+            f.write(bytes(half))
+        result = fx.fetch()
+        assert result.status == 'downloaded', result.error
+        assert fx.server.ranges == [f'bytes={half}-', None]
+        assert fx.read() == CLIP
+
+
+def test_checksum_mismatch_gives_up():
+    with Fixture() as fx:
+        fx.source.sha256 = hashlib.sha256(b'something else').hexdigest()
+        result = fx.fetch(retries=2)
+        assert (result.status, result.error) == ('failed', 'checksum mismatch')
+        assert not os.path.exists(fx.target)
+        assert not os.path.exists(fx.target + '.part')
+
+
+def main():
+    """Run every check and report each one"""
+    checks = [(name, check) for name, check in globals().items() if name.startswith('test_')]
+    failed = 0
+    for name, check in checks:
+        try:
+            check()
+            print(f"  ✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ❌ {name}: {e or 'assertion failed'}")
+    print(f"{len(checks) - failed}/{len(checks)} audio fetch checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Audio index test script for the Hiragana flashcard application.
+Checks the Range and Accept parsing behind /audio/{char_id} — suffix,
+open-ended, clamped, reversed, malformed and unsatisfiable ranges — and the
+206/416/304 responses built from them, for clips held in memory and clips
+read from disk. Runs with pytest or on its own; no server is needed.
+"""
+
+import os
+import sys
+import tempfile
+
+from starlette.requests import Request
+
+from audio_index import INLINE_LIMIT, AudioIndex, accepts_opus, parse_range
+from catalog import Character
+
+SIZE = 1000
+
+
+def unsatisfiable(header, size=SIZE):
+    try:
+        parse_range(header, size)
+    except ValueError:
+        return True
+    return False
+
+
+def test_parse_range():
+    assert parse_range('bytes=0-99', SIZE) == (0, 99)
+    assert parse_range('bytes=500-', SIZE) == (500, 999)
+    assert parse_range('bytes=-100', SIZE) == (900, 999)
+    assert parse_range('bytes= 10 - 20 ', SIZE) == (10, 20)
+    # Ranges past the end are clamped; suffixes longer than the file are the whole file
+    assert parse_range('bytes=900-5000', SIZE) == (900, 999)
+    assert parse_range('bytes=-5000', SIZE) == (0, 999)
+    assert parse_range('bytes=999-999', SIZE) == (999, 999)
+
+
+def test_parse_range_ignored():
+    for header in (None, '', 'bytes', 'items=0-10', 'bytes=', 'bytes=-', 'bytes=abc',
+                   'bytes=0-10,20-30', 'bytes=1-2-3', 'bytes=a-10', 'bytes=0-x',
+                   'bytes=+1-2', 'bytes=²-3', 'bytes=0--1', 'bytes=20-10'):
+        assert parse_range(header, SIZE) is None, header
+
+
+def test_parse_range_unsatisfiable():
+    assert unsatisfiable('bytes=1000-')
+    assert unsatisfiable('bytes=5000-6000')
+    assert unsatisfiable('bytes=-0')
+    assert unsatisfiable('bytes=0-', 0)
+    assert unsatisfiable('bytes=-10', 0)
+
+
+def test_accepts_opus():
+    assert accepts_opus('audio/ogg')
+    assert accepts_opus('audio/webm, AUDIO/OGG;q=0.5')
+    assert accepts_opus('application/ogg; q=1')
+    assert not accepts_opus(None)
+    assert not accepts_opus('*/*')
+    assert not accepts_opus('audio/*')
+    assert not accepts_opus('audio/ogg;q=0')
+    assert not accepts_opus('audio/ogg;q=bogus')
+
+
+class Catalog:
+    """The two catalog calls AudioIndex makes"""
+    version = 1
+
+    def __init__(self, chars):
+        self.chars = chars
+
+    def __iter__(self):
+        return iter(self.chars)
+
+
+def request(**headers):
+    return Request({'type': 'http', 'method': 'GET', 'path': '/audio/1', 'query_string': b'',
+                    'headers': [(name.replace('_', '-').encode(), value.encode())
+                                for name, value in headers.items()]})
+
+
+def check_responses(size):
+    with tempfile.TemporaryDirectory(prefix='hiragana-audio-') as audio_dir:
+        data = bytes(range(256)) * (size // 256 + 1)
+        data = data[:size]
+        with open(os.path.join(audio_dir, 'a.mp3'), 'wb') as f:
+            f.write(data)
+        index = AudioIndex(Catalog([Character(1, 'あ', 'a', 'ah', 'vowels', 0)]), audio_dir)
+        clip = index.get(1)
+        assert (clip.body is not None) == (size <= INLINE_LIMIT)
+
+        response = index.response(request(range='bytes=-10'), clip)
+        assert response.status_code == 206
+        assert response.body == data[-10:]
+        assert response.headers['content-range'] == f'bytes {size - 10}-{size - 1}/{size}'
+
+        response = index.response(request(range=f'bytes={size}-'), clip)
+        assert response.status_code == 416
+        assert response.headers['content-range'] == f'bytes */{size}'
+
+        # A stale If-Range sends the whole clip instead of a piece of the new one
+        response = index.response(request(range='bytes=0-9', if_range='"stale"'), clip)
+        assert response.status_code == 200
+
+        response = index.response(request(range='bytes=0-9', if_range=clip.etag), clip)
+        assert (response.status_code, response.body) == (206, data[:10])
+
+        response = index.response(request(if_none_match=clip.etag), clip)
+        assert response.status_code == 304
+
+
+def test_responses_in_memory():
+    check_responses(4096)
+
+
+def test_responses_from_disk():
+    check_responses(INLINE_LIMIT + 4096)
+
+
+def main():
+    """Run every check and report each one"""
+    checks = [(name, check) for name, check in globals().items() if name.startswith('test_')]
+    failed = 0
+    for name, check in checks:
+        try:
+            check()
+            print(f"  ✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ❌ {name}: {e or 'assertion failed'}")
+    print(f"{len(checks) - failed}/{len(checks)} audio index checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+History import parser test script for the Hiragana flashcard application.
+Feeds HistoryReader exports that round-trip, arrive a byte at a time, or are
+truncated, malformed or inconsistent, and checks that every bad stream is
+rejected with HistoryFormatError instead of being half-imported or crashing.
+Runs with pytest or on its own; no database file is needed.
+"""
+
+import sqlite3
+import struct
+import sys
+
+from catalog import Character
+from history import (COUNT, END, LEARNER, RECORD, HistoryFormatError, HistoryReader,
+                     export_chunks, header)
+
+# The exporting catalog: ids differ from the importing one, and ん isn't there
+EXPORTED = [Character(10, 'あ', 'a', 'ah', 'vowels', 0),
+            Character(11, 'か', 'ka', 'kah', 'k', 1),
+            Character(12, 'ん', 'n', 'n', 'n', 2)]
+LOCAL = [Character(1, 'か', 'ka', 'kah', 'k', 0),
+         Character(2, 'あ', 'a', 'ah', 'vowels', 1)]
+
+REVIEWS = [('alice', 10, 4, 1000.0, 900),
+           ('alice', 12, 3, 1001.0, None),
+           ('bob', 11, 5, 1002.5, 1200),
+           ('bob', 10, 1, 1003.0, None)]
+# REVIEWS as LOCAL ids, without the ん record
+EXPECTED = [('alice', 2, 4, 1000.0, 900),
+            ('bob', 1, 5, 1002.5, 1200),
+            ('bob', 2, 1, 1003.0, None)]
+
+
+def export(reviews=REVIEWS, chunk_records=2):
+    """An export of ``reviews`` from an in-memory log"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''CREATE TABLE review_events (id INTEGER PRIMARY KEY AUTOINCREMENT, learner_id TEXT,
+                    card_id INTEGER, grade INTEGER, reviewed_at REAL, response_ms INTEGER)''')
+    conn.executemany('''INSERT INTO review_events (learner_id, card_id, grade, reviewed_at, response_ms)
+                        VALUES (?, ?, ?, ?, ?)''', reviews)
+    return b''.join(export_chunks(conn, EXPORTED, chunk_records=chunk_records))
+
+
+def learner(name):
+    text = name.encode('utf-8')
+    return b'L' + LEARNER.pack(len(text)) + text
+
+
+def records(*rows):
+    return b'R' + COUNT.pack(len(rows)) + b''.join(RECORD.pack(*row) for row in rows)
+
+
+def parse(data, step=None):
+    """Feed ``data`` whole or ``step`` bytes at a time, then close"""
+    reader = HistoryReader(LOCAL)
+    events = []
+    step = step or max(len(data), 1)
+    for i in range(0, len(data), step):
+        events += reader.feed(data[i:i + step])
+    reader.close()
+    return reader, events
+
+
+def rejects(data, message):
+    """True if parsing ``data`` raises HistoryFormatError mentioning ``message``"""
+    try:
+        parse(data)
+    except HistoryFormatError as e:
+        return message in str(e)
+    return False
+
+
+def test_round_trip():
+    reader, events = parse(export())
+    assert events == EXPECTED
+    assert (reader.records, reader.skipped, reader.finished) == (4, 1, True)
+
+
+def test_any_split():
+    data = export()
+    for step in (1, 3, RECORD.size + 1):
+        assert parse(data, step)[1] == EXPECTED, step
+
+
+def test_truncated_stream():
+    data = export()
+    for cut in range(len(data)):
+        reader = HistoryReader(LOCAL)
+        reader.feed(data[:cut])
+        try:
+            reader.close()
+        except HistoryFormatError:
+            continue
+        raise AssertionError(f"stream cut at {cut} of {len(data)} bytes was accepted")
+
+
+def test_bad_magic_and_version():
+    data = export()
+    assert rejects(b'HIRX' + data[4:], "not a history export")
+    assert rejects(data[:4] + struct.pack('<H', 99) + data[6:], "not a history export")
+    assert rejects(b'PK\x03\x04' + bytes(64), "not a history export")
+
+
+def test_malformed_blocks():
+    start = header(EXPORTED)
+    assert rejects(start + b'X', "unknown block")
+    assert rejects(start + records((10, 4, 1.0, 5)), "records before any learner")
+    assert rejects(start + learner('alice') + records((10, 4, 1.0, 5)) + b'E' + END.pack(2),
+                   "expected 2 records, read 1")
+    assert rejects(export() + learner('mallory'), "data after the end")
+    assert rejects(start + b'L' + LEARNER.pack(2) + b'\xff\xfe' + b'E' + END.pack(0), "invalid UTF-8")
+
+
+def test_empty_export():
+    reader, events = parse(export([]))
+    assert events == [] and reader.finished
+
+
+def main():
+    """Run every check and report each one"""
+    checks = [(name, check) for name, check in globals().items() if name.startswith('test_')]
+    failed = 0
+    for name, check in checks:
+        try:
+            check()
+            print(f"  ✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ❌ {name}: {e or 'assertion failed'}")
+    print(f"{len(checks) - failed}/{len(checks)} history parser checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())